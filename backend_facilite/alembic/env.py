@@ -4,16 +4,20 @@ import os
 from sqlalchemy import engine_from_config, pool
 from alembic import context
 
-# Permet d'importer ton projet
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# Permet d'importer le paquet backend_facilite (racine du dépôt)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
-from models import Base  # ✅ Import unique et propre
+from backend_facilite.database import SQLALCHEMY_DATABASE_URL
+from backend_facilite.models import Base  # ✅ Import unique et propre
 
 # Alembic config
 config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
+# Même URL que l'application (configparser : les % doivent être doublés)
+config.set_main_option("sqlalchemy.url", SQLALCHEMY_DATABASE_URL.replace("%", "%%"))
+
 target_metadata = Base.metadata  # ✅ C’est ce que Alembic utilise
 
 def run_migrations_offline() -> None:
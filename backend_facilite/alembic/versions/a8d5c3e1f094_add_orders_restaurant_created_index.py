@@ -0,0 +1,28 @@
+"""add orders (restaurant_id, created_at) index
+
+Revision ID: a8d5c3e1f094
+Revises: e3a91f57c2d4
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8d5c3e1f094'
+down_revision: Union[str, Sequence[str], None] = 'e3a91f57c2d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_orders_restaurant_created', 'orders', ['restaurant_id', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_orders_restaurant_created', table_name='orders')
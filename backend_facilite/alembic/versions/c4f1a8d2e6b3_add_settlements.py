@@ -0,0 +1,47 @@
+"""add settlements and payments.created_at index
+
+Revision ID: c4f1a8d2e6b3
+Revises: 7b2d9e41c0a8
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4f1a8d2e6b3'
+down_revision: Union[str, Sequence[str], None] = '7b2d9e41c0a8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'settlements',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('merchant_type', sa.String(), nullable=False),
+        sa.Column('merchant_id', sa.Integer(), nullable=False),
+        sa.Column('settlement_date', sa.Date(), nullable=False),
+        sa.Column('payment_count', sa.Integer(), nullable=False),
+        sa.Column('gross_amount', sa.Float(), nullable=False),
+        sa.Column('commission', sa.Float(), nullable=False),
+        sa.Column('net_amount', sa.Float(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('merchant_type', 'merchant_id', 'settlement_date', name='uq_settlement_merchant_day'),
+    )
+    op.create_index(op.f('ix_settlements_id'), 'settlements', ['id'], unique=False)
+    op.create_index(op.f('ix_settlements_settlement_date'), 'settlements', ['settlement_date'], unique=False)
+    op.create_index(op.f('ix_payments_created_at'), 'payments', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_payments_created_at'), table_name='payments')
+    op.drop_index(op.f('ix_settlements_settlement_date'), table_name='settlements')
+    op.drop_index(op.f('ix_settlements_id'), table_name='settlements')
+    op.drop_table('settlements')
@@ -0,0 +1,46 @@
+"""add outbox_events
+
+Revision ID: e3a91f57c2d4
+Revises: c4f1a8d2e6b3
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3a91f57c2d4'
+down_revision: Union[str, Sequence[str], None] = 'c4f1a8d2e6b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'outbox_events',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('topic', sa.String(), nullable=False),
+        sa.Column('aggregate_type', sa.String(), nullable=False),
+        sa.Column('aggregate_id', sa.Integer(), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('published_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_outbox_events_published_at'), 'outbox_events', ['published_at'], unique=False)
+    op.create_index(
+        'ix_outbox_events_unpublished', 'outbox_events', ['id'], unique=False,
+        postgresql_where=sa.text('published_at IS NULL'),
+        sqlite_where=sa.text('published_at IS NULL'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_outbox_events_unpublished', table_name='outbox_events')
+    op.drop_index(op.f('ix_outbox_events_published_at'), table_name='outbox_events')
+    op.drop_table('outbox_events')
@@ -1,13 +1,18 @@
 # backend_facilite/auth.py
 from fastapi import APIRouter, Depends, HTTPException, Security
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy import event, inspect
 from sqlalchemy.orm import Session
-from passlib.context import CryptContext
-from jose import JWTError, jwt
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 
 from backend_facilite.database import get_db
 from backend_facilite.models import User, RoleEnum, Restaurant, Hotel
+from backend_facilite.utils.cache import MemoryLRUCache, catalog_changed
+from backend_facilite.utils.http_cache import WEB_CONCURRENCY, bump_version, versions
+from backend_facilite.utils.metrics import register_cache
+from backend_facilite.utils import password_pool
+from backend_facilite.utils.tracing import current_span, traced
 from backend_facilite.schemas import (
     UserCreate, ClientLogin, ManagerLogin, ManagerCreate
 )
@@ -17,13 +22,12 @@ router = APIRouter(prefix="/auth", tags=["Auth"])
 # ======================
 # CONFIG
 # ======================
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
+# bcrypt est exécuté dans un pool de process dédié (voir utils/password_pool.py)
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return password_pool.hash_password(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_pool.verify_and_update(plain_password, hashed_password)[0]
 
 SECRET_KEY = "supersecretkey"
 ALGORITHM = "HS256"
@@ -35,22 +39,98 @@ def create_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
+    from jose import jwt  # import différé : démarrage plus rapide
+
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+def token_claims(user: User) -> dict:
+    """Claims embarqués dans le JWT : l'id, le rôle et l'état du compte."""
+    return {"sub": str(user.id), "role": user.role, "active": bool(user.is_active)}
+
+
+# ======================
+# CACHE DES PRINCIPAUX
+# ======================
+# Évite un SELECT sur users à chaque requête authentifiée. L'entrée est
+# indexée par (user_id, génération, token) : révoquer un utilisateur
+# incrémente sa génération, ce qui rend toutes ses entrées injoignables.
+# Les générations vivent dans le store des versions d'ETags (partagé entre
+# workers avec CACHE_URL=redis://). Sans store partagé et avec plusieurs
+# workers, un autre process ne voit pas la révocation : TTL de quelques secondes.
+PRINCIPAL_TTL_SECONDS = 30 if versions.shared or WEB_CONCURRENCY <= 1 else 3
+
+@dataclass(frozen=True)
+class Principal:
+    id: int
+    name: str
+    phone_number: str
+    role: RoleEnum
+    is_active: bool
+
+_principals = MemoryLRUCache(max_entries=10_000)
+register_cache("principals", _principals)
+
+def _principal_key(user_id: int, token: str) -> str:
+    return f"{user_id}:{versions.current(f'principal:{user_id}')}:{token}"
+
+def evict_principal(user_id: int) -> None:
+    """À appeler quand un utilisateur est désactivé ou change de rôle."""
+    bump_version(f"principal:{user_id}")
+
+# Révocation automatique : tout changement de role/is_active committé évince
+# les entrées de l'utilisateur, dans tous les process si le store est partagé.
+@event.listens_for(Session, "before_flush")
+def _collect_revoked_users(session, flush_context, instances):
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            attrs = inspect(obj).attrs
+            if attrs.role.history.has_changes() or attrs.is_active.history.has_changes():
+                session.info.setdefault("revoked_user_ids", set()).add(obj.id)
+
+@event.listens_for(Session, "after_commit")
+def _evict_revoked_users(session):
+    for user_id in session.info.pop("revoked_user_ids", ()):
+        evict_principal(user_id)
+
+@traced("auth.get_current_user")
 def get_current_user(
     token: HTTPAuthorizationCredentials = Security(security),
     db: Session = Depends(get_db)
-):
+) -> Principal:
+    from jose import JWTError, jwt  # déjà en cache après le premier appel
+
     try:
         payload = jwt.decode(token.credentials, SECRET_KEY, algorithms=[ALGORITHM])
         user_id = int(payload.get("sub"))
-    except JWTError:
+    except (JWTError, TypeError, ValueError):
         raise HTTPException(status_code=401, detail="Token invalide")
+    if payload.get("active") is False:
+        raise HTTPException(status_code=401, detail="Compte désactivé")
+
+    try:
+        key = _principal_key(user_id, token.credentials)
+    except Exception:
+        key = None  # store des générations injoignable : lecture en base, sans cache
+    principal = _principals.get(key) if key is not None else None
+    current_span().set("auth.cache_hit", principal is not None)
+    if principal is not None:
+        return principal
 
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=401, detail="Utilisateur non trouvé")
-    return user
+    if user.is_active is False:
+        raise HTTPException(status_code=401, detail="Compte désactivé")
+    # Un token émis avant un changement de rôle n'est plus valable
+    if "role" in payload and payload["role"] != user.role:
+        raise HTTPException(status_code=401, detail="Token périmé, reconnectez-vous")
+
+    principal = Principal(
+        id=user.id, name=user.name, phone_number=user.phone_number, role=user.role, is_active=True
+    )
+    if key is not None:
+        _principals.set(key, principal, PRINCIPAL_TTL_SECONDS)
+    return principal
 
 def require_admin(user=Depends(get_current_user)):
     if user.role != RoleEnum.admin:
@@ -80,7 +160,7 @@ def register_client(payload: UserCreate, db: Session = Depends(get_db)):
     db.commit()
     db.refresh(user)
 
-    token = create_token({"sub": str(user.id), "role": user.role})
+    token = create_token(token_claims(user))
 
     return {
         "user": {
@@ -135,8 +215,13 @@ def register_manager(
         raise HTTPException(status_code=400, detail="ID restaurant/hôtel requis pour ce manager")
 
     db.commit()
+    # owner_id fait partie des réponses catalogue : purge du cache et des ETags
+    if payload.role == RoleEnum.restaurant_manager:
+        catalog_changed("restaurants")
+    else:
+        catalog_changed("hotels", f"hotel:{payload.hotel_id}")
 
-    token = create_token({"sub": str(user.id), "role": user.role})
+    token = create_token(token_claims(user))
 
     return {
         "user": {
@@ -162,7 +247,7 @@ def login_client(payload: ClientLogin, db: Session = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=401, detail="Numéro non reconnu comme client")
 
-    token = create_token({"sub": str(user.id), "role": user.role})
+    token = create_token(token_claims(user))
     return {"access_token": token, "token_type": "bearer"}
 
 
@@ -173,11 +258,18 @@ def login_manager(payload: ManagerLogin, db: Session = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=401, detail="Utilisateur non trouvé")
 
-    if not user.hashed_password or not verify_password(payload.password, user.hashed_password):
+    if not user.hashed_password:
+        raise HTTPException(status_code=401, detail="Mot de passe incorrect")
+    valid, new_hash = password_pool.verify_and_update(payload.password, user.hashed_password)
+    if not valid:
         raise HTTPException(status_code=401, detail="Mot de passe incorrect")
+    if new_hash:
+        # Coût bcrypt modifié depuis le dernier hash : on le met à jour au passage
+        user.hashed_password = new_hash
+        db.commit()
 
     if user.role not in [RoleEnum.restaurant_manager, RoleEnum.hotel_manager, RoleEnum.admin]:
         raise HTTPException(status_code=403, detail="Ce rôle ne peut pas se connecter ici")
 
-    token = create_token({"sub": str(user.id), "role": user.role})
+    token = create_token(token_claims(user))
     return {"access_token": token, "token_type": "bearer"}
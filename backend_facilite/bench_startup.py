@@ -0,0 +1,105 @@
+# backend_facilite/bench_startup.py
+"""
+Mesure du démarrage à froid d'un worker : de l'import de l'application à la
+première réponse HTTP.
+
+    python -m backend_facilite.bench_startup --runs 10
+    python -m backend_facilite.bench_startup --runs 5 --importtime 15
+
+Chaque mesure se fait dans un interpréteur neuf (comme un worker qui vient
+d'être lancé par l'autoscaling) : import de backend_facilite.main, événements
+de démarrage puis GET / via le client de test ASGI, sans réseau.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Code exécuté dans chaque process mesuré
+_CHILD = """
+import json, time
+t0 = time.perf_counter()
+from backend_facilite.main import app
+t1 = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(app) as client:
+    status = client.get("/").status_code
+t2 = time.perf_counter()
+print(json.dumps({"import_ms": (t1 - t0) * 1000, "first_response_ms": (t2 - t0) * 1000, "status": status}))
+"""
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_ROOT, env.get("PYTHONPATH")]))
+    return env
+
+
+def measure_once() -> dict:
+    started = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-c", _CHILD], env=_env(), capture_output=True, text=True, check=True
+    )
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    # Avec le démarrage de l'interpréteur lui-même
+    result["process_ms"] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def slowest_imports(limit: int) -> list[tuple[int, str]]:
+    """Modules les plus coûteux (temps cumulé, µs) d'après `python -X importtime`."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import backend_facilite.main"],
+        env=_env(), capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), name.rstrip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def summarize(samples: list[dict]) -> dict:
+    summary = {}
+    for metric in ("import_ms", "first_response_ms", "process_ms"):
+        values = sorted(s[metric] for s in samples)
+        summary[metric] = {
+            "min": round(values[0], 1),
+            "median": round(statistics.median(values), 1),
+            "max": round(values[-1], 1),
+        }
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Temps de démarrage à froid de l'API")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--importtime", type=int, default=0, metavar="N",
+                        help="affiche aussi les N imports les plus lents")
+    parser.add_argument("--json", help="écrit les résultats dans ce fichier")
+    args = parser.parse_args()
+
+    samples = [measure_once() for _ in range(args.runs)]
+    if any(s["status"] != 200 for s in samples):
+        sys.exit(f"❌ Réponse inattendue : {[s['status'] for s in samples]}")
+
+    summary = summarize(samples)
+    print(f"{'mesure':<20}{'min':>10}{'médiane':>10}{'max':>10}  (ms, {args.runs} process)")
+    for metric, values in summary.items():
+        print(f"{metric:<20}{values['min']:>10}{values['median']:>10}{values['max']:>10}")
+
+    if args.importtime:
+        print("\nImports les plus lents (cumulé) :")
+        for cumulative, name in slowest_imports(args.importtime):
+            print(f"{cumulative / 1000:>9.1f} ms  {name}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"runs": args.runs, "summary": summary, "samples": samples}, f, indent=2)
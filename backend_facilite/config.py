@@ -1,32 +1,5 @@
-from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from jose import jwt, JWTError
+# Point d'entrée unique : get_current_user est défini (avec son cache) dans auth.py
+from backend_facilite.database import get_db
+from backend_facilite.auth import get_current_user
 
-from backend_facilite.database import get_db # ✅ Import propre depuis database.py
-from backend_facilite.models import User       # Assure-toi que models.py n'importe pas config.py
-
-# -------------------- Configuration Authentification --------------------
-SECRET_KEY = "charsie2"  # 🔐 À remplacer par une clé plus forte en production
-ALGORITHM = "HS256"
-
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")  # endpoint pour générer le JWT
-
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Impossible de valider les informations d'identification",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = int(payload.get("sub"))  # ✅ Corrigé ici : "sub" au lieu de "user_id"
-        if user_id is None:
-            raise credentials_exception
-    except (JWTError, ValueError):
-        raise credentials_exception
-
-    user = db.query(User).filter(User.id == user_id).first()
-    if user is None:
-        raise credentials_exception
-    return user
+__all__ = ["get_db", "get_current_user"]
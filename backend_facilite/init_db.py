@@ -1,10 +1,43 @@
-from database import Base, engine
-import models  # importe tous tes modèles ici
+# backend_facilite/init_db.py
+"""
+Étape explicite de gestion du schéma, à lancer avant de (re)démarrer l'API :
+
+    python -m backend_facilite.init_db
+
+- base vierge (pas de table alembic_version) : création des tables depuis les
+  modèles puis marquage à la dernière révision Alembic ;
+- base déjà suivie par Alembic : `alembic upgrade head`.
+
+L'application ne touche plus au schéma à l'import (voir main.py).
+"""
+import os
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+
+from backend_facilite import models  # noqa: F401  (enregistre tous les modèles)
+from backend_facilite.database import Base, engine
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+
+
+def alembic_config() -> Config:
+    return Config(ALEMBIC_INI)
+
 
 def init_db():
-    print("🚀 Création des tables dans la base de données...")
-    Base.metadata.create_all(bind=engine)
-    print("✅ Tables créées avec succès !")
+    config = alembic_config()
+    if not inspect(engine).has_table("alembic_version"):
+        print("🚀 Création des tables dans la base de données...")
+        Base.metadata.create_all(bind=engine)
+        command.stamp(config, "head")
+        print("✅ Tables créées et marquées à la dernière migration !")
+    else:
+        print("🚀 Application des migrations Alembic...")
+        command.upgrade(config, "head")
+        print("✅ Schéma à jour !")
+
 
 if __name__ == "__main__":
     init_db()
@@ -0,0 +1,17 @@
+# backend_facilite/loadtest/__init__.py
+"""
+Banc de charge reproductible.
+
+    python -m backend_facilite.loadtest seed --fresh --users 5000 --orders 20000
+    python -m backend_facilite.loadtest run --duration 60 --concurrency 50 \\
+        --out resultats.json --baseline reference.json
+
+`seed` remplit la base avec un jeu de données déterministe (même --seed =>
+mêmes lignes, aux codes de transaction horodatés près). `run` rejoue un
+trafic mixte (catalogue, proximité, commandes, paiements, validation de QR,
+suivi) directement dans l'application ASGI, sans réseau, et publie
+p50/p95/p99 et débit par endpoint.
+
+Pour des volumes de production (millions de lignes), voir
+`python -m backend_facilite.loadtest.datagen`.
+"""
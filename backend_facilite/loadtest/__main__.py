@@ -0,0 +1,258 @@
+# backend_facilite/loadtest/__main__.py
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from dataclasses import fields
+from datetime import datetime
+
+import httpx
+from sqlalchemy.orm import sessionmaker
+
+from backend_facilite import database
+from backend_facilite.loadtest.scenarios import SCENARIOS, VirtualUser
+from backend_facilite.loadtest.seed import Dataset, Volumes, reset, seed
+
+PERCENTILES = (50, 95, 99)
+DEFAULT_TOLERANCE = 0.2  # +20 % de p95 ou -20 % de débit => régression
+
+
+# ==========================
+# Base ciblée
+# ==========================
+def _engine(url: str | None):
+    return database.make_engine(url) if url else database.engine
+
+
+def _sessionmaker(engine):
+    if engine is database.engine:
+        return database.SessionLocal
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+# ==========================
+# Trafic
+# ==========================
+# Réponses du contrôle d'admission : comptées comme erreurs, sinon un run
+# limité au débit passe pour un run rapide (les refus coûtent ~0 ms)
+REJECTED_STATUSES = {"429", "503"}
+
+
+def _client_address(index: int) -> tuple[str, int]:
+    """Une IP par utilisateur virtuel : les limites par IP s'appliquent comme en production."""
+    return f"10.{(index >> 16) & 255}.{(index >> 8) & 255}.{index & 255}", 40000
+
+
+async def drive(app, dataset: Dataset, duration: float, concurrency: int, warmup: float, seed_value: int):
+    """Fait tourner `concurrency` utilisateurs virtuels pendant `warmup + duration` secondes."""
+    latencies: dict[str, list[float]] = defaultdict(list)
+    statuses: dict[str, Counter] = defaultdict(Counter)
+    population = list(SCENARIOS)
+    weights = [s.weight for s in SCENARIOS]
+
+    started = time.perf_counter()
+    measure_from = started + warmup
+    deadline = measure_from + duration
+
+    async def virtual_user(index: int):
+        transport = httpx.ASGITransport(app=app, client=_client_address(index))
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=60) as client:
+            vu = VirtualUser(client, dataset, random.Random(seed_value * 1_000_003 + index))
+            while True:
+                scenario = vu.rng.choices(population, weights)[0]
+                t0 = time.perf_counter()
+                if t0 >= deadline:
+                    return
+                try:
+                    status = (await scenario.run(vu)).status_code
+                except Exception as exc:  # erreur côté application remontée par le transport ASGI
+                    status = type(exc).__name__
+                t1 = time.perf_counter()
+                if t0 >= measure_from:
+                    latencies[scenario.name].append(t1 - t0)
+                    statuses[scenario.name][str(status)] += 1
+
+    await asyncio.gather(*(virtual_user(i) for i in range(concurrency)))
+    return latencies, statuses
+
+
+def _percentile(sorted_values: list[float], p: float) -> float:
+    # Rang le plus proche : pas d'interpolation, stable entre runs
+    index = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, statuses, duration: float) -> dict:
+    endpoints = {}
+    for name in sorted(latencies):
+        values = sorted(latencies[name])
+        rejected = sum(n for status, n in statuses[name].items() if status in REJECTED_STATUSES)
+        errors = sum(
+            n for status, n in statuses[name].items()
+            if not status.isdigit() or int(status) >= 500 or status in REJECTED_STATUSES
+        )
+        endpoints[name] = {
+            "requests": len(values),
+            "throughput_rps": round(len(values) / duration, 2),
+            "error_rate": round(errors / len(values), 4),
+            "rejected": rejected,
+            "statuses": dict(sorted(statuses[name].items())),
+            **{f"p{p}_ms": round(_percentile(values, p) * 1000, 2) for p in PERCENTILES},
+            "mean_ms": round(sum(values) / len(values) * 1000, 2),
+        }
+    everything = sorted(v for values in latencies.values() for v in values)
+    total = {
+        "requests": len(everything),
+        "throughput_rps": round(len(everything) / duration, 2),
+        **({f"p{p}_ms": round(_percentile(everything, p) * 1000, 2) for p in PERCENTILES} if everything else {}),
+    }
+    return {"endpoints": endpoints, "total": total}
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Régressions de p95 ou de débit par endpoint, au-delà de la tolérance."""
+    regressions = []
+    for name, now in current["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(name)
+        if not before:
+            continue
+        if before["p95_ms"] and now["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name} : p95 {before['p95_ms']} -> {now['p95_ms']} ms")
+        if before["throughput_rps"] and now["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name} : débit {before['throughput_rps']} -> {now['throughput_rps']} req/s")
+    return regressions
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(results: dict, baseline: dict | None) -> None:
+    header = f"{'endpoint':<36}{'req':>7}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'err%':>7}"
+    print(header)
+    print("-" * len(header))
+    for name, row in results["endpoints"].items():
+        line = (f"{name:<36}{row['requests']:>7}{row['throughput_rps']:>9}{row['p50_ms']:>9}"
+                f"{row['p95_ms']:>9}{row['p99_ms']:>9}{row['error_rate'] * 100:>7.1f}")
+        before = (baseline or {}).get("endpoints", {}).get(name)
+        if before and before["p95_ms"]:
+            line += f"  (p95 {(row['p95_ms'] / before['p95_ms'] - 1) * 100:+.0f} %)"
+        print(line)
+    total = results["total"]
+    print(f"{'TOTAL':<36}{total['requests']:>7}{total['throughput_rps']:>9}"
+          f"{total.get('p50_ms', '-'):>9}{total.get('p95_ms', '-'):>9}{total.get('p99_ms', '-'):>9}")
+
+
+# ==========================
+# CLI
+# ==========================
+def cmd_seed(args) -> None:
+    engine = _engine(args.database_url)
+    if args.create_schema:
+        database.Base.metadata.create_all(bind=engine)
+    if args.fresh:
+        reset(engine)
+    volumes = Volumes(**{f.name: getattr(args, f.name) for f in fields(Volumes)})
+    started = time.perf_counter()
+    report = seed(engine, volumes, args.seed)
+    print(f"✅ Jeu de données {args.seed} en {time.perf_counter() - started:.1f} s : {report.rows}", file=sys.stderr)
+
+
+def cmd_run(args) -> None:
+    from backend_facilite.main import app
+
+    engine = _engine(args.database_url)
+    SessionLocal = _sessionmaker(engine)
+    if args.database_url:
+        def get_db():
+            db = SessionLocal()
+            try:
+                yield db
+            finally:
+                db.close()
+        app.dependency_overrides[database.get_db] = get_db
+
+    db = SessionLocal()
+    try:
+        dataset = Dataset.load(db)
+    finally:
+        db.close()
+    if not dataset.orders or not dataset.staff:
+        sys.exit("❌ Base vide : lancez d'abord `python -m backend_facilite.loadtest seed`")
+
+    latencies, statuses = asyncio.run(
+        drive(app, dataset, args.duration, args.concurrency, args.warmup, args.seed)
+    )
+    results = {
+        "meta": {
+            "started_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "git": _git_revision(),
+            "python": platform.python_version(),
+            "database": engine.dialect.name,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+        },
+        **summarize(latencies, statuses, args.duration),
+    }
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"⚠️  Régression {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m backend_facilite.loadtest", description="Banc de charge")
+    parser.add_argument("--database-url", help="base ciblée (défaut : celle de l'application)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_seed = sub.add_parser("seed", help="remplit la base avec un jeu de données reproductible")
+    p_seed.add_argument("--seed", type=int, default=42)
+    p_seed.add_argument("--fresh", action="store_true", help="vide d'abord toutes les tables")
+    p_seed.add_argument("--create-schema", action="store_true", help="crée les tables manquantes (base jetable)")
+    for f in fields(Volumes):
+        p_seed.add_argument(f"--{f.name.replace('_', '-')}", type=type(f.default), default=f.default)
+    p_seed.set_defaults(func=cmd_seed)
+
+    p_run = sub.add_parser("run", help="rejoue un trafic mixte et mesure les latences")
+    p_run.add_argument("--duration", type=float, default=30.0, help="secondes mesurées")
+    p_run.add_argument("--warmup", type=float, default=5.0, help="secondes ignorées au début (caches, pools)")
+    p_run.add_argument("--concurrency", type=int, default=20, help="utilisateurs virtuels")
+    p_run.add_argument("--seed", type=int, default=42)
+    p_run.add_argument("--out", help="fichier JSON des résultats")
+    p_run.add_argument("--baseline", help="résultats de référence à comparer (code retour 1 si régression)")
+    p_run.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    p_run.set_defaults(func=cmd_run)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
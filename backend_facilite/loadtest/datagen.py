@@ -0,0 +1,421 @@
+# backend_facilite/loadtest/datagen.py
+"""
+Générateur de données synthétiques à grande échelle (millions de lignes).
+
+    python -m backend_facilite.loadtest.datagen --orders 2000000 \\
+        --cities "kinshasa=0.6,lubumbashi=0.25,goma=0.15"
+
+Les lignes sont calculées par blocs vectorisés (numpy) puis chargées avec
+COPY sur PostgreSQL, ou par INSERT multi-lignes sur les autres bases. Les
+identifiants sont alloués à la suite des lignes existantes : les clés
+étrangères se calculent sans aller-retour et l'intégrité référentielle est
+garantie. Les séquences PostgreSQL sont recalées à la fin.
+
+Géographie : chaque ville est un mélange de quartiers (centres gaussiens) ;
+les restaurants se répartissent autour des quartiers et les commandes
+autour de leur restaurant.
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import func, select, text
+
+from backend_facilite import database
+from backend_facilite.models import (
+    Delivery, Hotel, Menu, Order, OrderItem, Payment, Restaurant, Room, User,
+)
+from backend_facilite.routers.payments import SUPPORTED
+from backend_facilite.utils import ids
+
+# (latitude, longitude, écart-type en degrés)
+CITIES = {
+    "kinshasa": (-4.3250, 15.3222, 0.06),
+    "lubumbashi": (-11.6609, 27.4794, 0.04),
+    "goma": (-1.6792, 29.2228, 0.03),
+    "kisangani": (0.5153, 25.1910, 0.03),
+    "bukavu": (-2.5123, 28.8480, 0.02),
+    "matadi": (-5.8167, 13.4500, 0.02),
+}
+HOTSPOTS_PER_CITY = 24
+RESTAURANT_SPREAD_DEG = 0.008
+DELIVERY_SPREAD_DEG = 0.015
+
+# Worker réservé du générateur d'identifiants : ses codes ne croisent jamais
+# ceux des process de l'API (ids ne l'attribue jamais).
+DATAGEN_WORKER_ID = ids.RESERVED_WORKER_ID
+
+MENU_CATEGORIES = np.array(["plat", "boisson", "dessert", "entrée"])
+METHOD_WEIGHTS = {"mpesa": 0.3, "airtel_money": 0.2, "orange_money": 0.2, "cash": 0.2, "visa": 0.07, "mastercard": 0.03}
+
+
+@dataclass
+class Geography:
+    names: list[str]
+    centers: np.ndarray   # (villes, 3) : lat, lon, écart-type
+    weights: np.ndarray
+
+    @classmethod
+    def parse(cls, spec: str) -> "Geography":
+        """"kinshasa=0.6,goma=0.4" ou un fichier JSON {"nom": [lat, lon, écart, poids]}."""
+        if spec.endswith(".json"):
+            with open(spec) as f:
+                raw = json.load(f)
+            names = list(raw)
+            rows = np.array([raw[name] for name in names], dtype=float)
+            return cls(names, rows[:, :3], rows[:, 3] / rows[:, 3].sum())
+        names, weights = [], []
+        for part in spec.split(","):
+            name, _, weight = part.partition("=")
+            name = name.strip().lower()
+            if name not in CITIES:
+                raise SystemExit(f"❌ Ville inconnue : {name} (connues : {', '.join(CITIES)})")
+            names.append(name)
+            weights.append(float(weight or 1))
+        weights = np.array(weights)
+        return cls(names, np.array([CITIES[n] for n in names]), weights / weights.sum())
+
+
+# ==========================
+# Chargement
+# ==========================
+class Loader:
+    """COPY FROM STDIN (psycopg2) ou executemany par lots selon le dialecte."""
+
+    def __init__(self, engine, batch_size: int):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.use_copy = engine.dialect.name == "postgresql" and engine.dialect.driver == "psycopg2"
+        self.loaded: dict[str, int] = {}
+
+    def load(self, table, columns: dict[str, list]) -> None:
+        names = list(columns)
+        rows = list(zip(*columns.values()))
+        if not rows:
+            return
+        raw = self.engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            if self.use_copy:
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(rows)
+                buffer.seek(0)
+                cursor.copy_expert(
+                    f"COPY {table.name} ({', '.join(names)}) FROM STDIN WITH (FORMAT csv)", buffer
+                )
+            else:
+                if self.engine.dialect.name == "sqlite":
+                    cursor.execute("PRAGMA synchronous=OFF")  # chargement jetable : pas de fsync par lot
+                mark = "?" if self.engine.dialect.paramstyle == "qmark" else "%s"
+                sql = f"INSERT INTO {table.name} ({', '.join(names)}) VALUES ({', '.join([mark] * len(names))})"
+                for start in range(0, len(rows), self.batch_size):
+                    cursor.executemany(sql, rows[start:start + self.batch_size])
+            raw.commit()
+        finally:
+            raw.close()
+        self.loaded[table.name] = self.loaded.get(table.name, 0) + len(rows)
+
+    def reset_sequences(self, tables) -> None:
+        if self.engine.dialect.name != "postgresql":
+            return
+        with self.engine.begin() as conn:
+            for table in tables:
+                conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                    f"(SELECT COALESCE(MAX(id), 1) FROM {table.name}))"
+                ))
+
+
+# ==========================
+# Génération vectorisée
+# ==========================
+def _timestamps(values: np.ndarray) -> list[str]:
+    """datetime64 -> texte ISO accepté par PostgreSQL et relu par SQLAlchemy sur SQLite."""
+    return np.char.replace(np.datetime_as_string(values, unit="us"), "T", " ").tolist()
+
+
+def _transaction_codes(created: np.ndarray, previous: int) -> tuple[list[str], int]:
+    """
+    Codes au format de utils/ids.py (TXN-<13 car. base32>), strictement
+    croissants : horodatage en ms, worker réservé, séquence implicite.
+    """
+    ms = created.astype("datetime64[ms]").astype(np.int64) - ids.EPOCH_MS
+    values = (ms << (ids.WORKER_BITS + ids.SEQUENCE_BITS)) | (DATAGEN_WORKER_ID << ids.SEQUENCE_BITS)
+    rank = np.arange(len(values), dtype=np.int64)
+    # v[k] > v[k-1] : même milliseconde => +1 sur la séquence
+    values = np.maximum.accumulate(np.maximum(values - rank, previous + 1)) + rank
+    alphabet = np.array(list(ids._ALPHABET))
+    shifts = np.arange(ids._ENCODED_LENGTH - 1, -1, -1, dtype=np.int64) * 5
+    digits = alphabet[(values[:, None] >> shifts) & 31]
+    codes = np.char.add("TXN-", digits.view(f"<U{ids._ENCODED_LENGTH}").ravel())
+    return codes.tolist(), int(values[-1]) if len(values) else previous
+
+
+def _meal_hours(rng: np.random.Generator, n: int) -> np.ndarray:
+    """Heure de commande : pics du midi et du soir + fond de journée (en secondes)."""
+    component = rng.choice(3, size=n, p=[0.4, 0.45, 0.15])
+    hours = np.where(
+        component == 0, rng.normal(12.8, 0.9, n),
+        np.where(component == 1, rng.normal(19.8, 1.1, n), rng.uniform(8, 23, n)),
+    )
+    return (np.clip(hours, 0, 23.999) * 3600).astype(np.int64)
+
+
+def _next_id(engine, model) -> int:
+    with engine.connect() as conn:
+        return (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+@dataclass
+class Plan:
+    users: int
+    couriers: int
+    restaurants: int
+    menus_per_restaurant: int
+    hotels: int
+    rooms_per_hotel: int
+    orders: int
+    max_items: int
+    payment_ratio: float
+    delivery_ratio: float
+    days: int
+    chunk_size: int
+    seed: int
+
+
+def generate(engine, plan: Plan, geo: Geography, batch_size: int = 10_000, log=print) -> dict[str, int]:
+    rng = np.random.default_rng(plan.seed)
+    loader = Loader(engine, batch_size)
+    now = np.datetime64(datetime.utcnow().replace(microsecond=0), "us")
+    window_start = now - np.timedelta64(plan.days, "D")
+
+    # --- Utilisateurs : gérants, livreurs, clients
+    user_base = _next_id(engine, User)
+    n_staff = plan.restaurants + plan.hotels + plan.couriers
+    n_users = max(plan.users, n_staff + 1)
+    roles = np.full(n_users, "client", dtype=object)
+    roles[:plan.restaurants] = "restaurant_manager"
+    roles[plan.restaurants:plan.restaurants + plan.hotels] = "hotel_manager"
+    roles[plan.restaurants + plan.hotels:n_staff] = "delivery_person"
+    user_ids = np.arange(user_base, user_base + n_users)
+    loader.load(User.__table__, {
+        "id": user_ids.tolist(),
+        "name": [f"user-{i}" for i in user_ids.tolist()],
+        "phone_number": [f"+243{i:09d}" for i in user_ids.tolist()],
+        "role": roles.tolist(),
+        "is_active": [True] * n_users,
+        "is_staff": [False] * n_users,
+        "created_at": _timestamps(window_start - rng.integers(0, 365 * 86400, n_users).astype("timedelta64[s]")),
+    })
+    client_ids = user_ids[n_staff:]
+    courier_ids = user_ids[plan.restaurants + plan.hotels:n_staff]
+    log(f"  users        {n_users:>12,}")
+
+    # --- Restaurants : ville -> quartier -> position
+    city_of_restaurant = rng.choice(len(geo.names), size=plan.restaurants, p=geo.weights)
+    hotspots = geo.centers[:, None, :2] + rng.normal(
+        0, 1, (len(geo.names), HOTSPOTS_PER_CITY, 2)
+    ) * geo.centers[:, None, 2:3]
+    hotspot = hotspots[city_of_restaurant, rng.integers(0, HOTSPOTS_PER_CITY, plan.restaurants)]
+    restaurant_xy = np.round(hotspot + rng.normal(0, RESTAURANT_SPREAD_DEG, (plan.restaurants, 2)), 6)
+    restaurant_base = _next_id(engine, Restaurant)
+    restaurant_ids = np.arange(restaurant_base, restaurant_base + plan.restaurants)
+    loader.load(Restaurant.__table__, {
+        "id": restaurant_ids.tolist(),
+        "owner_id": user_ids[:plan.restaurants].tolist(),
+        "name": [f"Restaurant {i}" for i in restaurant_ids.tolist()],
+        "address": [geo.names[c].capitalize() for c in city_of_restaurant.tolist()],
+        "latitude": restaurant_xy[:, 0].tolist(),
+        "longitude": restaurant_xy[:, 1].tolist(),
+    })
+    # Popularité très inégale (loi de Zipf) : quelques restaurants concentrent les commandes
+    popularity = 1.0 / np.arange(1, plan.restaurants + 1) ** 0.8
+    popularity = rng.permutation(popularity / popularity.sum())
+    log(f"  restaurants  {plan.restaurants:>12,}")
+
+    # --- Menus : bloc contigu de M plats par restaurant => menu_id calculable
+    menus_per = plan.menus_per_restaurant
+    menu_base = _next_id(engine, Menu)
+    n_menus = plan.restaurants * menus_per
+    menu_prices = np.round(rng.gamma(3.0, 4.0, n_menus) + 1.5, 2)
+    menu_ids = np.arange(menu_base, menu_base + n_menus)
+    loader.load(Menu.__table__, {
+        "id": menu_ids.tolist(),
+        "restaurant_id": np.repeat(restaurant_ids, menus_per).tolist(),
+        "name": [f"Plat {i}" for i in menu_ids.tolist()],
+        "category": MENU_CATEGORIES[rng.integers(0, len(MENU_CATEGORIES), n_menus)].tolist(),
+        "price": menu_prices.tolist(),
+    })
+    log(f"  menus        {n_menus:>12,}")
+
+    # --- Hôtels et chambres
+    hotel_base = _next_id(engine, Hotel)
+    hotel_ids = np.arange(hotel_base, hotel_base + plan.hotels)
+    city_of_hotel = rng.choice(len(geo.names), size=plan.hotels, p=geo.weights)
+    loader.load(Hotel.__table__, {
+        "id": hotel_ids.tolist(),
+        "owner_id": user_ids[plan.restaurants:plan.restaurants + plan.hotels].tolist(),
+        "name": [f"Hôtel {i}" for i in hotel_ids.tolist()],
+        "address": [f"{i} avenue principale" for i in hotel_ids.tolist()],
+        "city": [geo.names[c].capitalize() for c in city_of_hotel.tolist()],
+    })
+    room_base = _next_id(engine, Room)
+    n_rooms = plan.hotels * plan.rooms_per_hotel
+    loader.load(Room.__table__, {
+        "id": list(range(room_base, room_base + n_rooms)),
+        "hotel_id": np.repeat(hotel_ids, plan.rooms_per_hotel).tolist(),
+        "room_number": [str(100 + j) for j in np.tile(np.arange(plan.rooms_per_hotel), plan.hotels).tolist()],
+        "capacity": rng.choice([1, 2, 2, 3, 4], n_rooms).tolist(),
+        "price_per_night": np.round(rng.uniform(30, 250, n_rooms), 2).tolist(),
+    })
+    log(f"  hotels/rooms {plan.hotels:>12,} / {n_rooms:,}")
+
+    # --- Commandes, lignes, paiements, livraisons : par blocs ordonnés dans le temps
+    order_id = _next_id(engine, Order)
+    item_id = _next_id(engine, OrderItem)
+    payment_id = _next_id(engine, Payment)
+    delivery_id = _next_id(engine, Delivery)
+    last_code = 0
+    methods = np.array(list(METHOD_WEIGHTS))
+    method_p = np.array(list(METHOD_WEIGHTS.values()))
+    assert set(methods) <= set(SUPPORTED)
+    slice_seconds = plan.days * 86400 / max(1, -(-plan.orders // plan.chunk_size))
+
+    for chunk_index, start in enumerate(range(0, plan.orders, plan.chunk_size)):
+        n = min(plan.chunk_size, plan.orders - start)
+        chunk_start = window_start + np.timedelta64(int(chunk_index * slice_seconds), "s")
+        day = rng.integers(0, max(1, int(slice_seconds // 86400)), n) * 86400
+        created = np.sort(
+            chunk_start + (day + _meal_hours(rng, n)).astype("timedelta64[s]")
+            + rng.integers(0, 1_000_000, n).astype("timedelta64[us]")
+        )
+        created = np.minimum(created, now)
+
+        restaurant_index = rng.choice(plan.restaurants, size=n, p=popularity)
+        order_xy = np.round(restaurant_xy[restaurant_index] + rng.normal(0, DELIVERY_SPREAD_DEG, (n, 2)), 6)
+        users = client_ids[rng.integers(0, len(client_ids), n)]
+        order_ids = np.arange(order_id, order_id + n)
+
+        # Lignes : 1..max_items plats du menu du restaurant de la commande
+        item_counts = rng.integers(1, plan.max_items + 1, n)
+        item_order = np.repeat(np.arange(n), item_counts)
+        item_menu = restaurant_index[item_order] * menus_per + rng.integers(0, menus_per, len(item_order))
+        quantities = rng.integers(1, 4, len(item_order))
+        totals = np.round(np.bincount(item_order, weights=quantities * menu_prices[item_menu], minlength=n), 2)
+
+        loader.load(Order.__table__, {
+            "id": order_ids.tolist(),
+            "user_id": users.tolist(),
+            "restaurant_id": restaurant_ids[restaurant_index].tolist(),
+            "total": totals.tolist(),
+            "created_at": _timestamps(created),
+            "latitude": order_xy[:, 0].tolist(),
+            "longitude": order_xy[:, 1].tolist(),
+        })
+        loader.load(OrderItem.__table__, {
+            "id": list(range(item_id, item_id + len(item_order))),
+            "order_id": order_ids[item_order].tolist(),
+            "menu_id": menu_ids[item_menu].tolist(),
+            "quantity": quantities.tolist(),
+        })
+
+        # Paiements : statut et utilisation du QR selon l'ancienneté
+        paid = np.flatnonzero(rng.random(n) < plan.payment_ratio)
+        pay_created = created[paid] + rng.integers(5, 180, len(paid)).astype("timedelta64[s]")
+        method = methods[rng.choice(len(methods), size=len(paid), p=method_p)]
+        amount = np.maximum(totals[paid], 1.0)
+        gateway_rate = np.select(
+            [np.isin(method, ["visa", "mastercard"]), np.isin(method, ["mpesa", "airtel_money", "orange_money"])],
+            [0.02, 0.01], 0.0,
+        )
+        commission = np.round(2.0 + gateway_rate * amount, 2)
+        status = rng.choice(["success", "failed", "pending"], size=len(paid), p=[0.93, 0.04, 0.03])
+        old = pay_created < now - np.timedelta64(1, "D")
+        is_used = (status == "success") & old & (rng.random(len(paid)) < 0.9)
+        codes, last_code = _transaction_codes(pay_created, last_code)
+        loader.load(Payment.__table__, {
+            "id": list(range(payment_id, payment_id + len(paid))),
+            "user_id": users[paid].tolist(),
+            "order_id": order_ids[paid].tolist(),
+            "amount": amount.tolist(),
+            "net_amount": np.round(amount - commission, 2).tolist(),
+            "commission": commission.tolist(),
+            "payment_method": method.tolist(),
+            "status": status.tolist(),
+            "transaction_code": codes,
+            "is_used": is_used.tolist(),
+            "discount": [0.0] * len(paid),
+            "created_at": _timestamps(pay_created),
+        })
+
+        # Livraisons : terminées pour les commandes anciennes, en cours sinon
+        delivered = np.flatnonzero(rng.random(n) < plan.delivery_ratio)
+        recent = created[delivered] > now - np.timedelta64(2, "h")
+        delivery_status = np.where(
+            recent,
+            rng.choice(["pending", "accepted", "in_progress"], size=len(delivered)),
+            rng.choice(["delivered", "cancelled"], size=len(delivered), p=[0.96, 0.04]),
+        )
+        loader.load(Delivery.__table__, {
+            "id": list(range(delivery_id, delivery_id + len(delivered))),
+            "order_id": order_ids[delivered].tolist(),
+            "delivery_person_id": courier_ids[rng.integers(0, len(courier_ids), len(delivered))].tolist(),
+            "status": delivery_status.tolist(),
+            "latitude": order_xy[delivered, 0].tolist(),
+            "longitude": order_xy[delivered, 1].tolist(),
+            "created_at": _timestamps(created[delivered]),
+        })
+
+        order_id += n
+        item_id += len(item_order)
+        payment_id += len(paid)
+        delivery_id += len(delivered)
+        log(f"  orders       {start + n:>12,} / {plan.orders:,}")
+
+    loader.reset_sequences([User.__table__, Restaurant.__table__, Menu.__table__, Hotel.__table__,
+                            Room.__table__, Order.__table__, OrderItem.__table__, Payment.__table__,
+                            Delivery.__table__])
+    return loader.loaded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Génération de données synthétiques à grande échelle")
+    parser.add_argument("--database-url", help="base ciblée (défaut : celle de l'application)")
+    parser.add_argument("--cities", default="kinshasa=0.6,lubumbashi=0.25,goma=0.15",
+                        help='"ville=poids,..." ou fichier JSON {"nom": [lat, lon, écart, poids]}')
+    parser.add_argument("--users", type=int, default=200_000)
+    parser.add_argument("--couriers", type=int, default=2_000)
+    parser.add_argument("--restaurants", type=int, default=5_000)
+    parser.add_argument("--menus-per-restaurant", type=int, default=20)
+    parser.add_argument("--hotels", type=int, default=500)
+    parser.add_argument("--rooms-per-hotel", type=int, default=20)
+    parser.add_argument("--orders", type=int, default=2_000_000)
+    parser.add_argument("--max-items", type=int, default=4, help="lignes par commande (1..N)")
+    parser.add_argument("--payment-ratio", type=float, default=0.8)
+    parser.add_argument("--delivery-ratio", type=float, default=0.6)
+    parser.add_argument("--days", type=int, default=90, help="fenêtre temporelle des commandes")
+    parser.add_argument("--chunk-size", type=int, default=200_000, help="commandes générées par bloc")
+    parser.add_argument("--batch-size", type=int, default=10_000, help="lignes par INSERT (hors COPY)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    engine = database.make_engine(args.database_url) if args.database_url else database.engine
+    plan = Plan(
+        users=args.users, couriers=args.couriers, restaurants=args.restaurants,
+        menus_per_restaurant=args.menus_per_restaurant, hotels=args.hotels,
+        rooms_per_hotel=args.rooms_per_hotel, orders=args.orders, max_items=args.max_items,
+        payment_ratio=args.payment_ratio, delivery_ratio=args.delivery_ratio,
+        days=args.days, chunk_size=args.chunk_size, seed=args.seed,
+    )
+    started = time.perf_counter()
+    loaded = generate(engine, plan, Geography.parse(args.cities), args.batch_size,
+                      log=lambda line: print(line, file=sys.stderr))
+    elapsed = time.perf_counter() - started
+    total = sum(loaded.values())
+    print(f"✅ {total:,} lignes en {elapsed:.0f} s ({total / elapsed:,.0f} lignes/s) : {loaded}", file=sys.stderr)
@@ -0,0 +1,129 @@
+# backend_facilite/loadtest/scenarios.py
+import random
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+import httpx
+
+from backend_facilite.auth import create_token
+from backend_facilite.loadtest.seed import CITY_CENTER, Dataset
+
+
+class VirtualUser:
+    """Un client simulé : son propre générateur aléatoire et ses jetons en cache."""
+
+    def __init__(self, client: httpx.AsyncClient, dataset: Dataset, rng: random.Random):
+        self.client = client
+        self.dataset = dataset
+        self.rng = rng
+        self._tokens: dict[int, dict] = {}
+
+    def auth(self, user_id: int, role: str = "client") -> dict:
+        headers = self._tokens.get(user_id)
+        if headers is None:
+            token = create_token({"sub": str(user_id), "role": role, "active": True})
+            headers = self._tokens[user_id] = {"Authorization": f"Bearer {token}"}
+        return headers
+
+    def client_with_order(self) -> tuple[int, int]:
+        user_id = self.rng.choice(self.dataset.clients)
+        return user_id, self.rng.choice(self.dataset.orders_by_user[user_id])
+
+    def point(self) -> tuple[float, float]:
+        return self.rng.gauss(CITY_CENTER[0], 0.05), self.rng.gauss(CITY_CENTER[1], 0.05)
+
+
+# ==========================
+# Parcours
+# ==========================
+# Les chemins reprennent le montage actuel de main.py (préfixes doublés
+# pour les routeurs qui déclarent aussi leur propre préfixe).
+async def browse_restaurants(vu: VirtualUser):
+    return await vu.client.get("/restaurants/restaurants/")
+
+
+async def browse_menu(vu: VirtualUser):
+    return await vu.client.get(f"/restaurants/restaurants/{vu.rng.choice(vu.dataset.restaurants)}/menu")
+
+
+async def browse_hotels(vu: VirtualUser):
+    return await vu.client.get("/hotels/hotels/")
+
+
+async def browse_rooms(vu: VirtualUser):
+    return await vu.client.get(f"/hotels/hotels/{vu.rng.choice(vu.dataset.hotels)}/rooms")
+
+
+async def nearby(vu: VirtualUser):
+    lat, lon = vu.point()
+    return await vu.client.get(
+        "/nearby/nearby/", params={"latitude": lat, "longitude": lon, "radius_km": 3, "type": "restaurant"}
+    )
+
+
+async def my_orders(vu: VirtualUser):
+    user_id, _ = vu.client_with_order()
+    return await vu.client.get("/orders/orders/me", headers=vu.auth(user_id))
+
+
+async def update_order_location(vu: VirtualUser):
+    user_id, order_id = vu.client_with_order()
+    lat, lon = vu.point()
+    return await vu.client.post(
+        f"/orders/orders/{order_id}/update-location", params={"lat": lat, "lon": lon}, headers=vu.auth(user_id)
+    )
+
+
+async def pay(vu: VirtualUser):
+    user_id, order_id = vu.client_with_order()
+    response = await vu.client.post(
+        "/payments/",
+        json={"order_id": order_id, "amount": round(vu.rng.uniform(5, 60), 2), "payment_method": "cash"},
+        headers={**vu.auth(user_id), "Idempotency-Key": f"lt-{vu.rng.getrandbits(64):x}"},
+    )
+    if response.status_code == 200:
+        # Le QR fraîchement payé alimente les validations suivantes
+        vu.dataset.unused_codes.append(response.json()["transaction_code"])
+    return response
+
+
+async def validate_qr(vu: VirtualUser):
+    codes = vu.dataset.unused_codes
+    # Un code sur dix est rejoué : le chemin "déjà utilisé" fait partie du trafic réel
+    code = codes.pop(vu.rng.randrange(len(codes))) if codes and vu.rng.random() > 0.1 else "TXN-0000000000000"
+    user_id, role = vu.rng.choice(vu.dataset.staff)
+    return await vu.client.post("/payments/validate", json={"transaction_code": code}, headers=vu.auth(user_id, role))
+
+
+async def track_order(vu: VirtualUser):
+    user_id, order_id = vu.client_with_order()
+    return await vu.client.get(f"/orders/orders/{order_id}/track", headers=vu.auth(user_id))
+
+
+async def track_delivery(vu: VirtualUser):
+    user_id, order_id = vu.client_with_order()
+    return await vu.client.get(f"/deliveries/deliveries/order/{order_id}", headers=vu.auth(user_id))
+
+
+@dataclass(frozen=True)
+class Scenario:
+    name: str
+    weight: int
+    run: Callable[[VirtualUser], Awaitable[httpx.Response]]
+
+
+# Pondérations d'une soirée type : beaucoup de lecture catalogue, un paiement
+# pour ~10 requêtes, suivi fréquent des commandes en cours.
+SCENARIOS = [
+    Scenario("GET /restaurants", 18, browse_restaurants),
+    Scenario("GET /restaurants/{id}/menu", 16, browse_menu),
+    Scenario("GET /hotels", 6, browse_hotels),
+    Scenario("GET /hotels/{id}/rooms", 4, browse_rooms),
+    Scenario("GET /nearby", 12, nearby),
+    Scenario("GET /orders/me", 6, my_orders),
+    Scenario("POST /orders/{id}/update-location", 8, update_order_location),
+    Scenario("POST /payments", 10, pay),
+    Scenario("POST /payments/validate", 6, validate_qr),
+    Scenario("GET /orders/{id}/track", 8, track_order),
+    Scenario("GET /deliveries/order/{id}", 6, track_delivery),
+]
@@ -0,0 +1,259 @@
+# backend_facilite/loadtest/seed.py
+import random
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, select
+
+from backend_facilite.database import Base
+from backend_facilite.models import (
+    Delivery, DeliveryStatusEnum, Hotel, Menu, Order, OrderItem, Payment,
+    Restaurant, RoleEnum, Room, User,
+)
+from backend_facilite.routers.payments import compute_commission
+from backend_facilite.utils.ids import new_transaction_code
+
+# Centre de Kinshasa : les établissements et les clients sont répartis autour
+CITY_CENTER = (-4.3250, 15.3222)
+CITY_SPREAD_DEG = 0.05  # ~5,5 km d'écart-type
+METHODS = ("mpesa", "airtel_money", "orange_money", "cash", "visa")
+MENU_CATEGORIES = ("plat", "boisson", "dessert", "entrée")
+BATCH_SIZE = 1000
+
+
+@dataclass
+class Volumes:
+    users: int = 2000
+    couriers: int = 100
+    restaurants: int = 200
+    menus_per_restaurant: int = 10
+    hotels: int = 50
+    rooms_per_hotel: int = 10
+    orders: int = 5000
+    payment_ratio: float = 0.8     # commandes payées
+    delivery_ratio: float = 0.5    # commandes avec livraison
+
+
+@dataclass
+class SeedReport:
+    seed: int
+    volumes: dict
+    rows: dict = field(default_factory=dict)
+
+
+def _point(rng: random.Random, spread: float = CITY_SPREAD_DEG) -> tuple[float, float]:
+    return (
+        round(rng.gauss(CITY_CENTER[0], spread), 6),
+        round(rng.gauss(CITY_CENTER[1], spread), 6),
+    )
+
+
+def _insert(conn, model, rows: list[dict]) -> list[int]:
+    """Insertion par lots ; retourne les ids générés dans l'ordre des lignes."""
+    ids: list[int] = []
+    table = model.__table__
+    for start in range(0, len(rows), BATCH_SIZE):
+        result = conn.execute(
+            insert(table).returning(table.c.id, sort_by_parameter_order=True),
+            rows[start:start + BATCH_SIZE],
+        )
+        ids.extend(result.scalars().all())
+    return ids
+
+
+def reset(engine) -> None:
+    """Vide toutes les tables de l'application (ordre inverse des dépendances)."""
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(delete(table))
+
+
+def seed(engine, volumes: Volumes = Volumes(), seed: int = 42) -> SeedReport:
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    report = SeedReport(seed=seed, volumes=asdict(volumes))
+
+    with engine.begin() as conn:
+        # --- Utilisateurs : un gérant par établissement, des livreurs, 3 admins, des clients
+        roles = (
+            [RoleEnum.admin] * 3
+            + [RoleEnum.restaurant_manager] * volumes.restaurants
+            + [RoleEnum.hotel_manager] * volumes.hotels
+            + [RoleEnum.delivery_person] * volumes.couriers
+        )
+        roles += [RoleEnum.client] * max(volumes.users - len(roles), 1)
+        user_ids = _insert(conn, User, [
+            {
+                "name": f"{role.value}-{i}",
+                "phone_number": f"+24381{seed % 100:02d}{i:07d}",
+                "role": role,
+                "is_active": True,
+                "is_staff": role == RoleEnum.admin,
+                "created_at": now - timedelta(days=rng.randint(0, 365)),
+            }
+            for i, role in enumerate(roles)
+        ])
+        by_role: dict[RoleEnum, list[int]] = {}
+        for user_id, role in zip(user_ids, roles):
+            by_role.setdefault(role, []).append(user_id)
+
+        # --- Restaurants et menus
+        restaurant_points = [_point(rng) for _ in range(volumes.restaurants)]
+        restaurant_ids = _insert(conn, Restaurant, [
+            {
+                "owner_id": owner_id,
+                "name": f"Restaurant {i}",
+                "address": f"{rng.randint(1, 300)} avenue {rng.choice(('Kasa-Vubu', 'Lumumba', 'du Commerce'))}",
+                "latitude": lat,
+                "longitude": lon,
+            }
+            for i, (owner_id, (lat, lon)) in enumerate(
+                zip(by_role[RoleEnum.restaurant_manager], restaurant_points)
+            )
+        ])
+        menu_rows = [
+            {
+                "restaurant_id": restaurant_id,
+                "name": f"Plat {restaurant_id}-{j}",
+                "category": rng.choice(MENU_CATEGORIES),
+                "price": round(rng.uniform(2, 40), 2),
+            }
+            for restaurant_id in restaurant_ids
+            for j in range(volumes.menus_per_restaurant)
+        ]
+        menu_ids = _insert(conn, Menu, menu_rows)
+        menus_by_restaurant: dict[int, list[tuple[int, float]]] = {}
+        for menu_id, row in zip(menu_ids, menu_rows):
+            menus_by_restaurant.setdefault(row["restaurant_id"], []).append((menu_id, row["price"]))
+
+        # --- Hôtels et chambres
+        hotel_ids = _insert(conn, Hotel, [
+            {"owner_id": owner_id, "name": f"Hôtel {i}", "address": f"{i} boulevard du 30 Juin", "city": "Kinshasa"}
+            for i, owner_id in enumerate(by_role[RoleEnum.hotel_manager])
+        ])
+        _insert(conn, Room, [
+            {
+                "hotel_id": hotel_id,
+                "room_number": f"{100 + j}",
+                "capacity": rng.choice((1, 2, 2, 3, 4)),
+                "price_per_night": round(rng.uniform(30, 250), 2),
+            }
+            for hotel_id in hotel_ids
+            for j in range(volumes.rooms_per_hotel)
+        ])
+
+        # --- Commandes (client proche du restaurant) et lignes de commande
+        clients = by_role[RoleEnum.client]
+        order_rows, order_items = [], []
+        for _ in range(volumes.orders):
+            index = rng.randrange(len(restaurant_ids))
+            restaurant_id = restaurant_ids[index]
+            lat, lon = restaurant_points[index]
+            picks = rng.sample(menus_by_restaurant[restaurant_id], k=min(3, len(menus_by_restaurant[restaurant_id])))
+            items = [(menu_id, rng.randint(1, 3), price) for menu_id, price in picks[:rng.randint(1, len(picks))]]
+            order_rows.append({
+                "user_id": rng.choice(clients),
+                "restaurant_id": restaurant_id,
+                "total": round(sum(q * price for _, q, price in items), 2),
+                "created_at": now - timedelta(minutes=rng.randint(0, 30 * 24 * 60)),
+                "latitude": round(lat + rng.gauss(0, 0.02), 6),
+                "longitude": round(lon + rng.gauss(0, 0.02), 6),
+            })
+            order_items.append(items)
+        order_ids = _insert(conn, Order, order_rows)
+        _insert(conn, OrderItem, [
+            {"order_id": order_id, "menu_id": menu_id, "quantity": quantity}
+            for order_id, items in zip(order_ids, order_items)
+            for menu_id, quantity, _ in items
+        ])
+
+        # --- Paiements (réussis, QR non utilisé) et livraisons
+        payment_rows = []
+        for order_id, row in zip(order_ids, order_rows):
+            if rng.random() >= volumes.payment_ratio:
+                continue
+            method = rng.choice(METHODS)
+            amount = max(row["total"], 1.0)
+            commission = compute_commission(amount, method)
+            payment_rows.append({
+                "user_id": row["user_id"],
+                "order_id": order_id,
+                "amount": amount,
+                "commission": commission,
+                "net_amount": amount - commission,
+                "payment_method": method,
+                "status": "success",
+                "transaction_code": new_transaction_code(),
+                "is_used": False,
+                "created_at": row["created_at"],
+            })
+        _insert(conn, Payment, payment_rows)
+
+        delivery_rows = [
+            {
+                "order_id": order_id,
+                "delivery_person_id": rng.choice(by_role[RoleEnum.delivery_person]),
+                "status": rng.choice(list(DeliveryStatusEnum)),
+                "latitude": row["latitude"],
+                "longitude": row["longitude"],
+                "created_at": row["created_at"],
+            }
+            for order_id, row in zip(order_ids, order_rows)
+            if rng.random() < volumes.delivery_ratio
+        ]
+        _insert(conn, Delivery, delivery_rows)
+
+    report.rows = {
+        "users": len(user_ids),
+        "restaurants": len(restaurant_ids),
+        "menus": len(menu_ids),
+        "hotels": len(hotel_ids),
+        "rooms": len(hotel_ids) * volumes.rooms_per_hotel,
+        "orders": len(order_ids),
+        "order_items": sum(len(items) for items in order_items),
+        "payments": len(payment_rows),
+        "deliveries": len(delivery_rows),
+    }
+    return report
+
+
+# ==========================
+# Jeu de données vu par le trafic
+# ==========================
+@dataclass
+class Dataset:
+    """Identifiants relus en base au début d'un run (échantillons bornés)."""
+    clients: list[int]
+    staff: list[tuple[int, str]]          # (id, rôle) : le rôle est vérifié contre le JWT
+    restaurants: list[int]
+    hotels: list[int]
+    orders_by_user: dict[int, list[int]]
+    orders: list[int]
+    unused_codes: list[str]
+
+    @classmethod
+    def load(cls, db, limit: int = 50_000) -> "Dataset":
+        def ids(query):
+            return [row[0] for row in db.execute(query.limit(limit))]
+
+        orders_by_user: dict[int, list[int]] = {}
+        for order_id, user_id in db.execute(select(Order.id, Order.user_id).limit(limit)):
+            orders_by_user.setdefault(user_id, []).append(order_id)
+        return cls(
+            clients=list(orders_by_user),
+            staff=[
+                (user_id, getattr(role, "value", role))
+                for user_id, role in db.execute(
+                    select(User.id, User.role)
+                    .where(User.role.in_([RoleEnum.admin, RoleEnum.restaurant_manager]))
+                    .limit(limit)
+                )
+            ],
+            restaurants=ids(select(Restaurant.id)),
+            hotels=ids(select(Hotel.id)),
+            orders_by_user=orders_by_user,
+            orders=[order_id for orders in orders_by_user.values() for order_id in orders],
+            unused_codes=ids(select(Payment.transaction_code).where(
+                Payment.status == "success", Payment.is_used.is_(False)
+            )),
+        )
@@ -2,18 +2,78 @@ from fastapi import FastAPI, Depends
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from backend_facilite.config import get_db
-from backend_facilite.database import Base, engine
 from backend_facilite.routers import (
     users, hotels, reservations, restaurants,
     orders, payments, deliveries, location, nearby
 )
-from backend_facilite.auth import router as auth_router
+from backend_facilite.auth import router as auth_router, SECRET_KEY, ALGORITHM
+from backend_facilite.utils.cache import catalog_cache
+from backend_facilite.utils import password_pool
+from backend_facilite.utils.admission import AdmissionControlMiddleware
+from backend_facilite.utils.metrics import MetricsMiddleware, instrument_engine, registry as metrics_registry
+from backend_facilite.utils.sql_profiler import SQLProfilerMiddleware, profile_engine
+from backend_facilite.utils import tracing, outbox, jobs
+from backend_facilite.database import engine
+from backend_facilite.utils.qr_storage import QR_SWEEPER_IN_APP, sweeper as qr_sweeper
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 
 app = FastAPI(title="facilte_app2")
 
+
+# Balayeur des QR sur disque : un seul process par répertoire balaie effectivement
+# (QR_SWEEPER_IN_APP=0 si `python -m backend_facilite.worker` s'en charge)
+@app.on_event("startup")
+def start_qr_sweeper():
+    if QR_SWEEPER_IN_APP:
+        qr_sweeper.start()
+
+
+@app.on_event("shutdown")
+def stop_qr_sweeper():
+    qr_sweeper.stop()
+
+
+# Outbox : publie les événements commités (LISTEN/NOTIFY sur PostgreSQL)
+@app.on_event("startup")
+def start_outbox():
+    outbox.start()
+
+
+@app.on_event("shutdown")
+def stop_outbox():
+    outbox.stop()
+
+
+# File de tâches : threads worker dans l'API (JOB_WORKERS_IN_APP=0 si
+# `python -m backend_facilite.worker` tourne à part)
+@app.on_event("startup")
+def start_job_workers():
+    jobs.start_workers()
+
+
+@app.on_event("shutdown")
+def stop_job_workers():
+    jobs.stop_workers()
+
+
+@app.on_event("shutdown")
+def stop_password_pool():
+    password_pool.shutdown()
+
+
+@app.on_event("shutdown")
+def stop_tracing():
+    tracing.shutdown()
+
+# ==========================
+# Contrôle d'admission (débit + concurrence)
+# ==========================
+# Déclaré avant CORS pour que les 429/503 portent aussi les en-têtes CORS
+app.add_middleware(AdmissionControlMiddleware, secret_key=SECRET_KEY, algorithm=ALGORITHM)
+
 # ==========================
 # Middleware CORS
 # ==========================
@@ -30,15 +90,32 @@ app.add_middleware(
     allow_headers=["*"],          # Tous les headers autorisés
 )
 
+# ==========================
+# Métriques (déclaré après l'admission : englobe aussi ses 429/503)
+# ==========================
+instrument_engine(engine)
+profile_engine(engine)
+# Profil SQL par requête (SQL_PROFILER=1) : N+1, requêtes lentes, X-DB-* en mode DEBUG
+app.add_middleware(SQLProfilerMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+# ==========================
+# Traçage (TRACE_EXPORTER=file|otlp, TRACE_SAMPLE_RATE) : englobe tout le reste
+# ==========================
+tracing.trace_engine(engine)
+app.add_middleware(tracing.TracingMiddleware)
+
 # ==========================
 # Static files
 # ==========================
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", StaticFiles(directory="static", check_dir=False), name="static")
 
 # ==========================
-# Création des tables
+# Schéma de la base
 # ==========================
-Base.metadata.create_all(bind=engine)
+# Plus de create_all à l'import : chaque worker démarrait en interrogeant le
+# catalogue. Le schéma est géré par une étape explicite avant le déploiement :
+#   python -m backend_facilite.init_db   (alembic upgrade head)
 
 # ==========================
 # Routes incluses
@@ -67,3 +144,14 @@ def read_root():
 def test_db(db: Session = Depends(get_db)):
     result = db.execute(text("SELECT 1")).fetchone()
     return {"success": True, "value": result[0]}
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    return catalog_cache.stats()
+
+
+# async : lu dans la boucle événementielle, sans consommer de thread du pool
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
@@ -1,5 +1,5 @@
 # backend_facilite/models.py
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Enum, text
+from sqlalchemy import Column, Integer, String, Float, Boolean, Date, DateTime, ForeignKey, Enum, Text, UniqueConstraint, Index, func, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from backend_facilite.database import Base
@@ -157,6 +157,8 @@ class Reservation(Base):
 # -----------------------
 class Order(Base):
     __tablename__ = "orders"
+    # File cuisine : commandes récentes d'un restaurant
+    __table_args__ = (Index("ix_orders_restaurant_created", "restaurant_id", "created_at"),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -195,7 +197,7 @@ class Payment(Base):
     qr_path = Column(String, nullable=True)
     discount = Column(Float, default=0.0)
 
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)  # fenêtres de règlement
 
     user = relationship("User", back_populates="payments")
     order = relationship("Order")
@@ -218,7 +220,7 @@ class Delivery(Base):
     )
     latitude = Column(Float, nullable=True)
     longitude = Column(Float, nullable=True)
-    created_at = Column(DateTime, server_default=text("NOW()"))
+    created_at = Column(DateTime, server_default=func.now())
 
     order = relationship("Order", back_populates="delivery")
     delivery_person = relationship("User", back_populates="deliveries")
@@ -237,3 +239,102 @@ class OrderItem(Base):
 
     order = relationship("Order", back_populates="items")
     menu = relationship("Menu", back_populates="order_items")
+
+
+# -----------------------
+# CLÉS D'IDEMPOTENCE
+# -----------------------
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (UniqueConstraint("user_id", "key", name="uq_idempotency_user_key"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    key = Column(String, nullable=False)
+    request_hash = Column(String, nullable=False)
+    status_code = Column(Integer, nullable=True)      # NULL tant que la requête est en cours
+    response_body = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    # created_at sert de version : une clé reprise après son bail (idempotency.claim)
+    # fait échouer l'UPDATE tardif de la requête qui l'avait réservée
+    __mapper_args__ = {"version_id_col": created_at, "version_id_generator": False}
+
+
+# -----------------------
+# RÈGLEMENTS MARCHANDS
+# -----------------------
+class Settlement(Base):
+    __tablename__ = "settlements"
+    __table_args__ = (
+        UniqueConstraint("merchant_type", "merchant_id", "settlement_date", name="uq_settlement_merchant_day"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    merchant_type = Column(String, nullable=False)   # "restaurant" | "hotel"
+    merchant_id = Column(Integer, nullable=False)
+    settlement_date = Column(Date, nullable=False, index=True)
+    payment_count = Column(Integer, nullable=False)
+    gross_amount = Column(Float, nullable=False)
+    commission = Column(Float, nullable=False)
+    net_amount = Column(Float, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+# -----------------------
+# OUTBOX (événements écrits dans la transaction du changement d'état)
+# -----------------------
+class OutboxEvent(Base):
+    __tablename__ = "outbox_events"
+    __table_args__ = (
+        # Le dispatcher ne lit que la tête non publiée : index partiel, minuscule
+        Index(
+            "ix_outbox_events_unpublished", "id",
+            postgresql_where=text("published_at IS NULL"),
+            sqlite_where=text("published_at IS NULL"),
+        ),
+    )
+
+    id = Column(Integer, primary_key=True)
+    topic = Column(String, nullable=False)            # "delivery.updated", "payment.created"...
+    aggregate_type = Column(String, nullable=False)   # "delivery" | "payment" | "order"
+    aggregate_id = Column(Integer, nullable=False)
+    payload = Column(Text, nullable=False)            # JSON
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    published_at = Column(DateTime, nullable=True, index=True)
+
+
+# -----------------------
+# FILE DE TÂCHES (effets de bord lents, hors des requêtes)
+# -----------------------
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # Tête de file : seules les tâches en attente, dans l'ordre de prise
+        Index(
+            "ix_jobs_queued", "priority", "run_at", "id",
+            postgresql_where=text("status = 'queued'"),
+            sqlite_where=text("status = 'queued'"),
+        ),
+        # Baux expirés (worker mort en cours de tâche)
+        Index(
+            "ix_jobs_running", "locked_at",
+            postgresql_where=text("status = 'running'"),
+            sqlite_where=text("status = 'running'"),
+        ),
+    )
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)              # "mobile_money.initiate", "qr.render"...
+    payload = Column(Text, nullable=False)             # JSON : arguments nommés du handler
+    priority = Column(Integer, nullable=False, default=50)   # plus petit = plus urgent
+    status = Column(String, nullable=False, default="queued")  # queued | running | done | dead
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = Column(DateTime, nullable=True)
+    locked_by = Column(String, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True, index=True)
@@ -1,15 +1,27 @@
 # backend_facilite/routers/deliveries.py
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, selectinload
+from datetime import datetime, timedelta
 from typing import List
+import os
 
 from backend_facilite.config import get_db
 from backend_facilite.auth import get_current_user
-from backend_facilite.models import Delivery, Order, User, RoleEnum, DeliveryStatusEnum
-from backend_facilite.schemas import DeliveryCreate, DeliveryUpdate, DeliveryOut
+from backend_facilite.models import Delivery, Order, Restaurant, User, RoleEnum, DeliveryStatusEnum
+from backend_facilite.schemas import (
+    DeliveryCreate, DeliveryUpdate, DeliveryOut, BatchAssignRequest, BatchAssignOut, RouteRequest, RouteOut
+)
+from backend_facilite.utils import outbox
 
 router = APIRouter(prefix="/deliveries", tags=["Deliveries"])
 
+# Commandes plus anciennes ignorées par l'assignation groupée
+BATCH_ASSIGN_WINDOW = timedelta(hours=float(os.getenv("BATCH_ASSIGN_WINDOW_HOURS", "12")))
+OPEN_DELIVERY_STATUSES = [DeliveryStatusEnum.pending, DeliveryStatusEnum.accepted, DeliveryStatusEnum.in_progress]
+# Commandes par tournée planifiée (2 arrêts chacune)
+ROUTE_MAX_ORDERS = int(os.getenv("ROUTE_MAX_ORDERS", "15"))
+
 
 # -----------------------
 # Helpers
@@ -27,6 +39,18 @@ def require_roles(user: User, roles: list[str]):
         raise HTTPException(status_code=403, detail="Accès interdit")
 
 
+def record_delivery_event(db: Session, topic: str, d: Delivery):
+    """Événement outbox, commité avec la livraison."""
+    outbox.record(db, topic, "delivery", d.id, {
+        "delivery_id": d.id,
+        "order_id": d.order_id,
+        "delivery_person_id": d.delivery_person_id,
+        "status": d.status,
+        "latitude": d.latitude,
+        "longitude": d.longitude,
+    })
+
+
 # -----------------------
 # 1. Assignation d'une livraison (admin + restaurant_manager)
 # -----------------------
@@ -51,7 +75,8 @@ def assign_delivery(
         if order.restaurant.owner_id != current_user.id:
             raise HTTPException(status_code=403, detail="Vous ne pouvez assigner que les commandes de vos restaurants")
 
-    delivery_person = db.query(User).filter(User.id == payload.delivery_person_id).first()
+    # Verrou du livreur jusqu'au commit : une assignation groupée concurrente le saute
+    delivery_person = db.query(User).filter(User.id == payload.delivery_person_id).with_for_update().first()
     if not delivery_person:
         raise HTTPException(status_code=404, detail="Livreur introuvable")
     if not has_role(delivery_person, "delivery_person"):
@@ -70,11 +95,262 @@ def assign_delivery(
         longitude=payload.longitude,
     )
     db.add(d)
+    db.flush()
+    record_delivery_event(db, "delivery.assigned", d)
     db.commit()
     db.refresh(d)
     return d
 
 
+# -----------------------
+# 1 bis. Assignation groupée (admin + restaurant_manager)
+# -----------------------
+def _last_positions(db: Session, driver_ids: list[int]) -> dict[int, tuple[float, float]]:
+    """Dernière position connue de chaque livreur : celle de sa livraison la plus récente."""
+    if not driver_ids:
+        return {}
+    latest = (
+        select(func.max(Delivery.id))
+        .where(
+            Delivery.delivery_person_id.in_(driver_ids),
+            Delivery.latitude.isnot(None),
+            Delivery.longitude.isnot(None),
+        )
+        .group_by(Delivery.delivery_person_id)
+    )
+    rows = db.query(Delivery.delivery_person_id, Delivery.latitude, Delivery.longitude).filter(Delivery.id.in_(latest))
+    return {driver_id: (lat, lon) for driver_id, lat, lon in rows}
+
+
+def _still_free(db: Session, driver_ids: list[int]) -> set[int]:
+    """
+    Relecture après verrouillage des livreurs : la requête de sélection a pu voir
+    un instantané antérieur au commit d'une assignation concurrente.
+    """
+    if not driver_ids:
+        return set()
+    busy = db.query(Delivery.delivery_person_id).filter(
+        Delivery.delivery_person_id.in_(driver_ids), Delivery.status.in_(OPEN_DELIVERY_STATUSES)
+    )
+    return set(driver_ids) - {driver_id for (driver_id,) in busy}
+
+
+@router.post("/batch-assign", response_model=BatchAssignOut)
+def batch_assign_deliveries(
+    payload: BatchAssignRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Assigne d'un coup les commandes sans livraison aux livreurs libres en
+    minimisant la distance totale livreur -> restaurant. Toutes les livraisons
+    sont créées dans une seule transaction (rien avec dry_run).
+    """
+    require_roles(current_user, ["admin", "restaurant_manager"])
+    import numpy as np  # import différé : démarrage plus rapide
+
+    from backend_facilite.utils import dispatch
+
+    # ✅ Commandes sans livraison, du restaurant localisé ; la plus ancienne d'abord
+    orders_query = (
+        db.query(Order.id, Restaurant.latitude, Restaurant.longitude)
+        .join(Restaurant, Restaurant.id == Order.restaurant_id)
+        .outerjoin(Delivery, Delivery.order_id == Order.id)
+        .filter(
+            Delivery.id.is_(None),
+            Order.created_at >= datetime.utcnow() - BATCH_ASSIGN_WINDOW,
+            Restaurant.latitude.isnot(None),
+            Restaurant.longitude.isnot(None),
+        )
+        .order_by(Order.created_at, Order.id)
+    )
+    if has_role(current_user, "restaurant_manager"):
+        orders_query = orders_query.filter(Restaurant.owner_id == current_user.id)
+    if payload.restaurant_id is not None:
+        orders_query = orders_query.filter(Order.restaurant_id == payload.restaurant_id)
+    if not payload.dry_run:
+        # Deux assignations groupées simultanées ne se disputent pas les mêmes commandes
+        orders_query = orders_query.with_for_update(of=Order, skip_locked=True)
+    orders = orders_query.all()
+
+    # ✅ Livreurs actifs sans livraison en cours
+    busy = select(Delivery.delivery_person_id).where(Delivery.status.in_(OPEN_DELIVERY_STATUSES))
+    drivers_query = db.query(User.id).filter(
+        User.role == RoleEnum.delivery_person,
+        User.is_active.isnot(False),
+        User.id.notin_(busy),
+    )
+    if not payload.dry_run:
+        # Livreurs verrouillés jusqu'au commit : une autre assignation (groupée ou
+        # manuelle) les saute ou attend, un livreur n'a pas deux livraisons d'un coup
+        drivers_query = drivers_query.with_for_update(of=User, skip_locked=True)
+    if payload.drivers is not None:
+        positions = {d.delivery_person_id: (d.latitude, d.longitude) for d in payload.drivers}
+        free = _still_free(db, [driver_id for (driver_id,) in drivers_query.filter(User.id.in_(list(positions)))])
+        unavailable = sorted(set(positions) - free)
+        if unavailable:
+            raise HTTPException(status_code=400, detail=f"Livreurs introuvables, déjà en livraison ou en cours d'assignation : {unavailable}")
+        drivers = list(positions)
+    else:
+        drivers = [driver_id for (driver_id,) in drivers_query.order_by(User.id)]
+        free = _still_free(db, drivers)
+        drivers = [d for d in drivers if d in free]
+        positions = _last_positions(db, drivers)
+    located = [d for d in drivers if d in positions]
+    unlocated = [d for d in drivers if d not in positions]
+
+    # ✅ Matrice livreurs x commandes en un passage, puis affectation optimale
+    distances = dispatch.distance_matrix(
+        [positions[d] for d in located], [(lat, lon) for _, lat, lon in orders]
+    )
+    rows, cols, method = dispatch.assign(distances, payload.max_pickup_km)
+    # Référence "à la main" : la commande la plus ancienne au premier livreur libre
+    naive_km = float(np.trace(distances[:len(rows), :len(rows)]))
+    total_km = float(distances[rows, cols].sum())
+
+    assignments = [
+        {"order_id": orders[c][0], "delivery_person_id": located[r], "pickup_km": round(float(distances[r, c]), 3)}
+        for r, c in sorted(zip(rows.tolist(), cols.tolist()), key=lambda rc: rc[1])
+    ]
+    if assignments and not payload.dry_run:
+        created = [
+            Delivery(
+                order_id=a["order_id"],
+                delivery_person_id=a["delivery_person_id"],
+                status=DeliveryStatusEnum.pending,
+                latitude=positions[a["delivery_person_id"]][0],
+                longitude=positions[a["delivery_person_id"]][1],
+            )
+            for a in assignments
+        ]
+        db.add_all(created)
+        db.flush()
+        for a, d in zip(assignments, created):
+            a["delivery_id"] = d.id
+            record_delivery_event(db, "delivery.assigned", d)
+        db.commit()
+
+    assigned_orders = {a["order_id"] for a in assignments}
+    assigned_drivers = {a["delivery_person_id"] for a in assignments}
+    return {
+        "method": method,
+        "assignments": assignments,
+        "total_km": round(total_km, 2),
+        "naive_km": round(naive_km, 2),
+        "saved_km": round(naive_km - total_km, 2),
+        "unassigned_orders": [order_id for order_id, _, _ in orders if order_id not in assigned_orders],
+        "idle_drivers": [d for d in located if d not in assigned_drivers],
+        "unlocated_drivers": unlocated,
+    }
+
+
+# -----------------------
+# 1 ter. Tournée multi-commandes d'un livreur
+# -----------------------
+@router.post("/route", response_model=RouteOut)
+def plan_delivery_route(
+    payload: RouteRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Ordre de passage (récupérations au restaurant, remises au client) et heures
+    d'arrivée estimées pour un livreur qui porte plusieurs commandes. Une
+    livraison "in_progress" est considérée récupérée : seule la remise reste.
+    """
+    require_roles(current_user, ["delivery_person", "admin", "restaurant_manager"])
+    from backend_facilite.utils import routing  # import différé (numpy) : démarrage plus rapide
+
+    is_driver = has_role(current_user, "delivery_person")
+    driver_id = payload.delivery_person_id or current_user.id
+    if is_driver and driver_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Un livreur ne planifie que sa propre tournée")
+    driver = db.query(User).filter(User.id == driver_id).first()
+    if not driver or not has_role(driver, "delivery_person"):
+        raise HTTPException(status_code=404, detail="Livreur introuvable")
+
+    if payload.order_ids is not None:
+        order_ids = list(dict.fromkeys(payload.order_ids))
+    else:
+        order_ids = [order_id for (order_id,) in db.query(Delivery.order_id).filter(
+            Delivery.delivery_person_id == driver_id, Delivery.status.in_(OPEN_DELIVERY_STATUSES)
+        ).order_by(Delivery.id)]
+    if not order_ids:
+        raise HTTPException(status_code=400, detail="Aucune commande à planifier")
+    if len(order_ids) > ROUTE_MAX_ORDERS:
+        raise HTTPException(status_code=400, detail=f"Au plus {ROUTE_MAX_ORDERS} commandes par tournée")
+
+    orders = {
+        o.id: o for o in db.query(Order).options(selectinload(Order.restaurant)).filter(Order.id.in_(order_ids))
+    }
+    missing = [order_id for order_id in order_ids if order_id not in orders]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Commandes introuvables : {missing}")
+    if has_role(current_user, "restaurant_manager") and any(
+        o.restaurant.owner_id != current_user.id for o in orders.values()
+    ):
+        raise HTTPException(status_code=403, detail="Vous ne pouvez planifier que les commandes de vos restaurants")
+
+    # ✅ Chaque commande : livraison ouverte de ce livreur, ou (admin/manager) pas encore de livraison
+    deliveries = {d.order_id: d for d in db.query(Delivery).filter(Delivery.order_id.in_(order_ids))}
+    unavailable = [
+        order_id for order_id in order_ids
+        if (order_id not in deliveries and is_driver) or (order_id in deliveries and (
+            deliveries[order_id].delivery_person_id != driver_id
+            or deliveries[order_id].status not in OPEN_DELIVERY_STATUSES
+        ))
+    ]
+    if unavailable:
+        raise HTTPException(status_code=400, detail=f"Commandes non assignées à ce livreur : {unavailable}")
+
+    route_orders, unlocated = [], []
+    for order_id in order_ids:
+        order = orders[order_id]
+        delivery = deliveries.get(order_id)
+        picked_up = delivery is not None and delivery.status == DeliveryStatusEnum.in_progress
+        restaurant = order.restaurant
+        if order.latitude is None or order.longitude is None or (
+            not picked_up and (restaurant.latitude is None or restaurant.longitude is None)
+        ):
+            unlocated.append(order_id)
+            continue
+        route_orders.append(routing.RouteOrder(
+            order_id,
+            dropoff=(order.latitude, order.longitude),
+            pickup=None if picked_up else (restaurant.latitude, restaurant.longitude),
+        ))
+    if unlocated:
+        raise HTTPException(status_code=400, detail=f"Commandes sans coordonnées : {unlocated}")
+
+    # Départ : position fournie, sinon dernière position connue, sinon le premier arrêt
+    if payload.start_latitude is not None and payload.start_longitude is not None:
+        start = (payload.start_latitude, payload.start_longitude)
+    else:
+        first = route_orders[0]
+        start = _last_positions(db, [driver_id]).get(driver_id) or first.pickup or first.dropoff
+
+    departure = datetime.utcnow()
+    stops = routing.schedule(routing.plan_route(start, route_orders), departure)
+    # Référence : les commandes une par une, dans l'ordre reçu
+    sequential = [
+        routing.Stop(kind, o.order_id, *point)
+        for o in route_orders
+        for kind, point in (("pickup", o.pickup), ("dropoff", o.dropoff))
+        if point is not None
+    ]
+    return {
+        "delivery_person_id": driver_id,
+        "stops": [
+            {"kind": s.kind, "order_id": s.order_id, "latitude": s.latitude, "longitude": s.longitude,
+             "leg_km": round(s.leg_km, 3), "eta": s.eta}
+            for s in stops
+        ],
+        "total_km": round(sum(s.leg_km for s in stops), 2),
+        "sequential_km": round(routing.route_length(start, sequential), 2),
+        "duration_minutes": round((stops[-1].eta - departure).total_seconds() / 60, 1),
+    }
+
+
 # -----------------------
 # 2. Le livreur voit ses livraisons
 # -----------------------
@@ -143,6 +419,7 @@ def update_delivery(
     if payload.longitude is not None:
         d.longitude = payload.longitude
 
+    record_delivery_event(db, "delivery.updated", d)
     db.commit()
     db.refresh(d)
     return d
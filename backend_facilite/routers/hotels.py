@@ -8,6 +8,8 @@ from backend_facilite.schemas import (
     RoomCreate, RoomReponse ,
     ReservationCreate, ReservationOut
 )
+from backend_facilite.utils.cache import catalog_cache, catalog_changed
+from backend_facilite.utils.http_cache import conditional_get
 from typing import List
 
 router = APIRouter(prefix="/hotels", tags=["Hotels"])
@@ -39,19 +41,31 @@ def create_hotel(
     db.add(db_hotel)
     db.commit()
     db.refresh(db_hotel)
+    catalog_changed("hotels")
     return db_hotel
 
 
 # ✅ Récupérer tous les hôtels
-@router.get("/", response_model=List[HotelResponse])
+@router.get("/", response_model=List[HotelResponse], dependencies=[Depends(conditional_get("hotels"))])
 def get_hotels(db: Session = Depends(get_db)):
-    return db.query(Hotel).all()
+    return catalog_cache.get_or_load("hotels", lambda: [
+        HotelResponse.model_validate(h).model_dump(mode="json")
+        for h in db.query(Hotel).all()
+    ])
 
 
 # ✅ Récupérer un hôtel par ID
-@router.get("/{hotel_id}", response_model=HotelResponse)
+@router.get(
+    "/{hotel_id}",
+    response_model=HotelResponse,
+    dependencies=[Depends(conditional_get("hotel", "hotel_id"))],
+)
 def get_hotel(hotel_id: int, db: Session = Depends(get_db)):
-    hotel = db.query(Hotel).filter(Hotel.id == hotel_id).first()
+    def load():
+        h = db.query(Hotel).filter(Hotel.id == hotel_id).first()
+        return HotelResponse.model_validate(h).model_dump(mode="json") if h else None
+
+    hotel = catalog_cache.get_or_load(f"hotel:{hotel_id}", load)
     if not hotel:
         raise HTTPException(status_code=404, detail="Hôtel introuvable")
     return hotel
@@ -77,6 +91,7 @@ def update_hotel(
 
     db.commit()
     db.refresh(db_hotel)
+    catalog_changed("hotels", f"hotel:{hotel_id}")
     return db_hotel
 
 
@@ -96,6 +111,7 @@ def delete_hotel(
 
     db.delete(hotel)
     db.commit()
+    catalog_changed("hotels", f"hotel:{hotel_id}", f"rooms:{hotel_id}")
     return {"message": "Hôtel supprimé avec succès"}
 
 
@@ -125,12 +141,20 @@ def add_room(
     db.add(db_room)
     db.commit()
     db.refresh(db_room)
+    catalog_changed(f"rooms:{hotel_id}")
     return db_room
 
 
-@router.get("/{hotel_id}/rooms", response_model=List[RoomReponse])
+@router.get(
+    "/{hotel_id}/rooms",
+    response_model=List[RoomReponse],
+    dependencies=[Depends(conditional_get("rooms", "hotel_id"))],
+)
 def list_rooms(hotel_id: int, db: Session = Depends(get_db)):
-    return db.query(Room).filter(Room.hotel_id == hotel_id).all()
+    return catalog_cache.get_or_load(f"rooms:{hotel_id}", lambda: [
+        RoomReponse.model_validate(r).model_dump(mode="json")
+        for r in db.query(Room).filter(Room.hotel_id == hotel_id).all()
+    ])
 
 
 # -----------------------
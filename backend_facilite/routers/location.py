@@ -1,6 +1,5 @@
 # backend_facilite/routers/location.py
 from fastapi import APIRouter, Query
-from geopy.distance import geodesic
 
 router = APIRouter(prefix="/location", tags=["Location"])
 
@@ -14,6 +13,8 @@ def calculate_distance(
     """
     Calcule la distance entre deux points (A et B) en kilomètres.
     """
+    from geopy.distance import geodesic  # import différé : démarrage plus rapide
+
     pointA = (lat1, lon1)
     pointB = (lat2, lon2)
     distance_km = geodesic(pointA, pointB).km
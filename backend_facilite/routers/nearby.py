@@ -1,7 +1,6 @@
 # backend_facilite/routers/nearby.py
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
-from geopy.distance import geodesic
 from typing import List, Dict, Any, Optional
 from backend_facilite.database import get_db
 from backend_facilite.models import  Restaurant, Hotel
@@ -20,6 +19,8 @@ def get_nearby_places(
     Retourne les restaurants et hôtels proches avec leurs notes (rating).
     """
 
+    from geopy.distance import geodesic  # import différé : démarrage plus rapide
+
     user_location = (latitude, longitude)
     results = []
 
@@ -1,13 +1,21 @@
 # backend_facilite/routers/orders.py 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from backend_facilite.config import get_db
 from backend_facilite.auth import get_current_user
+from backend_facilite.database import SessionLocal
 from backend_facilite.models import Order, OrderItem, Menu, Restaurant
 from backend_facilite.schemas import OrderCreate, OrderResponse
+from backend_facilite.utils import outbox
+from backend_facilite.utils.kitchen import board as kitchen_board, format_sse
 from typing import List
+import asyncio
 import math
 
+KITCHEN_HEARTBEAT_SECONDS = 15
+
 router = APIRouter(prefix="/orders", tags=["Orders"])
 
 
@@ -52,6 +60,115 @@ def get_nearby_orders(
     return nearby_orders
 
 
+# -----------------------
+# Passer une commande
+# -----------------------
+@router.post("/", response_model=OrderResponse)
+def create_order(payload: OrderCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    if not payload.items:
+        raise HTTPException(status_code=400, detail="Commande vide")
+
+    menus = {
+        m.id: m for m in db.query(Menu).filter(
+            Menu.id.in_([item.menu_id for item in payload.items]),
+            Menu.restaurant_id == payload.restaurant_id,
+        )
+    }
+    if len(menus) != len({item.menu_id for item in payload.items}):
+        raise HTTPException(status_code=400, detail="Plat introuvable dans ce restaurant")
+
+    order = Order(
+        user_id=user.id,
+        restaurant_id=payload.restaurant_id,
+        latitude=payload.latitude,
+        longitude=payload.longitude,
+        total=round(sum(menus[item.menu_id].price * item.quantity for item in payload.items), 2),
+        items=[OrderItem(menu_id=item.menu_id, quantity=item.quantity) for item in payload.items],
+    )
+    db.add(order)
+    db.flush()
+    outbox.record(db, "order.created", "order", order.id, {
+        "order_id": order.id,
+        "restaurant_id": order.restaurant_id,
+        "user_id": order.user_id,
+        "total": order.total,
+        "created_at": order.created_at,
+        "latitude": order.latitude,
+        "longitude": order.longitude,
+        "items": [
+            {"menu_id": item.menu_id, "name": menus[item.menu_id].name, "quantity": item.quantity}
+            for item in order.items
+        ],
+    })
+    db.commit()
+    db.refresh(order)
+    return order
+
+
+# -----------------------
+# File cuisine (managers) : commandes ouvertes, poussées en direct
+# -----------------------
+def _kitchen_restaurants(user, restaurant_id: int | None) -> list[int]:
+    """Restaurants visibles : ceux du manager (ou celui demandé), n'importe lequel pour l'admin."""
+    if user.role == "admin":
+        if restaurant_id is None:
+            raise HTTPException(status_code=400, detail="restaurant_id requis pour un admin")
+        return [restaurant_id]
+    if user.role != "restaurant_manager":
+        raise HTTPException(status_code=403, detail="Réservé aux gérants de restaurant")
+    db = SessionLocal()
+    try:
+        owned = [rid for (rid,) in db.query(Restaurant.id).filter(Restaurant.owner_id == user.id)]
+    finally:
+        db.close()
+    if restaurant_id is not None:
+        if restaurant_id not in owned:
+            raise HTTPException(status_code=403, detail="Ce restaurant ne vous appartient pas")
+        return [restaurant_id]
+    return owned
+
+
+def _kitchen_snapshot(restaurant_ids: list[int]) -> dict[int, list[dict]]:
+    return {rid: kitchen_board.snapshot(rid) for rid in restaurant_ids}
+
+
+@router.get("/kitchen")
+def kitchen_queue(restaurant_id: int | None = None, user=Depends(get_current_user)):
+    return _kitchen_snapshot(_kitchen_restaurants(user, restaurant_id))
+
+
+# SSE : "snapshot" à la connexion, puis "upsert" / "remove" à chaque événement.
+# async : le flux n'occupe aucun thread du pool pendant qu'il attend.
+@router.get("/kitchen/stream")
+async def kitchen_stream(request: Request, restaurant_id: int | None = None, user=Depends(get_current_user)):
+    restaurant_ids = await run_in_threadpool(_kitchen_restaurants, user, restaurant_id)
+
+    async def events():
+        # Abonné avant le snapshot : rien n'est perdu entre les deux (upserts idempotents)
+        listener = kitchen_board.listen(restaurant_ids, asyncio.get_running_loop())
+        try:
+            yield format_sse("snapshot", await run_in_threadpool(_kitchen_snapshot, restaurant_ids))
+            while True:
+                try:
+                    message = await asyncio.wait_for(listener.queue.get(), KITCHEN_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": ping\n\n"
+                    continue
+                if message is None:   # client trop lent : il se reconnecte et repart d'un snapshot
+                    return
+                yield message
+        finally:
+            kitchen_board.unlisten(listener)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # -----------------------
 # Voir mes commandes
 # -----------------------
@@ -85,6 +202,13 @@ def update_order_location(
 
     order.latitude = lat
     order.longitude = lon
+    outbox.record(db, "order.location_updated", "order", order.id, {
+        "order_id": order.id,
+        "user_id": order.user_id,
+        "restaurant_id": order.restaurant_id,
+        "latitude": lat,
+        "longitude": lon,
+    })
     db.commit()
     db.refresh(order)
     return {"status": "ok", "order_id": order.id, "latitude": lat, "longitude": lon}
@@ -1,16 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
 from backend_facilite.config import get_db
+from backend_facilite.database import SessionLocal
 from backend_facilite.auth import get_current_user
 
 from backend_facilite.models import Payment, Order, Reservation, User
 from backend_facilite.schemas import PaymentCreate, PaymentOut
 from typing import List
-from datetime import datetime
-from sqlalchemy import func
-import os
-
-from backend_facilite.utils.qrcode_utils import ensure_tx_code, generate_qr_png
+from sqlalchemy import func, update
+from backend_facilite.utils.sql_compat import date_trunc
+import json
+from backend_facilite.utils.qrcode_utils import (
+    QR_FORMATS, ensure_tx_code, qr_payload, get_qr,
+    enqueue_qr_render, prerender_qr, schedule_qr_removal, forget_qr, negotiate_qr_format
+)
+from backend_facilite.utils import idempotency, jobs, outbox
+from backend_facilite.utils.mobile_money import (
+    MOBILE_MONEY_METHODS, MOBILE_MONEY_MODE, PUBLIC_BASE_URL,
+    GatewayError, gateway, verify_webhook
+)
 
 router = APIRouter(prefix="/payments", tags=["Payments"])
 
@@ -27,30 +35,75 @@ def compute_commission(amount: float, method: str) -> float:
         gateway = 0.01 * amount
     return app_fee + gateway
 
-# ✅ Créer un paiement avec génération QR Code#
 
-@router.post("/", response_model=PaymentOut)
-def create_payment(
-    payment: PaymentCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
-):
-    if not payment.order_id and not payment.reservation_id:
-        raise HTTPException(status_code=400, detail="Un paiement doit être lié à une commande ou une réservation.")
+# ✅ Règlement d'un paiement en attente (webhook opérateur ou abandon du débit)
+def _settle_payment(db: Session, tx_code: str, status: str, provider: str | None = None) -> bool:
+    """
+    pending -> success/failed, avec son événement payment.updated dans la même
+    transaction (l'appelant commite). Conditionnel sur "pending" : rejouer ne
+    change rien et n'émet rien.
+    """
+    query = update(Payment).where(Payment.transaction_code == tx_code, Payment.status == "pending")
+    if provider is not None:
+        query = query.where(Payment.payment_method == provider)
+    row = db.execute(
+        query.values(status=status)
+        .returning(Payment.id, Payment.order_id, Payment.reservation_id)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if row is None:
+        return False
+    payment_id, order_id, reservation_id = row
+    outbox.record(db, "payment.updated", "payment", payment_id, {
+        "payment_id": payment_id,
+        "transaction_code": tx_code,
+        "order_id": order_id,
+        "reservation_id": reservation_id,
+        "status": status,
+    })
+    return True
+
+
+# ✅ Mobile Money : débit demandé à l'opérateur par un worker (tâche durable)
+def _set_payment_status(tx_code: str, status: str) -> None:
+    db = SessionLocal()
+    try:
+        _settle_payment(db, tx_code, status)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _mobile_money_abandoned(method: str, amount: float, phone: str, tx_code: str) -> None:
+    _set_payment_status(tx_code, "failed")
+
+
+# Retries courts dans le client (coupure réseau), longs dans la file (opérateur
+# en panne) ; la référence sert de clé d'idempotence chez l'opérateur.
+# Tâche async : des centaines d'appels en vol sur la boucle partagée des
+# workers, avec un seul client (pool keep-alive) fermé à l'arrêt des workers.
+@jobs.handler("mobile_money.initiate", max_attempts=6, on_dead=_mobile_money_abandoned)
+async def _initiate_mobile_money(method: str, amount: float, phone: str, tx_code: str) -> None:
+    try:
+        await gateway.initiate(
+            method, amount, phone, reference=tx_code,
+            callback_url=f"{PUBLIC_BASE_URL}/payments/webhooks/{method}",
+        )
+    except GatewayError as exc:
+        if not exc.retryable:
+            raise jobs.PermanentJobError(str(exc)) from exc
+        raise
 
-    if payment.payment_method not in SUPPORTED:
-        raise HTTPException(status_code=400, detail="Méthode de paiement non supportée")
 
-    # Vérifications
-    if payment.order_id and not db.query(Order).filter(Order.id == payment.order_id).first():
-        raise HTTPException(status_code=404, detail="Commande introuvable")
+jobs.async_runner.at_shutdown(gateway.aclose)
 
-    if payment.reservation_id and not db.query(Reservation).filter(Reservation.id == payment.reservation_id).first():
-        raise HTTPException(status_code=404, detail="Réservation introuvable")
 
+def _record_payment(payment, db, current_user, idem_record=None) -> dict:
+    """Insère le paiement et commite une seule fois (avec la réponse idempotente éventuelle)."""
     commission = compute_commission(payment.amount, payment.payment_method)
     net_amount = payment.amount - commission
     tx_code = ensure_tx_code()
+    via_gateway = MOBILE_MONEY_MODE == "gateway" and payment.payment_method in MOBILE_MONEY_METHODS
 
     db_payment = Payment(
         user_id=current_user.id,
@@ -60,37 +113,143 @@ def create_payment(
         net_amount=net_amount,
         commission=commission,
         payment_method=payment.payment_method,
-        status="success",
+        status="pending" if via_gateway else "success",
         transaction_code=tx_code,
         is_used=False,
     )
     db.add(db_payment)
+    db.flush()
+    outbox.record(db, "payment.created", "payment", db_payment.id, {
+        "payment_id": db_payment.id,
+        "transaction_code": tx_code,
+        "user_id": db_payment.user_id,
+        "order_id": db_payment.order_id,
+        "reservation_id": db_payment.reservation_id,
+        "amount": db_payment.amount,
+        "payment_method": db_payment.payment_method,
+        "status": db_payment.status,
+    })
+
+    result = PaymentOut.model_validate(db_payment).model_dump(mode="json")
+    result["qr_url"] = f"/payments/{tx_code}/qr"
+    qr_data = qr_payload(db_payment)
+    if idem_record is not None:
+        idempotency.store_response(idem_record, result)
+    # ✅ Effets de bord mis en file dans la même transaction : rien n'est perdu
+    # si le process s'arrête après la réponse, rien n'est lancé en cas de rollback
+    if via_gateway:
+        jobs.enqueue(db, "mobile_money.initiate", {
+            "method": payment.payment_method,
+            "amount": payment.amount,
+            "phone": current_user.phone_number,
+            "tx_code": tx_code,
+        }, priority=jobs.PRIORITY_HIGH)
+    # ✅ QR pré-rendu en arrière-plan, servi par GET /payments/{tx_code}/qr :
+    # tâche durable commitée avec le paiement, ou rendu local une fois le commit réussi
+    enqueue_qr_render(db, qr_data)
     db.commit()
-    db.refresh(db_payment)
+    prerender_qr(qr_data)
+    return result
 
-    # ✅ Génération du QR
-    qr_payload = {
-        "transaction_code": tx_code,
-        "user_id": current_user.id,
-        "order_id": payment.order_id,
-        "reservation_id": payment.reservation_id,
-        "ts": int(datetime.utcnow().timestamp()),
-    }
-    qr_filename = f"{tx_code}.png"
-    qr_path = os.path.join("static/qrcodes", qr_filename)
-    generate_qr_png(qr_payload, qr_path)
 
-    db_payment.qr_path = qr_path
-    db.commit()
-    db.refresh(db_payment)
+# ✅ Créer un paiement (le QR est rendu hors de la requête)
+# Un en-tête Idempotency-Key rend les retries du client sans effet : la
+# première réponse est stockée et rejouée.
+@router.post("/", response_model=PaymentOut)
+def create_payment(
+    payment: PaymentCreate,
+    response: Response,
+    idempotency_key: str | None = Header(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    if not payment.order_id and not payment.reservation_id:
+        raise HTTPException(status_code=400, detail="Un paiement doit être lié à une commande ou une réservation.")
 
-    # ✅ Retour URL publique
-    qr_url = f"/static/qrcodes/{qr_filename}"
+    if payment.payment_method not in SUPPORTED:
+        raise HTTPException(status_code=400, detail="Méthode de paiement non supportée")
+
+    # Vérifications
+    if payment.order_id and not db.query(Order).filter(Order.id == payment.order_id).first():
+        raise HTTPException(status_code=404, detail="Commande introuvable")
+
+    if payment.reservation_id and not db.query(Reservation).filter(Reservation.id == payment.reservation_id).first():
+        raise HTTPException(status_code=404, detail="Réservation introuvable")
+
+    if not idempotency_key:
+        return _record_payment(payment, db, current_user)
+
+    with idempotency.single_flight(current_user.id, idempotency_key):
+        record, stored = idempotency.claim(
+            db, current_user.id, idempotency_key,
+            idempotency.request_fingerprint(payment.model_dump()),
+        )
+        if stored is not None:
+            response.headers["Idempotent-Replayed"] = "true"
+            return stored
+        try:
+            return _record_payment(payment, db, current_user, record)
+        except Exception:
+            idempotency.release(db, record)
+            raise
+
+
+# ✅ Image du QR, rendue en mémoire : PNG ou SVG selon l'en-tête Accept
+# Réservée au payeur et au staff ; la ligne est lue avant le cache : un QR déjà
+# validé (éventuellement encore en cache dans un autre process) n'est plus servi
+@router.get("/{tx_code}/qr")
+def get_payment_qr(
+    tx_code: str,
+    request: Request,
+    format: str | None = Query(None, description="png ou svg (prioritaire sur Accept)"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    fmt = negotiate_qr_format(request.headers.get("accept"), format)
+    headers = {"Vary": "Accept", "Cache-Control": "private, max-age=3600"}
+
+    pay = db.query(Payment).filter(Payment.transaction_code == tx_code).first()
+    if not pay:
+        raise HTTPException(status_code=404, detail="Transaction inconnue")
+    if pay.user_id != current_user.id and current_user.role not in STAFF_ROLES:
+        raise HTTPException(status_code=403, detail="Non autorisé")
+    if pay.is_used:
+        raise HTTPException(status_code=410, detail="QR déjà validé / utilisé")
+    image = get_qr(qr_payload(pay), fmt)
+
+    return Response(content=image, media_type=QR_FORMATS[fmt], headers=headers)
 
-    return {
-        **db_payment.__dict__,
-        "qr_url": qr_url
-    }
+
+# ✅ Webhook opérateur : confirmation asynchrone d'un paiement Mobile Money
+async def _raw_body(request: Request) -> bytes:
+    return await request.body()
+
+
+@router.post("/webhooks/{provider}")
+def mobile_money_webhook(
+    provider: str,
+    body: bytes = Depends(_raw_body),
+    x_signature: str | None = Header(None),
+    db: Session = Depends(get_db),
+):
+    if provider not in MOBILE_MONEY_METHODS:
+        raise HTTPException(status_code=404, detail="Opérateur inconnu")
+    if not verify_webhook(body, x_signature):
+        raise HTTPException(status_code=401, detail="Signature invalide")
+
+    try:
+        event = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Corps JSON invalide")
+    if not isinstance(event, dict):
+        raise HTTPException(status_code=400, detail="Corps JSON invalide")
+    if event.get("status") not in ("success", "failed"):
+        raise HTTPException(status_code=400, detail="Statut invalide")
+
+    # Conditionnel sur "pending" : un webhook rejoué ne change plus rien
+    updated = _settle_payment(db, event.get("reference"), event["status"], provider)
+    db.commit()
+    return {"status": "ok", "updated": bool(updated)}
 
 
 # ✅ Lister mes paiements
@@ -119,39 +278,105 @@ def get_payment(payment_id: int, db: Session = Depends(get_db), current_user: Us
 
 
 # ✅ Validation (scan du QR côté staff)
-from pydantic import BaseModel
+# Un seul UPDATE conditionnel : deux scanners à la même porte ne peuvent pas
+# valider le même QR, c'est la base qui arbitre.
+from pydantic import BaseModel, Field
+
+STAFF_ROLES = ["admin", "restaurant_manager", "hotel_manager"]
+MAX_BATCH_VALIDATION = 500
 
 class QRValidateIn(BaseModel):
     transaction_code: str
 
+class QRBatchValidateIn(BaseModel):
+    transaction_codes: List[str] = Field(..., max_length=MAX_BATCH_VALIDATION)
+
+
+def _consume_qr_codes(db: Session, codes: list[str], validated_by: int) -> dict[str, int]:
+    """Marque comme utilisés les codes valides ; retourne {code: payment_id} des codes consommés."""
+    rows = db.execute(
+        update(Payment)
+        .where(
+            Payment.transaction_code.in_(codes),
+            Payment.is_used.is_(False),
+            Payment.status == "success",
+        )
+        .values(is_used=True)
+        .returning(Payment.transaction_code, Payment.id, Payment.order_id, Payment.reservation_id)
+    ).all()
+    for code, payment_id, order_id, reservation_id in rows:
+        outbox.record(db, "payment.validated", "payment", payment_id, {
+            "payment_id": payment_id,
+            "transaction_code": code,
+            "order_id": order_id,
+            "reservation_id": reservation_id,
+            "validated_by": validated_by,
+        })
+    schedule_qr_removal(db, [code for code, *_ in rows])
+    db.commit()
+    for code, *_ in rows:
+        forget_qr(code)
+    return {code: payment_id for code, payment_id, *_ in rows}
+
+
+def _rejection_reasons(db: Session, codes: list[str]) -> dict[str, str]:
+    """Chemin d'échec uniquement : explique pourquoi des codes n'ont pas été consommés."""
+    known = dict(
+        db.query(Payment.transaction_code, Payment.status)
+        .filter(Payment.transaction_code.in_(codes))
+        .all()
+    )
+    return {
+        code: "unknown" if code not in known else ("already_used" if known[code] == "success" else "not_paid")
+        for code in codes
+    }
+
+
 @router.post("/validate")
 def validate_qr(
     body: QRValidateIn,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    if current_user.role not in ["admin", "restaurant_manager", "hotel_manager"]:
+    if current_user.role not in STAFF_ROLES:
         raise HTTPException(status_code=403, detail="Réservé au staff (admin/manager)")
 
-    pay = db.query(Payment).filter(Payment.transaction_code == body.transaction_code).first()
-    if not pay:
-        raise HTTPException(status_code=404, detail="Transaction inconnue")
-
-    if pay.is_used:
+    consumed = _consume_qr_codes(db, [body.transaction_code], current_user.id)
+    if body.transaction_code not in consumed:
+        reason = _rejection_reasons(db, [body.transaction_code])[body.transaction_code]
+        if reason == "unknown":
+            raise HTTPException(status_code=404, detail="Transaction inconnue")
+        if reason == "not_paid":
+            raise HTTPException(status_code=400, detail="Paiement non confirmé")
         raise HTTPException(status_code=400, detail="QR déjà validé / utilisé")
 
-    pay.is_used = True
-    db.commit()
+    return {"status": "ok", "message": "QR validé, accès autorisé", "payment_id": consumed[body.transaction_code]}
 
-    if pay.qr_path and os.path.exists(pay.qr_path):
-        try:
-            os.remove(pay.qr_path)
-            pay.qr_path = None
-            db.commit()
-        except Exception:
-            pass
 
-    return {"status": "ok", "message": "QR validé, accès autorisé", "payment_id": pay.id}
+# ✅ Validation par lot (scanners hors ligne qui remontent leur file d'attente)
+@router.post("/validate/batch")
+def validate_qr_batch(
+    body: QRBatchValidateIn,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    if current_user.role not in STAFF_ROLES:
+        raise HTTPException(status_code=403, detail="Réservé au staff (admin/manager)")
+
+    unique_codes = list(dict.fromkeys(body.transaction_codes))
+    consumed = _consume_qr_codes(db, unique_codes, current_user.id) if unique_codes else {}
+    rejected = _rejection_reasons(db, [c for c in unique_codes if c not in consumed])
+
+    results, seen = [], set()
+    for code in body.transaction_codes:
+        if code in consumed and code not in seen:
+            results.append({"transaction_code": code, "status": "ok", "payment_id": consumed[code]})
+        else:
+            # un doublon dans le même lot compte comme déjà utilisé
+            results.append({"transaction_code": code, "status": rejected.get(code, "already_used")})
+        seen.add(code)
+
+    return {"validated": len(consumed), "results": results}
 
 
 # ✅ Statistiques mensuelles des commissions (admin)
@@ -162,12 +387,12 @@ def get_commission_stats(db: Session = Depends(get_db), current_user: User = Dep
 
     results = (
         db.query(
-            func.date_trunc('month', Payment.created_at).label("mois"),
+            date_trunc('month', Payment.created_at).label("mois"),
             func.sum(Payment.commission).label("total_commission"),
             func.count(Payment.id).label("nb_paiements")
         )
-        .group_by(func.date_trunc('month', Payment.created_at))
-        .order_by(func.date_trunc('month', Payment.created_at))
+        .group_by(date_trunc('month', Payment.created_at))
+        .order_by(date_trunc('month', Payment.created_at))
         .all()
     )
 
@@ -5,6 +5,8 @@ from backend_facilite.auth import get_current_user
 
 from backend_facilite.models import Restaurant, Menu, User
 from backend_facilite.schemas import RestaurantCreate, RestaurantResponse, MenuCreate, MenuResponse
+from backend_facilite.utils.cache import catalog_cache, catalog_changed
+from backend_facilite.utils.http_cache import conditional_get
 from typing import List
 
 router = APIRouter(prefix="/restaurants", tags=["Restaurants"])
@@ -38,13 +40,17 @@ def create_restaurant(
     db.add(db_restaurant)
     db.commit()
     db.refresh(db_restaurant)
+    catalog_changed("restaurants")
     return db_restaurant
 
 
 # ✅ Lister tous les restaurants
-@router.get("/", response_model=List[RestaurantResponse])
+@router.get("/", response_model=List[RestaurantResponse], dependencies=[Depends(conditional_get("restaurants"))])
 def list_restaurants(db: Session = Depends(get_db)):
-    return db.query(Restaurant).all()
+    return catalog_cache.get_or_load("restaurants", lambda: [
+        RestaurantResponse.model_validate(r).model_dump(mode="json")
+        for r in db.query(Restaurant).all()
+    ])
 
 
 # ✅ Ajouter un menu à un restaurant
@@ -58,10 +64,18 @@ def add_menu(restaurant_id: int, menu: MenuCreate, db: Session = Depends(get_db)
     db.add(db_menu)
     db.commit()
     db.refresh(db_menu)
+    catalog_changed(f"menu:{restaurant_id}")
     return db_menu
 
 
 # ✅ Lister les menus d’un restaurant
-@router.get("/{restaurant_id}/menu", response_model=List[MenuResponse])
+@router.get(
+    "/{restaurant_id}/menu",
+    response_model=List[MenuResponse],
+    dependencies=[Depends(conditional_get("menu", "restaurant_id"))],
+)
 def list_menu(restaurant_id: int, db: Session = Depends(get_db)):
-    return db.query(Menu).filter(Menu.restaurant_id == restaurant_id).all()
+    return catalog_cache.get_or_load(f"menu:{restaurant_id}", lambda: [
+        MenuResponse.model_validate(m).model_dump(mode="json")
+        for m in db.query(Menu).filter(Menu.restaurant_id == restaurant_id).all()
+    ])
@@ -289,3 +289,60 @@ class DeliveryOut(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class DriverPosition(BaseModel):
+    delivery_person_id: int
+    latitude: float
+    longitude: float
+
+
+class BatchAssignRequest(BaseModel):
+    # Positions connues des livreurs ; sinon : dernière position de leur dernière livraison
+    drivers: Optional[List[DriverPosition]] = None
+    restaurant_id: Optional[int] = None
+    max_pickup_km: Optional[float] = None
+    dry_run: bool = False
+
+
+class BatchAssignment(BaseModel):
+    order_id: int
+    delivery_person_id: int
+    delivery_id: Optional[int] = None
+    pickup_km: float
+
+
+class BatchAssignOut(BaseModel):
+    method: str
+    assignments: List[BatchAssignment]
+    total_km: float
+    naive_km: float
+    saved_km: float
+    unassigned_orders: List[int]
+    idle_drivers: List[int]
+    unlocated_drivers: List[int]
+
+
+class RouteRequest(BaseModel):
+    delivery_person_id: Optional[int] = None
+    # Par défaut : les livraisons en cours du livreur
+    order_ids: Optional[List[int]] = None
+    start_latitude: Optional[float] = None
+    start_longitude: Optional[float] = None
+
+
+class RouteStop(BaseModel):
+    kind: str
+    order_id: int
+    latitude: float
+    longitude: float
+    leg_km: float
+    eta: datetime
+
+
+class RouteOut(BaseModel):
+    delivery_person_id: int
+    stops: List[RouteStop]
+    total_km: float
+    sequential_km: float
+    duration_minutes: float
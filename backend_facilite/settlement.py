@@ -0,0 +1,176 @@
+# backend_facilite/settlement.py
+"""
+Règlement quotidien des marchands (restaurants et hôtels).
+
+    python -m backend_facilite.settlement --date 2026-10-18 --export reglement.csv
+
+Les paiements réussis du jour sont lus en flux (curseur serveur), rattachés
+à leur marchand via la commande ou la réservation, puis agrégés par lots
+vectorisés. Relancer le job pour une même date remplace ses lignes : le
+résultat est idempotent.
+"""
+import argparse
+import csv
+import sys
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+from backend_facilite.database import SessionLocal
+from backend_facilite.models import Hotel, Order, Payment, Reservation, Restaurant, Settlement
+
+BATCH_SIZE = 50_000
+
+# Clé marchand vectorisable : id * 2 + type (0 = restaurant, 1 = hôtel)
+RESTAURANT, HOTEL = 0, 1
+MERCHANT_TYPES = {RESTAURANT: "restaurant", HOTEL: "hotel"}
+
+
+@dataclass
+class SettlementRun:
+    settlement_date: date
+    payments: int = 0
+    unattributed: int = 0
+    rows: list[dict] | None = None
+
+
+def _payments_query(start: datetime, end: datetime):
+    return (
+        # Colonnes numériques non nulles : chaque lot se convertit d'un bloc en ndarray
+        select(
+            func.coalesce(Order.restaurant_id, -1),
+            func.coalesce(Reservation.hotel_id, -1),
+            func.coalesce(Payment.amount, 0.0),
+            func.coalesce(Payment.commission, 0.0),
+            func.coalesce(Payment.net_amount, 0.0),
+        )
+        .select_from(Payment)
+        .outerjoin(Order, Order.id == Payment.order_id)
+        .outerjoin(Reservation, Reservation.id == Payment.reservation_id)
+        .where(
+            Payment.created_at >= start,
+            Payment.created_at < end,
+            Payment.status == "success",
+        )
+    )
+
+
+def aggregate_batch(rows: list[tuple]) -> tuple[np.ndarray, np.ndarray, int]:
+    """
+    Agrège un lot de lignes (restaurant_id, hotel_id, amount, commission, net).
+    Retourne (clés marchand, sommes [count, gross, commission, net], nb non rattachés).
+    """
+    data = np.array(rows, dtype=np.float64)
+    restaurant_ids = data[:, 0].astype(np.int64)
+    hotel_ids = data[:, 1].astype(np.int64)
+    values = data[:, 2:]
+
+    keys = np.where(
+        restaurant_ids >= 0,
+        restaurant_ids * 2 + RESTAURANT,
+        np.where(hotel_ids >= 0, hotel_ids * 2 + HOTEL, -1),
+    )
+    attributed = keys >= 0
+    keys, values = keys[attributed], values[attributed]
+
+    merchants, inverse = np.unique(keys, return_inverse=True)
+    sums = np.zeros((len(merchants), 4))
+    sums[:, 0] = np.bincount(inverse, minlength=len(merchants))
+    for column in range(3):
+        sums[:, column + 1] = np.bincount(inverse, weights=values[:, column], minlength=len(merchants))
+    return merchants, sums, int((~attributed).sum())
+
+
+def run_settlement(db: Session, settlement_date: date, batch_size: int = BATCH_SIZE) -> SettlementRun:
+    start = datetime.combine(settlement_date, datetime.min.time())
+    end = start + timedelta(days=1)
+    run = SettlementRun(settlement_date)
+    totals: dict[int, np.ndarray] = {}
+
+    result = db.connection().execution_options(stream_results=True, yield_per=batch_size).execute(
+        _payments_query(start, end)
+    )
+    for partition in result.partitions():
+        merchants, sums, unattributed = aggregate_batch(partition)
+        run.payments += len(partition)
+        run.unattributed += unattributed
+        for key, row in zip(merchants.tolist(), sums):
+            if key in totals:
+                totals[key] += row
+            else:
+                totals[key] = row.copy()
+
+    # Remplacement atomique des lignes du jour : relancer le job est sans effet de bord
+    db.query(Settlement).filter(Settlement.settlement_date == settlement_date).delete(synchronize_session=False)
+    run.rows = [
+        {
+            "merchant_type": MERCHANT_TYPES[key % 2],
+            "merchant_id": key // 2,
+            "settlement_date": settlement_date,
+            "payment_count": int(row[0]),
+            "gross_amount": round(float(row[1]), 2),
+            "commission": round(float(row[2]), 2),
+            "net_amount": round(float(row[3]), 2),
+            "created_at": datetime.utcnow(),
+        }
+        for key, row in sorted(totals.items())
+    ]
+    if run.rows:
+        db.execute(insert(Settlement), run.rows)
+    db.commit()
+    return run
+
+
+def export_csv(db: Session, rows: list[dict], out) -> None:
+    restaurant_ids = [r["merchant_id"] for r in rows if r["merchant_type"] == "restaurant"]
+    hotel_ids = [r["merchant_id"] for r in rows if r["merchant_type"] == "hotel"]
+    names = {
+        ("restaurant", i): n
+        for i, n in db.query(Restaurant.id, Restaurant.name).filter(Restaurant.id.in_(restaurant_ids))
+    }
+    names.update({
+        ("hotel", i): n
+        for i, n in db.query(Hotel.id, Hotel.name).filter(Hotel.id.in_(hotel_ids))
+    })
+
+    writer = csv.writer(out)
+    writer.writerow([
+        "date", "merchant_type", "merchant_id", "merchant_name",
+        "payment_count", "gross_amount", "commission", "net_amount",
+    ])
+    for r in rows:
+        writer.writerow([
+            r["settlement_date"].isoformat(), r["merchant_type"], r["merchant_id"],
+            names.get((r["merchant_type"], r["merchant_id"]), ""),
+            r["payment_count"], f"{r['gross_amount']:.2f}", f"{r['commission']:.2f}", f"{r['net_amount']:.2f}",
+        ])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Règlement quotidien des marchands")
+    parser.add_argument("--date", type=date.fromisoformat,
+                        default=date.today() - timedelta(days=1), help="jour à régler (défaut : hier)")
+    parser.add_argument("--export", help="fichier CSV du rapport ('-' pour la sortie standard)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        started = datetime.utcnow()
+        run = run_settlement(db, args.date, args.batch_size)
+        elapsed = (datetime.utcnow() - started).total_seconds()
+        print(
+            f"✅ {run.settlement_date} : {run.payments} paiements, {len(run.rows)} marchands, "
+            f"{run.unattributed} non rattachés ({elapsed:.1f} s)",
+            file=sys.stderr,
+        )
+        if args.export == "-":
+            export_csv(db, run.rows, sys.stdout)
+        elif args.export:
+            with open(args.export, "w", newline="") as f:
+                export_csv(db, run.rows, f)
+    finally:
+        db.close()
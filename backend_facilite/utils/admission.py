@@ -0,0 +1,183 @@
+# utils/admission.py
+import json
+import math
+import os
+import time
+from dataclasses import dataclass
+
+from backend_facilite.utils.metrics import registry
+
+# ==========================
+# Règles de débit (token bucket)
+# ==========================
+@dataclass(frozen=True)
+class RateRule:
+    name: str
+    prefix: str
+    rate: float      # jetons rechargés par seconde
+    burst: int       # capacité du seau
+    methods: tuple[str, ...] = ()  # vide = toutes les méthodes
+    exact: bool = False            # True : le chemin doit être égal à `prefix`
+
+
+# Première règle qui correspond ; une règle plus spécifique passe donc avant
+RATE_RULES = [
+    RateRule("login", "/auth/login", rate=5 / 60, burst=5, methods=("POST",)),
+    # Création de paiement uniquement : /payments/validate et les webhooks ont leurs propres règles
+    RateRule("payments", "/payments/", rate=1.0, burst=10, methods=("POST",), exact=True),
+    # Un scanner de porte valide un billet toutes les secondes ou deux, avec des rafales à l'ouverture
+    RateRule("qr_validation", "/payments/validate", rate=10.0, burst=60, methods=("POST",)),
+    RateRule("nearby", "/nearby", rate=5.0, burst=20),
+]
+# Jamais limités au débit : les opérateurs appellent depuis quelques IP et
+# signent leurs requêtes (un 429 laisserait le paiement "pending")
+RATE_EXEMPT_PREFIXES = ("/payments/webhooks/",)
+
+# ==========================
+# Limiteur global de concurrence
+# ==========================
+# Quand le serveur sature, on déleste d'abord la lecture du catalogue, puis
+# le reste, en gardant de la marge pour les écritures paiement / livraison.
+MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "64"))
+PRIORITY_SHARE = {"high": 1.0, "normal": 0.8, "low": 0.5}
+HIGH_PRIORITY_PREFIXES = ("/payments", "/deliveries")
+LOW_PRIORITY_PREFIXES = ("/restaurants", "/hotels", "/nearby", "/location")
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+# Réponses longues (SSE) : la place est rendue dès les en-têtes envoyés, sans quoi
+# quelques dizaines d'écrans cuisine ouverts suffiraient à tout délester
+STREAMING_CONTENT_TYPES = (b"text/event-stream",)
+
+MAX_TRACKED_BUCKETS = 50_000
+
+
+def classify(method: str, path: str) -> str:
+    if method in WRITE_METHODS and path.startswith(HIGH_PRIORITY_PREFIXES):
+        return "high"
+    if method == "GET" and path.startswith(LOW_PRIORITY_PREFIXES):
+        return "low"
+    return "normal"
+
+
+class AdmissionControlMiddleware:
+    """
+    Middleware ASGI : limite de débit par groupe de routes (clé = user id du
+    JWT, sinon IP) et limite globale de requêtes en vol, par priorité.
+    Tout tourne dans la boucle événementielle : pas de verrou nécessaire.
+    """
+
+    def __init__(self, app, secret_key: str, algorithm: str = "HS256",
+                 rules: list[RateRule] = RATE_RULES, max_concurrent: int = MAX_CONCURRENT):
+        self.app = app
+        self.secret_key = secret_key
+        self.algorithm = algorithm
+        self.rules = rules
+        self.max_concurrent = max_concurrent
+        self.in_flight = 0
+        self.streaming = 0
+        self.rejected = {"rate_limited": 0, "shed": 0}
+        self._buckets: dict[tuple[str, str], tuple[float, float]] = {}
+        registry.register_gauges(self._gauges)
+
+    def _gauges(self):
+        yield "facilite_admission_in_flight", {}, self.in_flight
+        yield "facilite_admission_streaming", {}, self.streaming
+        for reason, count in self.rejected.items():
+            yield "facilite_admission_rejected_total", {"reason": reason}, count
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method, path = scope["method"], scope["path"]
+
+        rule = self._match_rule(method, path)
+        if rule is not None:
+            retry_after = self._take_token(rule, self._client_key(scope))
+            if retry_after:
+                self.rejected["rate_limited"] += 1
+                return await self._reject(send, 429, "Trop de requêtes, réessayez plus tard", retry_after)
+
+        limit = self.max_concurrent * PRIORITY_SHARE[classify(method, path)]
+        if self.in_flight >= limit:
+            self.rejected["shed"] += 1
+            return await self._reject(send, 503, "Serveur saturé, réessayez", 1)
+
+        self.in_flight += 1
+        holding, streaming = True, False
+
+        async def send_wrapper(message):
+            nonlocal holding, streaming
+            if message["type"] == "http.response.start" and holding and any(
+                name == b"content-type" and value.startswith(STREAMING_CONTENT_TYPES)
+                for name, value in message.get("headers", [])
+            ):
+                holding, streaming = False, True
+                self.in_flight -= 1
+                self.streaming += 1
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if holding:
+                self.in_flight -= 1
+            if streaming:
+                self.streaming -= 1
+
+    def _match_rule(self, method: str, path: str) -> RateRule | None:
+        if path.startswith(RATE_EXEMPT_PREFIXES):
+            return None
+        for rule in self.rules:
+            matches = path == rule.prefix if rule.exact else path.startswith(rule.prefix)
+            if matches and (not rule.methods or method in rule.methods):
+                return rule
+        return None
+
+    def _client_key(self, scope) -> str:
+        from jose import JWTError, jwt  # import différé : démarrage plus rapide
+
+        for name, value in scope["headers"]:
+            if name == b"authorization" and value[:7].lower() == b"bearer ":
+                try:
+                    claims = jwt.decode(value[7:].decode(), self.secret_key, algorithms=[self.algorithm])
+                    return f"user:{claims['sub']}"
+                except (JWTError, KeyError, UnicodeDecodeError):
+                    break
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
+
+    def _take_token(self, rule: RateRule, client_key: str) -> int:
+        """Consomme un jeton ; retourne 0 si admis, sinon le Retry-After en secondes."""
+        now = time.monotonic()
+        key = (rule.name, client_key)
+        tokens, last = self._buckets.get(key, (rule.burst, now))
+        tokens = min(rule.burst, tokens + (now - last) * rule.rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            return max(1, math.ceil((1 - tokens) / rule.rate))
+        if len(self._buckets) >= MAX_TRACKED_BUCKETS and key not in self._buckets:
+            self._prune(now)
+        self._buckets[key] = (tokens - 1, now)
+        return 0
+
+    def _prune(self, now: float) -> None:
+        # Un seau resté inactif assez longtemps est plein : inutile de le garder
+        rates = {rule.name: rule for rule in self.rules}
+        self._buckets = {
+            key: (tokens, last) for key, (tokens, last) in self._buckets.items()
+            if tokens + (now - last) * rates[key[0]].rate < rates[key[0]].burst
+        }
+
+    @staticmethod
+    async def _reject(send, status: int, detail: str, retry_after: int):
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,184 @@
+# utils/cache.py
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+from backend_facilite.utils.http_cache import bump_version, versions
+from backend_facilite.utils.metrics import register_cache
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# Configuration
+# ==========================
+# memory://            -> LRU en mémoire (par process, défaut)
+# redis://host:6379/0  -> serveur Redis (ou compatible RESP) partagé
+CACHE_URL = os.getenv("CACHE_URL", "memory://")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+KEY_PREFIX = "facilite:"
+
+# TTL (secondes) par famille de clés : "hotel:3" -> "hotel"
+CATALOG_TTLS = {
+    "restaurants": 300,
+    "menu": 300,
+    "hotels": 300,
+    "hotel": 300,
+    "rooms": 120,
+}
+DEFAULT_TTL = 60
+
+
+# ==========================
+# Backends
+# ==========================
+class MemoryLRUCache:
+    """
+    LRU en mémoire avec expiration par clé. Avec `max_bytes`, les valeurs sont
+    des bytes et le cache est borné par leur taille cumulée.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, max_bytes: int | None = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _sizeof(self, value: Any) -> int:
+        return len(value) if self.max_bytes is not None else 0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.size_bytes -= self._sizeof(value)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self.size_bytes -= self._sizeof(previous[1])
+            self._data[key] = (time.monotonic() + ttl, value)
+            self.size_bytes += self._sizeof(value)
+            while len(self._data) > self.max_entries or (
+                self.max_bytes is not None and self.size_bytes > self.max_bytes and len(self._data) > 1
+            ):
+                _, (_, evicted) = self._data.popitem(last=False)
+                self.size_bytes -= self._sizeof(evicted)
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                entry = self._data.pop(key, None)
+                if entry is not None:
+                    self.size_bytes -= self._sizeof(entry[1])
+
+
+class RedisCache:
+    """Backend Redis : valeurs stockées en JSON, expiration gérée par le serveur."""
+
+    def __init__(self, url: str):
+        try:
+            import redis  # dépendance optionnelle
+        except ImportError as exc:
+            raise RuntimeError("CACHE_URL=redis://... nécessite le paquet 'redis'") from exc
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5)
+
+    def get(self, key: str):
+        raw = self._client.get(KEY_PREFIX + key)
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        self._client.set(KEY_PREFIX + key, json.dumps(value, default=str), ex=ttl)
+
+    def delete(self, *keys: str) -> None:
+        if keys:
+            self._client.delete(*(KEY_PREFIX + key for key in keys))
+
+
+def make_backend(url: str = CACHE_URL):
+    if url.startswith("redis://") or url.startswith("rediss://"):
+        return RedisCache(url)
+    return MemoryLRUCache()
+
+
+# ==========================
+# Cache read-through
+# ==========================
+class ReadThroughCache:
+    """
+    Chaque entrée est marquée de la version (compteur des ETags) lue avant le
+    chargement : une écriture commitée pendant le chargement fait monter la
+    version, l'entrée chargée avant est alors ignorée au lieu d'être servie
+    jusqu'à la fin du TTL. Cache injoignable : on lit la base, sans erreur.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get_or_load(self, key: str, loader: Callable[[], Any]):
+        try:
+            version = versions.current(key)
+            entry = self.backend.get(key)
+        except Exception:
+            logger.exception("Cache catalogue injoignable, lecture directe de %s", key)
+            self.misses += 1
+            return loader()
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        value = loader()
+        try:
+            self.backend.set(key, [version, value], CATALOG_TTLS.get(key.split(":", 1)[0], DEFAULT_TTL))
+        except Exception:
+            logger.exception("Écriture de %s dans le cache catalogue en échec", key)
+        return value
+
+    def invalidate(self, *keys: str) -> None:
+        """Au mieux : la version déjà incrémentée suffit à écarter les entrées restées."""
+        self.invalidations += len(keys)
+        try:
+            self.backend.delete(*keys)
+        except Exception:
+            logger.exception("Invalidation du cache catalogue en échec : %s", keys)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+catalog_cache = ReadThroughCache(make_backend())
+register_cache("catalog", catalog_cache)
+
+
+def catalog_changed(*keys: str) -> None:
+    """Après commit d'une écriture catalogue : purge le cache et les ETags."""
+    # Version d'abord : c'est elle qui écarte une entrée chargée avant le commit
+    bump_version(*keys)
+    catalog_cache.invalidate(*keys)
@@ -0,0 +1,116 @@
+# utils/dispatch.py
+import os
+
+import numpy as np
+
+# ==========================
+# Configuration
+# ==========================
+EARTH_RADIUS_KM = 6371.0
+# Au-delà, l'algorithme hongrois (O(n³)) cède la place au glouton
+DISPATCH_HUNGARIAN_MAX = int(os.getenv("DISPATCH_HUNGARIAN_MAX", "400"))
+# Coût des couples interdits (trop loin) : fini pour que l'algorithme reste défini
+_FORBIDDEN = 1e9
+
+
+def distance_matrix(origins: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    """
+    Distances haversine en km entre deux ensembles de points (lat, lon) en
+    degrés : matrice (len(origins), len(targets)) calculée en un seul passage.
+    """
+    a = np.radians(np.asarray(origins, dtype=np.float64).reshape(-1, 2))
+    b = np.radians(np.asarray(targets, dtype=np.float64).reshape(-1, 2))
+    lat1, lon1 = a[:, 0:1], a[:, 1:2]
+    lat2, lon2 = b[:, 0], b[:, 1]
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+
+def hungarian(cost: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Affectation de coût total minimal (matrice rectangulaire acceptée) :
+    retourne (lignes, colonnes) des couples retenus, min(n, m) au total.
+    Potentiels + plus courts chemins, boucle interne vectorisée sur les colonnes.
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+    if n == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    match = np.zeros(m + 1, dtype=np.int64)     # colonne -> ligne (1-based, 0 = libre)
+    way = np.zeros(m + 1, dtype=np.int64)
+    for row in range(1, n + 1):
+        match[0] = row
+        col = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[col] = True
+            free = ~used[1:]
+            reduced = cost[match[col] - 1] - u[match[col]] - v[1:]
+            better = free & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = col
+            candidates = np.where(free, minv[1:], np.inf)
+            nxt = int(np.argmin(candidates)) + 1
+            delta = candidates[nxt - 1]
+            visited = np.flatnonzero(used)
+            u[match[visited]] += delta
+            v[visited] -= delta
+            minv[1:][free] -= delta
+            col = nxt
+            if match[col] == 0:
+                break
+        # Augmentation le long du chemin trouvé
+        while col:
+            prev = way[col]
+            match[col] = match[prev]
+            col = prev
+
+    cols = np.flatnonzero(match[1:])
+    rows = match[1:][cols] - 1
+    order = np.argsort(rows)
+    rows, cols = rows[order], cols[order]
+    return (cols, rows) if transposed else (rows, cols)
+
+
+def greedy(cost: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Couples les plus proches d'abord : O(nm log nm), sans garantie d'optimalité."""
+    cost = np.asarray(cost, dtype=np.float64)
+    n, m = cost.shape
+    target = min(n, m)
+    rows_taken = np.zeros(n, dtype=bool)
+    cols_taken = np.zeros(m, dtype=bool)
+    rows, cols = [], []
+    for flat in np.argsort(cost, axis=None, kind="stable"):
+        r, c = divmod(int(flat), m)
+        if rows_taken[r] or cols_taken[c]:
+            continue
+        rows_taken[r] = cols_taken[c] = True
+        rows.append(r)
+        cols.append(c)
+        if len(rows) == target:
+            break
+    return np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64)
+
+
+def assign(distances: np.ndarray, max_km: float | None = None) -> tuple[np.ndarray, np.ndarray, str]:
+    """
+    Affecte lignes (livreurs) et colonnes (commandes) en minimisant la distance
+    totale. Les couples au-delà de `max_km` ne sont jamais retenus (quitte à
+    laisser des commandes sans livreur). Retourne (lignes, colonnes, méthode).
+    """
+    cost = np.asarray(distances, dtype=np.float64)
+    if max_km is not None:
+        cost = np.where(cost <= max_km, cost, _FORBIDDEN)
+    if min(cost.shape) <= DISPATCH_HUNGARIAN_MAX:
+        rows, cols, method = *hungarian(cost), "hungarian"
+    else:
+        rows, cols, method = *greedy(cost), "greedy"
+    keep = cost[rows, cols] < _FORBIDDEN
+    return rows[keep], cols[keep], method
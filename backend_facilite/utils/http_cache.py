@@ -0,0 +1,132 @@
+# utils/http_cache.py
+import logging
+import os
+import threading
+import uuid
+
+from fastapi import HTTPException, Request, Response
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# Versions par ressource
+# ==========================
+# Chaque ressource du catalogue ("hotels", "hotel:3", "menu:7", ...) possède un
+# compteur incrémenté à chaque écriture. L'ETag est dérivé du compteur, donc un
+# If-None-Match valide se résout sans requête SQL ni sérialisation.
+#
+# Les compteurs suivent CACHE_URL : en mémoire (un seul process), ou dans Redis
+# pour que l'écriture sur un worker invalide les ETags de tous les autres.
+CACHE_URL = os.getenv("CACHE_URL", "memory://")
+CACHE_CONTROL = "public, no-cache"
+# Lu par uvicorn/gunicorn pour le nombre de workers
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+
+class MemoryVersions:
+    """
+    Compteurs du process. L'époque (tirée au démarrage) évite qu'un ETag émis
+    avant un redémarrage corresponde par hasard à un compteur remis à zéro.
+    """
+    shared = False
+
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex[:8]
+        self._versions: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def bump(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._versions[key] = self._versions.get(key, 0) + 1
+
+    def current(self, key: str) -> str:
+        return f"{self.epoch}-{self._versions.get(key, 0)}"
+
+
+class RedisVersions:
+    """Compteurs partagés (INCR) ; l'époque est recréée si Redis a perdu ses données."""
+    shared = True
+    PREFIX = "facilite:etag:"
+    EPOCH_KEY = PREFIX + "epoch"
+
+    def __init__(self, url: str):
+        try:
+            import redis  # dépendance optionnelle
+        except ImportError as exc:
+            raise RuntimeError("CACHE_URL=redis://... nécessite le paquet 'redis'") from exc
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5)
+
+    def bump(self, *keys: str) -> None:
+        pipe = self._client.pipeline(transaction=False)
+        for key in keys:
+            pipe.incr(self.PREFIX + key)
+        pipe.execute()
+
+    def current(self, key: str) -> str:
+        epoch, version = self._client.mget(self.EPOCH_KEY, self.PREFIX + key)
+        if epoch is None:
+            self._client.set(self.EPOCH_KEY, uuid.uuid4().hex[:8], nx=True)
+            epoch, version = self._client.mget(self.EPOCH_KEY, self.PREFIX + key)
+        return f"{epoch.decode()}-{int(version or 0)}"
+
+
+def make_versions(url: str = CACHE_URL):
+    if url.startswith("redis://") or url.startswith("rediss://"):
+        return RedisVersions(url)
+    return MemoryVersions()
+
+
+versions = make_versions()
+# Compteurs en mémoire + plusieurs workers : une écriture n'invaliderait que
+# les ETags de son propre process. Plutôt pas de 304 que des 304 périmés.
+ETAGS_ENABLED = versions.shared or WEB_CONCURRENCY <= 1
+if not ETAGS_ENABLED:
+    logger.warning("ETags désactivés : WEB_CONCURRENCY=%d sans CACHE_URL=redis://", WEB_CONCURRENCY)
+
+
+def bump_version(*keys: str) -> None:
+    """Invalide les ETags des ressources modifiées (à appeler après commit)."""
+    try:
+        versions.bump(*keys)
+    except Exception:
+        logger.exception("Invalidation des ETags en échec : %s", keys)
+
+
+def make_etag(key: str) -> str:
+    """ETag fort pour la version courante d'une ressource."""
+    return f'"{versions.current(key)}-{key}"'
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def conditional_get(resource: str, param: str | None = None):
+    """
+    Dépendance de route : renvoie 304 si le client possède déjà la version
+    courante, sinon pose ETag et Cache-Control sur la réponse.
+    À déclarer dans `dependencies=[...]` pour passer avant get_db.
+    """
+    def dependency(request: Request, response: Response):
+        if not ETAGS_ENABLED:
+            return
+        key = resource if param is None else f"{resource}:{request.path_params[param]}"
+        try:
+            etag = make_etag(key)
+        except Exception:
+            # Store des versions injoignable : réponse complète, sans ETag
+            logger.exception("Lecture de la version de %s en échec", key)
+            return
+        headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _matches(if_none_match, etag):
+            raise HTTPException(status_code=304, headers=headers)
+
+        response.headers.update(headers)
+
+    return dependency
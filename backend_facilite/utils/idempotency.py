@@ -0,0 +1,134 @@
+# utils/idempotency.py
+import hashlib
+import json
+import os
+import threading
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from backend_facilite.models import IdempotencyKey
+
+IDEMPOTENCY_TTL = timedelta(hours=24)
+MAX_KEY_LENGTH = 255
+# Au-delà, une clé sans réponse est celle d'une requête morte (process tué
+# entre claim() et le commit) : elle peut être reprise. Doit dépasser la durée
+# maximale d'une requête.
+IDEMPOTENCY_LEASE = timedelta(seconds=float(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "60")))
+
+# Verrous "rayés" : les doublons concurrents d'un même process attendent la
+# première requête puis rejouent sa réponse. Entre process, c'est l'index
+# unique (user_id, key) qui tranche.
+_stripes = [threading.Lock() for _ in range(64)]
+
+
+def request_fingerprint(payload: dict) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+@contextmanager
+def single_flight(user_id: int, key: str):
+    lock = _stripes[zlib.crc32(f"{user_id}:{key}".encode()) % len(_stripes)]
+    with lock:
+        yield
+
+
+def claim(db: Session, user_id: int, key: str, fingerprint: str) -> tuple[IdempotencyKey | None, dict | None]:
+    """
+    Réserve la clé pour cette requête.
+    Retourne (record, None) si la requête doit être exécutée, ou
+    (None, réponse_stockée) si elle a déjà abouti.
+    """
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail="Idempotency-Key trop longue")
+
+    for _ in range(2):
+        record = IdempotencyKey(
+            user_id=user_id,
+            key=key,
+            request_hash=fingerprint,
+            expires_at=datetime.utcnow() + IDEMPOTENCY_TTL,
+        )
+        db.add(record)
+        try:
+            db.commit()
+            # Charge la version (created_at) de notre réservation maintenant : rechargée
+            # plus tard, elle serait celle d'une éventuelle reprise
+            db.refresh(record)
+            return record, None
+        except IntegrityError:
+            db.rollback()
+
+        existing = db.query(IdempotencyKey).filter(
+            IdempotencyKey.user_id == user_id, IdempotencyKey.key == key
+        ).first()
+        if existing is None:
+            continue  # supprimée entre-temps : on retente
+        if existing.expires_at < datetime.utcnow():
+            db.delete(existing)
+            db.commit()
+            continue
+        if existing.request_hash != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key déjà utilisée avec une autre requête")
+        if existing.status_code is None:
+            now = datetime.utcnow()
+            if existing.created_at < now - IDEMPOTENCY_LEASE:
+                # Reprise conditionnelle : nouveau created_at (colonne de version du
+                # modèle), l'UPDATE tardif de la requête d'origine ne trouve plus sa
+                # ligne (StaleDataError) et son écriture est annulée, pas doublée.
+                taken = db.query(IdempotencyKey).filter(
+                    IdempotencyKey.id == existing.id,
+                    IdempotencyKey.status_code.is_(None),
+                    IdempotencyKey.created_at == existing.created_at,
+                ).update(
+                    {IdempotencyKey.created_at: now, IdempotencyKey.expires_at: now + IDEMPOTENCY_TTL},
+                    synchronize_session=False,
+                )
+                db.commit()
+                if taken:
+                    db.refresh(existing)
+                    return existing, None
+                continue
+            raise HTTPException(
+                status_code=409,
+                detail="Requête identique déjà en cours de traitement",
+                headers={"Retry-After": "1"},
+            )
+        return None, json.loads(existing.response_body)
+
+    raise HTTPException(status_code=409, detail="Idempotency-Key en conflit, réessayez", headers={"Retry-After": "1"})
+
+
+def store_response(record: IdempotencyKey, body: dict, status_code: int = 200) -> None:
+    """À appeler avant le commit de l'écriture : réponse et effet sont commités ensemble."""
+    record.status_code = status_code
+    record.response_body = json.dumps(body, default=str)
+
+
+def release(db: Session, record: IdempotencyKey) -> None:
+    """Libère la clé après un échec, pour qu'un retry puisse réessayer."""
+    # Identité et version lues sans recharger l'objet : la session peut être en
+    # échec, et la clé peut avoir été reprise entre-temps (on ne supprime que la nôtre)
+    state = inspect(record)
+    record_id, claimed_at = state.identity[0], state.dict.get("created_at")
+    db.rollback()
+    db.query(IdempotencyKey).filter(
+        IdempotencyKey.id == record_id,
+        IdempotencyKey.status_code.is_(None),
+        IdempotencyKey.created_at == claimed_at,
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+def purge_expired(db: Session) -> int:
+    """Supprime les clés échues ; appelé par jobs.maintenance()."""
+    deleted = db.query(IdempotencyKey).filter(
+        IdempotencyKey.expires_at < datetime.utcnow()
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
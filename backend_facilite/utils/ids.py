@@ -0,0 +1,152 @@
+# utils/ids.py
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# Identifiants type Snowflake
+# ==========================
+# 64 bits = 41 bits de millisecondes depuis EPOCH_MS | 10 bits de worker | 12 bits de séquence
+# => 4096 codes par milliseconde et par worker, triables par date de création,
+# uniques entre process tant que deux process vivants n'ont pas le même worker_id.
+EPOCH_MS = 1_735_689_600_000  # 2025-01-01T00:00:00Z
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+# Réservé à loadtest.datagen (codes écrits hors de l'API) : jamais attribué à un process
+RESERVED_WORKER_ID = MAX_WORKER_ID
+
+# worker_id = WORKER_ID (base de l'hôte, une par machine/conteneur, multiple de
+# WORKER_SLOTS) + indice du process sur l'hôte, pris au premier créneau libre.
+WORKER_SLOTS = int(os.getenv("WORKER_SLOTS", "32"))
+WORKER_ID_LOCK_DIR = os.getenv("WORKER_ID_LOCK_DIR", tempfile.gettempdir())
+
+# Base32 de Crockford : ordre ASCII croissant, donc l'ordre lexicographique
+# des codes (largeur fixe) suit l'ordre numérique.
+_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_ENCODED_LENGTH = 13
+
+_slot_file = None   # verrou du créneau, tenu tant que le process vit
+_host_base_value: int | None = None
+
+
+def _claim_slot(base: int) -> int:
+    """
+    Premier créneau libre de l'hôte : verrou exclusif sur un fichier, rendu par
+    le système à la mort du process. Marche pour les workers forkés comme pour
+    les workers lancés en spawn (uvicorn --workers), qui réimportent ce module.
+    """
+    global _slot_file
+    try:
+        import fcntl
+    except ImportError:  # pas de flock (Windows) : pid, sans garantie
+        return os.getpid() % WORKER_SLOTS
+    for slot in range(WORKER_SLOTS):
+        handle = open(os.path.join(WORKER_ID_LOCK_DIR, f"facilite-worker-{base}-{slot}.lock"), "a")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            continue
+        _slot_file = handle
+        return slot
+    raise RuntimeError(f"Plus de {WORKER_SLOTS} process sur cet hôte pour WORKER_ID={base} : augmentez WORKER_SLOTS")
+
+
+def _host_base() -> int:
+    if "WORKER_ID" in os.environ:
+        return int(os.environ["WORKER_ID"])
+    # Base tirée du nom d'hôte : deux machines peuvent tomber sur la même.
+    # Acceptable en développement, WORKER_ID est à fixer dès qu'il y a plusieurs hôtes.
+    base = zlib.crc32(socket.gethostname().encode()) % (RESERVED_WORKER_ID // WORKER_SLOTS) * WORKER_SLOTS
+    logger.warning("WORKER_ID non défini : base %d dérivée du nom d'hôte, collisions possibles entre hôtes", base)
+    return base
+
+
+def _default_worker_id() -> int:
+    global _host_base_value
+    if _host_base_value is None:
+        _host_base_value = _host_base()
+    base = _host_base_value
+    worker_id = base + _claim_slot(base)
+    if not 0 <= worker_id < RESERVED_WORKER_ID:
+        raise RuntimeError(f"worker_id {worker_id} hors de [0, {RESERVED_WORKER_ID}) : WORKER_ID={base} trop grand")
+    return worker_id
+
+
+class IdGenerator:
+    def __init__(self, worker_id: int | None = None):
+        worker_id = _default_worker_id() if worker_id is None else worker_id
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"worker_id doit être entre 0 et {MAX_WORKER_ID}")
+        self.worker_id = worker_id
+        self._last_ms = -1
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def next_int(self) -> int:
+        with self._lock:
+            now = time.time_ns() // 1_000_000
+            if now < self._last_ms:
+                now = self._last_ms  # horloge qui recule : on reste sur la dernière ms
+            if now == self._last_ms:
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    # séquence épuisée pour cette milliseconde : on attend la suivante
+                    while now <= self._last_ms:
+                        now = time.time_ns() // 1_000_000
+            else:
+                self._sequence = 0
+            self._last_ms = now
+            return ((now - EPOCH_MS) << (WORKER_BITS + SEQUENCE_BITS)) | (self.worker_id << SEQUENCE_BITS) | self._sequence
+
+    def next_code(self, prefix: str = "TXN") -> str:
+        return f"{prefix}-{encode(self.next_int())}"
+
+
+def encode(value: int) -> str:
+    chars = []
+    for _ in range(_ENCODED_LENGTH):
+        value, index = divmod(value, 32)
+        chars.append(_ALPHABET[index])
+    return "".join(reversed(chars))
+
+
+# Créneau pris au premier identifiant généré, pas à l'import : les process qui
+# n'en génèrent jamais (pool bcrypt, enfants multiprocessing) n'en consomment pas
+_generator: IdGenerator | None = None
+_generator_lock = threading.Lock()
+
+
+def get_generator() -> IdGenerator:
+    global _generator
+    if _generator is None:
+        with _generator_lock:
+            if _generator is None:
+                _generator = IdGenerator()
+    return _generator
+
+
+def _reset_after_fork() -> None:
+    # Un process forké (workers gunicorn) ne doit pas reprendre le worker_id du
+    # parent : il prendra le sien à son premier identifiant
+    global _generator, _generator_lock, _slot_file
+    _generator, _generator_lock = None, threading.Lock()
+    if _slot_file is not None:
+        _slot_file.close()  # le verrou reste au parent, qui garde son descripteur
+        _slot_file = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def new_transaction_code(prefix: str = "TXN") -> str:
+    return get_generator().next_code(prefix)
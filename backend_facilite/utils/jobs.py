@@ -0,0 +1,408 @@
+# utils/jobs.py
+import asyncio
+import importlib
+import inspect
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from concurrent.futures import Future, wait as wait_futures
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable
+
+from sqlalchemy import delete, event, select, update
+from sqlalchemy.orm import Session
+
+from backend_facilite.database import SessionLocal
+from backend_facilite.models import Job
+from backend_facilite.utils import idempotency
+from backend_facilite.utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# Configuration
+# ==========================
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "0.5"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_BACKOFF_BASE_SECONDS = float(os.getenv("JOB_BACKOFF_BASE_SECONDS", "2"))
+JOB_BACKOFF_CAP_SECONDS = float(os.getenv("JOB_BACKOFF_CAP_SECONDS", "600"))
+# Au-delà, une tâche "running" est considérée abandonnée (worker tué) et reprise
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_RETENTION = timedelta(days=float(os.getenv("JOB_RETENTION_DAYS", "7")))
+# Threads worker dans le process de l'API (0 si `python -m backend_facilite.worker` tourne à part)
+JOB_WORKERS_IN_APP = int(os.getenv("JOB_WORKERS_IN_APP", "1"))
+# Tâches async (appels HTTP sortants) en vol en même temps, par process
+JOB_ASYNC_CONCURRENCY = int(os.getenv("JOB_ASYNC_CONCURRENCY", "200"))
+MAINTENANCE_INTERVAL_SECONDS = 30
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 50
+PRIORITY_LOW = 100
+
+# Modules qui déclarent des handlers : importés par les workers hors API
+HANDLER_MODULES = (
+    "backend_facilite.utils.qrcode_utils",
+    "backend_facilite.routers.payments",
+)
+
+
+class PermanentJobError(Exception):
+    """Échec sans espoir de succès au prochain essai : la tâche part directement en dead-letter."""
+
+
+# ==========================
+# Handlers
+# ==========================
+@dataclass(frozen=True)
+class JobSpec:
+    fn: Callable[..., None]
+    max_attempts: int
+    on_dead: Callable[..., None] | None
+    is_async: bool = False
+
+
+_handlers: dict[str, JobSpec] = {}
+
+
+def handler(kind: str, max_attempts: int = JOB_MAX_ATTEMPTS, on_dead: Callable[..., None] | None = None):
+    """
+    Déclare le handler d'un type de tâche ; il reçoit le payload en arguments
+    nommés. `on_dead(**payload)` est appelé quand la tâche est abandonnée.
+    Un handler `async def` tourne sur la boucle partagée du process : le
+    worker n'attend pas sa fin pour prendre la tâche suivante.
+    """
+    def decorator(fn):
+        _handlers[kind] = JobSpec(fn, max_attempts, on_dead, inspect.iscoroutinefunction(fn))
+        return fn
+    return decorator
+
+
+def _call_on_dead(kind: str, job_id: int, arguments: dict) -> None:
+    spec = _handlers.get(kind)
+    if spec is None or spec.on_dead is None:
+        return
+    try:
+        spec.on_dead(**arguments)
+    except Exception:
+        logger.exception("on_dead de %s #%d en échec", kind, job_id)
+
+
+def load_handlers() -> None:
+    for module in HANDLER_MODULES:
+        importlib.import_module(module)
+
+
+# ==========================
+# Mise en file (dans la transaction de l'appelant)
+# ==========================
+def enqueue(
+    db: Session,
+    kind: str,
+    payload: dict,
+    priority: int = PRIORITY_NORMAL,
+    delay: float = 0.0,
+    max_attempts: int | None = None,
+) -> Job:
+    """Ajoute une tâche à la session : elle n'existe que si l'appelant commite."""
+    spec = _handlers.get(kind)
+    job = Job(
+        kind=kind,
+        payload=json.dumps(payload, separators=(",", ":"), default=str),
+        priority=priority,
+        status="queued",
+        attempts=0,
+        max_attempts=max_attempts or (spec.max_attempts if spec else JOB_MAX_ATTEMPTS),
+        run_at=datetime.utcnow() + timedelta(seconds=delay),
+    )
+    db.add(job)
+    db.info["jobs_pending"] = True
+    return job
+
+
+_wake = threading.Event()
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_after_commit(session):
+    # Réveille les workers du process ; les autres process la verront au prochain poll
+    if session.info.pop("jobs_pending", False):
+        _wake.set()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop("jobs_pending", None)
+
+
+def backoff(attempts: int) -> float:
+    """Délai avant la tentative suivante : exponentiel plafonné, jitter sur la moitié haute."""
+    ceiling = min(JOB_BACKOFF_CAP_SECONDS, JOB_BACKOFF_BASE_SECONDS * 2 ** (attempts - 1))
+    return random.uniform(ceiling / 2, ceiling)
+
+
+# ==========================
+# Boucle partagée des handlers async
+# ==========================
+class AsyncRunner:
+    """
+    Une boucle asyncio par process, dans un thread dédié : les handlers async
+    y partagent leurs clients (pool keep-alive) et attendent l'opérateur sans
+    bloquer un thread worker. Au plus `concurrency` tâches en vol.
+    """
+
+    def __init__(self, concurrency: int = JOB_ASYNC_CONCURRENCY):
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._in_flight: set[Future] = set()
+        self._closers: list[Callable[[], object]] = []
+        self._lock = threading.Lock()
+
+    def at_shutdown(self, closer: Callable[[], object]) -> None:
+        """`closer()` (coroutine) est attendu sur la boucle à l'arrêt : fermeture des clients partagés."""
+        self._closers.append(closer)
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="job-async-loop", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def submit(self, coro_fn: Callable[[], object], done: Callable[[BaseException | None], None]) -> None:
+        """Lance `coro_fn()` sur la boucle ; `done(erreur)` est appelé hors de la boucle à la fin."""
+        self._slots.acquire()   # boucle pleine : le worker attend avant de prendre la tâche suivante
+        loop = self._ensure_loop()
+
+        async def run():
+            try:
+                await coro_fn()
+                error = None
+            except Exception as exc:
+                error = exc
+            # Écritures en base (bloquantes) hors de la boucle
+            await loop.run_in_executor(None, done, error)
+
+        future = asyncio.run_coroutine_threadsafe(run(), loop)
+        with self._lock:
+            self._in_flight.add(future)
+        future.add_done_callback(self._release)
+
+    def _release(self, future: Future) -> None:
+        with self._lock:
+            self._in_flight.discard(future)
+        self._slots.release()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Laisse finir les tâches en vol (les autres seront reprises à l'expiration du bail), ferme les clients."""
+        with self._lock:
+            loop, thread, pending = self._loop, self._thread, list(self._in_flight)
+            self._loop = self._thread = None
+        if loop is None:
+            return
+        wait_futures(pending, timeout=timeout)
+
+        async def close_all():
+            for closer in self._closers:
+                try:
+                    await closer()
+                except Exception:
+                    logger.exception("Fermeture d'un client partagé en échec")
+
+        try:
+            asyncio.run_coroutine_threadsafe(close_all(), loop).result(timeout=timeout)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=timeout)
+            loop.close()
+
+
+async_runner = AsyncRunner()
+
+
+# ==========================
+# Worker
+# ==========================
+class Worker:
+    """
+    Boucle de consommation. La prise d'une tâche est un seul UPDATE ... WHERE
+    id IN (SELECT ... FOR UPDATE SKIP LOCKED) : des workers concurrents (threads
+    ou process) ne se bloquent pas et ne prennent jamais la même tâche.
+    """
+
+    def __init__(self, name: str | None = None, kinds: list[str] | None = None,
+                 poll_seconds: float = JOB_POLL_SECONDS, stop: threading.Event | None = None):
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+        self.kinds = kinds
+        self.poll_seconds = poll_seconds
+        self.stop_event = stop or threading.Event()
+        self._last_maintenance = 0.0
+
+    def run(self) -> None:
+        while not self.stop_event.is_set():
+            try:
+                if time.monotonic() - self._last_maintenance > MAINTENANCE_INTERVAL_SECONDS:
+                    self._last_maintenance = time.monotonic()
+                    maintenance()
+                if not self.run_once():
+                    _wake.wait(self.poll_seconds)
+                    _wake.clear()
+            except Exception:
+                logger.exception("Worker %s interrompu", self.name)
+                self.stop_event.wait(self.poll_seconds)
+
+    def run_once(self) -> bool:
+        """Prend et exécute une tâche ; False si la file est vide."""
+        job = self.claim()
+        if job is None:
+            return False
+        self.execute(*job)
+        return True
+
+    def claim(self) -> tuple | None:
+        now = datetime.utcnow()
+        candidate = (
+            select(Job.id)
+            .where(Job.status == "queued", Job.run_at <= now)
+            .order_by(Job.priority, Job.run_at, Job.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        if self.kinds:
+            candidate = candidate.where(Job.kind.in_(self.kinds))
+        db = SessionLocal()
+        try:
+            row = db.execute(
+                update(Job)
+                .where(Job.id.in_(candidate.scalar_subquery()), Job.status == "queued")
+                .values(status="running", locked_at=now, locked_by=self.name, attempts=Job.attempts + 1)
+                .returning(Job.id, Job.kind, Job.payload, Job.attempts, Job.max_attempts, Job.created_at)
+                .execution_options(synchronize_session=False)
+            ).first()
+            db.commit()
+            return tuple(row) if row else None
+        finally:
+            db.close()
+
+    def execute(self, job_id: int, kind: str, payload: str, attempts: int, max_attempts: int,
+                created_at: datetime) -> None:
+        spec = _handlers.get(kind)
+        arguments = json.loads(payload)
+        started = time.perf_counter()
+        if attempts == 1:
+            registry.observe("facilite_job_queue_wait_seconds",
+                             (datetime.utcnow() - created_at).total_seconds(), (("kind", kind),))
+
+        def complete(error: BaseException | None) -> None:
+            self._complete(job_id, kind, arguments, attempts, max_attempts, started, error)
+
+        if spec is not None and spec.is_async:
+            async_runner.submit(lambda: spec.fn(**arguments), complete)
+            return
+        try:
+            if spec is None:
+                raise PermanentJobError(f"Aucun handler pour {kind}")
+            spec.fn(**arguments)
+        except Exception as exc:
+            complete(exc)
+        else:
+            complete(None)
+
+    def _complete(self, job_id: int, kind: str, arguments: dict, attempts: int, max_attempts: int,
+                  started: float, error: BaseException | None) -> None:
+        if error is None:
+            outcome = "done"
+            self._finish(job_id, outcome)
+        else:
+            message = f"{type(error).__name__}: {error}"
+            permanent = isinstance(error, PermanentJobError) or attempts >= max_attempts
+            outcome = "dead" if permanent else "retry"
+            if permanent:
+                logger.error("Tâche %s #%d abandonnée après %d essai(s) : %s", kind, job_id, attempts, message)
+            else:
+                logger.warning("Tâche %s #%d en échec (essai %d/%d) : %s", kind, job_id, attempts, max_attempts, message)
+            self._finish(job_id, outcome, message, attempts)
+            if permanent:
+                _call_on_dead(kind, job_id, arguments)
+        registry.inc("facilite_jobs_total", (("kind", kind), ("outcome", outcome)))
+        registry.observe("facilite_job_duration_seconds", time.perf_counter() - started, (("kind", kind),))
+
+    def _finish(self, job_id: int, outcome: str, error: str | None = None, attempts: int = 0) -> None:
+        now = datetime.utcnow()
+        if outcome == "retry":
+            values = {"status": "queued", "run_at": now + timedelta(seconds=backoff(attempts)),
+                      "locked_at": None, "locked_by": None, "last_error": error}
+        else:
+            values = {"status": outcome, "finished_at": now, "locked_at": None, "last_error": error}
+        db = SessionLocal()
+        try:
+            # Conditionnel sur le bail : si la tâche a été reprise entre-temps, on n'écrase rien
+            db.execute(
+                update(Job).where(Job.id == job_id, Job.locked_by == self.name, Job.status == "running").values(**values)
+            )
+            db.commit()
+        finally:
+            db.close()
+
+
+def maintenance() -> None:
+    """Reprend les baux expirés, purge les tâches terminées anciennes et les clés d'idempotence échues."""
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        expired = (Job.status == "running", Job.locked_at < now - timedelta(seconds=JOB_LEASE_SECONDS))
+        # Le compteur d'essais a déjà été incrémenté à la prise : une tâche qui tue
+        # son worker à chaque fois finit en dead-letter au lieu de boucler.
+        dead = db.execute(
+            update(Job).where(*expired, Job.attempts >= Job.max_attempts)
+            .values(status="dead", finished_at=now, locked_by=None, last_error="Bail expiré")
+            .returning(Job.id, Job.kind, Job.payload)
+        ).all()
+        requeued = db.execute(
+            update(Job).where(*expired)
+            .values(status="queued", run_at=now, locked_at=None, locked_by=None, last_error="Bail expiré")
+        ).rowcount
+        db.execute(delete(Job).where(Job.status == "done", Job.finished_at < now - JOB_RETENTION))
+        db.commit()
+        idempotency.purge_expired(db)
+    finally:
+        db.close()
+    if dead or requeued:
+        logger.warning("Baux expirés : %d tâche(s) reprise(s), %d abandonnée(s)", requeued, len(dead))
+    # Abandon sur bail expiré : mêmes conséquences qu'un abandon après échec
+    for job_id, kind, payload in dead:
+        registry.inc("facilite_jobs_total", (("kind", kind), ("outcome", "dead")))
+        _call_on_dead(kind, job_id, json.loads(payload))
+
+
+# ==========================
+# Workers dans le process de l'API
+# ==========================
+_stop = threading.Event()
+_threads: list[threading.Thread] = []
+
+
+def start_workers(count: int = JOB_WORKERS_IN_APP) -> None:
+    if _threads or count <= 0:
+        return
+    _stop.clear()
+    for index in range(count):
+        worker = Worker(stop=_stop)
+        thread = threading.Thread(target=worker.run, name=f"job-worker-{index}", daemon=True)
+        thread.start()
+        _threads.append(thread)
+
+
+def stop_workers(timeout: float = 5.0) -> None:
+    _stop.set()
+    _wake.set()
+    for thread in _threads:
+        thread.join(timeout=timeout)
+    _threads.clear()
+    async_runner.stop(timeout)
@@ -0,0 +1,246 @@
+# utils/kitchen.py
+import asyncio
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
+from sqlalchemy.orm import selectinload
+
+from backend_facilite.database import SessionLocal
+from backend_facilite.models import Delivery, DeliveryStatusEnum, Order, OrderItem, Payment
+from backend_facilite.utils.metrics import registry
+from backend_facilite.utils.outbox import Event, bus, dispatcher
+
+# ==========================
+# Configuration
+# ==========================
+# Une commande plus ancienne n'est plus "en cuisine" : borne le chargement initial
+KITCHEN_WINDOW = timedelta(hours=float(os.getenv("KITCHEN_WINDOW_HOURS", "12")))
+# Messages en attente par flux ; au-delà le client est déconnecté et se resynchronise
+KITCHEN_STREAM_BUFFER = int(os.getenv("KITCHEN_STREAM_BUFFER", "256"))
+
+CLOSED_STATUSES = {DeliveryStatusEnum.delivered.value, DeliveryStatusEnum.cancelled.value}
+
+
+def _entry_from_order(order: Order, paid: bool) -> dict:
+    delivery = order.delivery
+    return {
+        "order_id": order.id,
+        "restaurant_id": order.restaurant_id,
+        "user_id": order.user_id,
+        "total": order.total,
+        "created_at": order.created_at.isoformat() if order.created_at else None,
+        "latitude": order.latitude,
+        "longitude": order.longitude,
+        "items": [
+            {"menu_id": item.menu_id, "name": item.menu.name if item.menu else None, "quantity": item.quantity}
+            for item in order.items
+        ],
+        "paid": paid,
+        "delivery_status": getattr(delivery.status, "value", delivery.status) if delivery else None,
+        "delivery_person_id": delivery.delivery_person_id if delivery else None,
+    }
+
+
+class _Listener:
+    __slots__ = ("restaurant_ids", "loop", "queue")
+
+    def __init__(self, restaurant_ids: frozenset[int], loop: asyncio.AbstractEventLoop):
+        self.restaurant_ids = restaurant_ids
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=KITCHEN_STREAM_BUFFER)
+
+
+class KitchenBoard:
+    """
+    File des commandes ouvertes par restaurant, tenue à jour par les événements
+    de l'outbox. Un restaurant est chargé depuis la base (fenêtre KITCHEN_WINDOW)
+    au premier abonné, puis rechargé seulement quand l'écoute LISTEN/NOTIFY a été
+    coupée : des événements ont pu être perdus pendant la reconnexion.
+    """
+
+    def __init__(self, window: timedelta = KITCHEN_WINDOW):
+        self.window = window
+        self._orders: dict[int, dict[int, dict]] = {}     # restaurant -> {commande: entrée}
+        self._restaurant_of: dict[int, int] = {}           # commande ouverte -> restaurant
+        self._pending: dict[int, list[Event]] = {}         # événements reçus pendant un chargement
+        self._listeners: list[_Listener] = []
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    # --------------------------
+    # Lecture
+    # --------------------------
+    def snapshot(self, restaurant_id: int) -> list[dict]:
+        """Commandes ouvertes, plus anciennes d'abord (appel bloquant : threadpool)."""
+        if restaurant_id not in self._orders:
+            self._load(restaurant_id)
+        cutoff = (datetime.utcnow() - self.window).isoformat()
+        with self._lock:
+            orders = self._orders[restaurant_id]
+            for order_id in [i for i, e in orders.items() if e["created_at"] and e["created_at"] < cutoff]:
+                del orders[order_id]
+                self._restaurant_of.pop(order_id, None)
+            return sorted(orders.values(), key=lambda e: (e["created_at"] or "", e["order_id"]))
+
+    def _load(self, restaurant_id: int, reload: bool = False) -> None:
+        with self._load_lock:
+            with self._lock:
+                if (restaurant_id in self._orders) != reload:
+                    return
+                self._pending[restaurant_id] = []
+            try:
+                entries = self._query(restaurant_id)
+            except Exception:
+                with self._lock:
+                    del self._pending[restaurant_id]
+                raise
+            with self._lock:
+                previous = self._orders.get(restaurant_id, {})
+                orders = self._orders[restaurant_id] = {e["order_id"]: e for e in entries}
+                for order_id in previous.keys() - orders.keys():
+                    self._restaurant_of.pop(order_id, None)
+                    self._broadcast(restaurant_id, None, "remove", {"order_id": order_id, "restaurant_id": restaurant_id})
+                for e in entries:
+                    self._restaurant_of[e["order_id"]] = restaurant_id
+                    # Rechargement : les flux ouverts reçoivent l'écart avec ce qu'ils affichent
+                    if reload and previous.get(e["order_id"]) != e:
+                        self._broadcast(restaurant_id, None, "upsert", dict(e))
+                # Les événements commités pendant la requête sont rejoués : l'état final est le bon
+                for evt in self._pending.pop(restaurant_id):
+                    self._apply_locked(evt, restaurant_id)
+
+    def resync(self) -> None:
+        """Recharge depuis la base les restaurants déjà suivis (après une reconnexion LISTEN)."""
+        with self._lock:
+            restaurant_ids = list(self._orders)
+        for restaurant_id in restaurant_ids:
+            self._load(restaurant_id, reload=True)
+
+    def _query(self, restaurant_id: int) -> list[dict]:
+        db = SessionLocal()
+        try:
+            orders = (
+                db.query(Order)
+                .outerjoin(Delivery, Delivery.order_id == Order.id)
+                .filter(
+                    Order.restaurant_id == restaurant_id,
+                    Order.created_at >= datetime.utcnow() - self.window,
+                    or_(Delivery.id.is_(None), Delivery.status.notin_(
+                        [DeliveryStatusEnum.delivered, DeliveryStatusEnum.cancelled]
+                    )),
+                )
+                .options(selectinload(Order.items).selectinload(OrderItem.menu), selectinload(Order.delivery))
+                .all()
+            )
+            paid = {
+                order_id for (order_id,) in db.query(Payment.order_id).filter(
+                    Payment.order_id.in_([order.id for order in orders]), Payment.status == "success"
+                )
+            } if orders else set()
+            return [_entry_from_order(order, order.id in paid) for order in orders]
+        finally:
+            db.close()
+
+    # --------------------------
+    # Événements (thread du bus)
+    # --------------------------
+    def apply(self, evt: Event) -> None:
+        payload = evt.payload
+        with self._lock:
+            restaurant_id = payload.get("restaurant_id") or self._restaurant_of.get(payload.get("order_id"))
+            if restaurant_id is None:
+                # Peut-être une commande d'un restaurant en cours de chargement : rejoué après
+                for pending in self._pending.values():
+                    pending.append(evt)
+                return
+            if restaurant_id in self._pending:
+                self._pending[restaurant_id].append(evt)
+            elif restaurant_id in self._orders:
+                self._apply_locked(evt, restaurant_id)
+
+    def _apply_locked(self, evt: Event, restaurant_id: int) -> None:
+        payload = evt.payload
+        orders = self._orders[restaurant_id]
+        order_id = payload.get("order_id")
+
+        if evt.topic == "order.created":
+            entry = orders[order_id] = {key: payload.get(key) for key in (
+                "order_id", "restaurant_id", "user_id", "total", "created_at", "latitude", "longitude", "items",
+            )}
+            entry.update(paid=False, delivery_status=None, delivery_person_id=None)
+            self._restaurant_of[order_id] = restaurant_id
+        else:
+            entry = orders.get(order_id)
+            if entry is None:
+                return
+            if evt.topic == "order.location_updated":
+                entry.update(latitude=payload["latitude"], longitude=payload["longitude"])
+            elif evt.topic in ("payment.created", "payment.updated"):
+                # Espèces : "success" dès la création ; Mobile Money : au webhook de l'opérateur
+                entry["paid"] = entry["paid"] or payload.get("status") == "success"
+            elif evt.topic.startswith("delivery."):
+                entry.update(delivery_status=payload["status"], delivery_person_id=payload["delivery_person_id"])
+                if payload["status"] in CLOSED_STATUSES:
+                    del orders[order_id]
+                    self._restaurant_of.pop(order_id, None)
+                    self._broadcast(restaurant_id, evt.id, "remove", {"order_id": order_id, "restaurant_id": restaurant_id})
+                    return
+            else:
+                return
+        self._broadcast(restaurant_id, evt.id, "upsert", dict(entry))
+
+    def _broadcast(self, restaurant_id: int, event_id: int | None, kind: str, data: dict) -> None:
+        message = format_sse(kind, data, event_id)
+        for listener in self._listeners:
+            if restaurant_id in listener.restaurant_ids:
+                listener.loop.call_soon_threadsafe(_offer, listener.queue, message)
+
+    # --------------------------
+    # Abonnés (flux SSE)
+    # --------------------------
+    def listen(self, restaurant_ids, loop: asyncio.AbstractEventLoop) -> _Listener:
+        listener = _Listener(frozenset(restaurant_ids), loop)
+        with self._lock:
+            self._listeners = self._listeners + [listener]
+        return listener
+
+    def unlisten(self, listener: _Listener) -> None:
+        with self._lock:
+            self._listeners = [x for x in self._listeners if x is not listener]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "restaurants": len(self._orders),
+                "open_orders": sum(len(orders) for orders in self._orders.values()),
+                "streams": len(self._listeners),
+            }
+
+
+def _offer(queue: asyncio.Queue, message: str) -> None:
+    try:
+        queue.put_nowait(message)
+    except asyncio.QueueFull:
+        # Client trop lent : on coupe le flux, il se resynchronisera par un snapshot
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+
+def format_sse(kind: str, data, event_id: int | None = None) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {kind}\ndata: {json.dumps(data, separators=(',', ':'), default=str)}\n\n"
+
+
+board = KitchenBoard()
+for _topic in ("order.*", "payment.created", "payment.updated", "delivery.*"):
+    bus.subscribe(_topic, board.apply)
+dispatcher.on_listen(board.resync)
+
+registry.register_gauges(lambda: [
+    ("facilite_kitchen_open_orders", {}, board.stats()["open_orders"]),
+    ("facilite_kitchen_streams", {}, board.stats()["streams"]),
+])
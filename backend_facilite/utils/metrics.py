@@ -0,0 +1,317 @@
+# utils/metrics.py
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Iterable
+
+from sqlalchemy import event
+
+# ==========================
+# Métriques au format Prometheus
+# ==========================
+# Chemin chaud sans verrou : chaque thread écrit dans son propre "shard"
+# (dict de compteurs) ; /metrics additionne les shards à la lecture. Le seul
+# verrou est pris une fois par thread, à la création de son shard.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+QUERIES_PER_REQUEST_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+UNMATCHED_ROUTE = "<unmatched>"
+
+_HELP = {
+    "facilite_http_requests_total": ("counter", "Requêtes HTTP par route et statut"),
+    "facilite_http_request_duration_seconds": ("histogram", "Latence des requêtes HTTP"),
+    "facilite_db_queries_total": ("counter", "Requêtes SQL exécutées"),
+    "facilite_db_query_duration_seconds": ("histogram", "Durée des requêtes SQL"),
+    "facilite_db_queries_per_request": ("histogram", "Requêtes SQL par requête HTTP"),
+    "facilite_db_time_per_request_seconds": ("histogram", "Temps SQL cumulé par requête HTTP"),
+    "facilite_cache_hits_total": ("counter", "Lectures de cache réussies"),
+    "facilite_cache_misses_total": ("counter", "Lectures de cache manquées"),
+    "facilite_cache_hit_ratio": ("gauge", "Taux de succès du cache depuis le démarrage"),
+    "facilite_threadpool_busy": ("gauge", "Threads occupés du pool des handlers synchrones"),
+    "facilite_threadpool_capacity": ("gauge", "Taille du pool des handlers synchrones"),
+    "facilite_admission_rejected_total": ("counter", "Requêtes refusées par le contrôle d'admission"),
+    "facilite_traces_exported_total": ("counter", "Traces confiées à l'exporteur"),
+    "facilite_traces_dropped_total": ("counter", "Traces perdues (file pleine, export en échec)"),
+    "facilite_outbox_published_total": ("counter", "Événements de l'outbox publiés, par topic"),
+    "facilite_outbox_handler_errors_total": ("counter", "Abonnés du bus d'événements en échec"),
+    "facilite_outbox_lag_seconds": ("histogram", "Âge du plus ancien événement d'un lot à sa publication"),
+    "facilite_kitchen_open_orders": ("gauge", "Commandes ouvertes tenues en mémoire pour les cuisines"),
+    "facilite_kitchen_streams": ("gauge", "Flux SSE cuisine connectés"),
+    "facilite_jobs_total": ("counter", "Tâches exécutées, par type et issue (done, retry, dead)"),
+    "facilite_job_duration_seconds": ("histogram", "Durée d'exécution des tâches"),
+    "facilite_job_queue_wait_seconds": ("histogram", "Attente en file avant la première exécution"),
+}
+
+
+class _Shard:
+    __slots__ = ("counters", "histograms")
+
+    def __init__(self):
+        self.counters: dict[tuple, float] = {}
+        # clé -> [compte par bucket..., +Inf, somme]
+        self.histograms: dict[tuple, list] = {}
+
+
+class Registry:
+    def __init__(self):
+        self._local = threading.local()
+        self._shards: list[_Shard] = []
+        self._shards_lock = threading.Lock()
+        self._buckets: dict[str, tuple] = {}
+        self._gauges: list[Callable[[], Iterable[tuple[str, dict, float]]]] = []
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def inc(self, name: str, labels: tuple = (), value: float = 1.0) -> None:
+        counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> None:
+        histograms = self._shard().histograms
+        key = (name, labels)
+        row = histograms.get(key)
+        if row is None:
+            self._buckets.setdefault(name, buckets)
+            row = histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+        row[bisect_left(buckets, value)] += 1
+        row[-1] += value
+
+    def register_gauges(self, collector: Callable[[], Iterable[tuple[str, dict, float]]]) -> None:
+        """`collector()` renvoie des (nom, labels, valeur), évalués à chaque lecture de /metrics."""
+        self._gauges.append(collector)
+
+    # --------------------------
+    # Export
+    # --------------------------
+    def _merged(self):
+        with self._shards_lock:
+            shards = list(self._shards)
+        counters: dict[tuple, float] = {}
+        histograms: dict[tuple, list] = {}
+        for shard in shards:
+            for key, value in list(shard.counters.items()):
+                counters[key] = counters.get(key, 0.0) + value
+            for key, row in list(shard.histograms.items()):
+                total = histograms.setdefault(key, [0] * (len(row) - 1) + [0.0])
+                for i, v in enumerate(row):
+                    total[i] += v
+        return counters, histograms
+
+    def render(self) -> str:
+        counters, histograms = self._merged()
+        lines: list[str] = []
+        seen: set[str] = set()
+
+        def header(name: str, kind: str, text: str = "") -> None:
+            if name not in seen:
+                seen.add(name)
+                kind, text = _HELP.get(name, (kind, text))
+                if text:
+                    lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in sorted(counters.items()):
+            header(name, "counter")
+            lines.append(f"{name}{_labels(labels)} {_number(value)}")
+
+        for (name, labels), row in sorted(histograms.items()):
+            header(name, "histogram")
+            cumulative = 0
+            for bound, count in zip(self._buckets[name] + ("+Inf",), row[:-1]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels + (('le', _number(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(row[-1])}")
+            lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+
+        # Une famille = un bloc contigu, même si plusieurs collecteurs l'alimentent
+        gauges: dict[str, list[str]] = {}
+        for collector in self._gauges:
+            for name, labels, value in collector():
+                gauges.setdefault(name, []).append(f"{name}{_labels(tuple(labels.items()))} {_number(value)}")
+        for name, samples in gauges.items():
+            header(name, "gauge")
+            lines.extend(samples)
+
+        return "\n".join(lines) + "\n"
+
+
+def _number(value) -> str:
+    if isinstance(value, str):
+        return value
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    escaped = (f'{k}="{_escape(str(v))}"' for k, v in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = Registry()
+
+
+def register_cache(name: str, cache) -> None:
+    """Expose les compteurs `hits` / `misses` d'un cache (lus à chaque scrape)."""
+    def _cache_gauges():
+        hits, misses = cache.hits, cache.misses
+        labels = {"cache": name}
+        yield "facilite_cache_hits_total", labels, hits
+        yield "facilite_cache_misses_total", labels, misses
+        yield "facilite_cache_hit_ratio", labels, round(hits / (hits + misses), 4) if hits + misses else 0.0
+
+    registry.register_gauges(_cache_gauges)
+
+
+def _threadpool_gauges():
+    # Pool anyio où FastAPI exécute les handlers et dépendances synchrones ;
+    # busy == capacity signifie que les requêtes attendent un thread.
+    from anyio import to_thread
+
+    try:
+        limiter = to_thread.current_default_thread_limiter()
+    except RuntimeError:  # hors boucle événementielle
+        return
+    yield "facilite_threadpool_busy", {}, limiter.borrowed_tokens
+    yield "facilite_threadpool_capacity", {}, limiter.total_tokens
+
+
+registry.register_gauges(_threadpool_gauges)
+
+
+# ==========================
+# Requêtes SQL (par requête HTTP)
+# ==========================
+class RequestDBStats:
+    __slots__ = ("queries", "seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+# Posé par le middleware ; les handlers synchrones tournent dans le threadpool
+# avec une copie du contexte, qui référence le même objet RequestDBStats.
+current_db_stats: ContextVar[RequestDBStats | None] = ContextVar("current_db_stats", default=None)
+
+# Autres consommateurs de la même mesure (profileur SQL) : une seule pile de
+# chronométrage par moteur, appelés avec (statement, secondes)
+_query_observers: list[Callable[[str, float], None]] = []
+
+
+def observe_queries(callback: Callable[[str, float], None]) -> None:
+    _query_observers.append(callback)
+
+
+def instrument_engine(engine) -> None:
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_started"].pop()
+        registry.inc("facilite_db_queries_total")
+        registry.observe("facilite_db_query_duration_seconds", elapsed, buckets=QUERY_BUCKETS)
+        stats = current_db_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.seconds += elapsed
+        for observer in _query_observers:
+            observer(statement, elapsed)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        # Pas d'after_cursor_execute pour une requête en échec : sans ce pop, la pile
+        # de la connexion (réutilisée par le pool) décale toutes les mesures suivantes
+        conn = exception_context.connection
+        if conn is not None and exception_context.execution_context is not None:
+            started = conn.info.get("metrics_started")
+            if started:
+                started.pop()
+
+    def _pool_gauges():
+        pool = engine.pool
+        labels = {"database": engine.url.database or ""}
+        for metric in ("size", "checkedin", "checkedout", "overflow"):
+            if hasattr(pool, metric):
+                yield f"facilite_db_pool_{metric}", labels, getattr(pool, metric)()
+
+    registry.register_gauges(_pool_gauges)
+
+
+# ==========================
+# Middleware HTTP
+# ==========================
+_templates: dict = {}
+
+
+def route_template(scope) -> str:
+    """Modèle de chemin de la route servie ("/payments/{tx_code}/qr"), jamais le chemin brut."""
+    # Le routeur pose scope["endpoint"] ; la table endpoint -> modèle est
+    # construite une fois par endpoint.
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return UNMATCHED_ROUTE
+    template = _templates.get(endpoint)
+    if template is None:
+        app = scope.get("app")
+        for route in getattr(app, "routes", ()):
+            if getattr(route, "endpoint", None) is endpoint:
+                template = route.path_format
+                break
+        else:
+            template = UNMATCHED_ROUTE
+        _templates[endpoint] = template
+    return template
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI : compte et chronomètre chaque requête, étiquetée par le
+    modèle de route et le statut.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        status = [500]
+        stats = RequestDBStats()
+        token = current_db_stats.set(stats)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_db_stats.reset(token)
+            elapsed = time.perf_counter() - started
+            route = route_template(scope)
+            labels = (("method", scope["method"]), ("route", route), ("status", str(status[0])))
+            registry.inc("facilite_http_requests_total", labels)
+            registry.observe("facilite_http_request_duration_seconds", elapsed, labels)
+            route_labels = (("route", route),)
+            registry.observe("facilite_db_queries_per_request", stats.queries, route_labels,
+                             buckets=QUERIES_PER_REQUEST_BUCKETS)
+            registry.observe("facilite_db_time_per_request_seconds", stats.seconds, route_labels,
+                             buckets=QUERY_BUCKETS)
@@ -1,13 +1,16 @@
+import asyncio
+import hashlib
+import hmac
+import os
 import random
-import string
 import time
 
+from backend_facilite.utils.ids import new_transaction_code
+
 
 def generate_transaction_code():
-    # Exemple : MPESA-8F9D2KQ3
-    prefix = "MPESA"
-    code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
-    return f"{prefix}-{code}"
+    # Exemple : MPESA-0CJ8Z3K4W00G2 (même générateur que les paiements)
+    return new_transaction_code("MPESA")
 
 
 def simulate_mobile_money(amount: float, user_phone: str) -> dict:
@@ -18,7 +21,7 @@ def simulate_mobile_money(amount: float, user_phone: str) -> dict:
     time.sleep(2)
 
     # Générer un ID unique de transaction
-    transaction_id = "MM-" + ''.join(random.choices(string.ascii_uppercase + string.digits, k=10))
+    transaction_id = new_transaction_code("MM")
 
     # Simulation de succès/échec
     success = random.choice([True, True, True, False])  # 75% de chances succès
@@ -35,3 +38,127 @@ def simulate_mobile_money(amount: float, user_phone: str) -> dict:
             "transaction_id": transaction_id,
             "message": "Échec du paiement, solde insuffisant."
         }
+
+
+# ==========================
+# Passerelle Mobile Money asynchrone
+# ==========================
+# "simulated" : comportement historique (paiement validé immédiatement)
+# "gateway"   : le paiement reste "pending" jusqu'au webhook de l'opérateur
+MOBILE_MONEY_MODE = os.getenv("MOBILE_MONEY_MODE", "simulated")
+MOBILE_MONEY_METHODS = ("mpesa", "airtel_money", "orange_money")
+
+STUB_GATEWAY_URL = os.getenv("MOBILE_MONEY_STUB_URL", "http://127.0.0.1:8090")
+GATEWAY_URLS = {
+    method: os.getenv(f"{method.upper()}_GATEWAY_URL", f"{STUB_GATEWAY_URL}/{method}")
+    for method in MOBILE_MONEY_METHODS
+}
+DEV_WEBHOOK_SECRET = "dev-webhook-secret"
+WEBHOOK_SECRET = os.getenv("MOBILE_MONEY_WEBHOOK_SECRET", DEV_WEBHOOK_SECRET)
+# Le secret de dev est public : avec lui, n'importe qui confirmerait des paiements
+if MOBILE_MONEY_MODE == "gateway" and WEBHOOK_SECRET in ("", DEV_WEBHOOK_SECRET):
+    raise RuntimeError("MOBILE_MONEY_MODE=gateway nécessite un MOBILE_MONEY_WEBHOOK_SECRET propre à l'environnement")
+PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "http://127.0.0.1:8000")
+
+
+class GatewayError(Exception):
+    """Échec de l'appel à l'opérateur (après les retries) ; `retryable` : réessayer plus tard a un sens."""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def sign_webhook(body: bytes, secret: str = WEBHOOK_SECRET) -> str:
+    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def verify_webhook(body: bytes, signature: str | None, secret: str = WEBHOOK_SECRET) -> bool:
+    return bool(signature) and hmac.compare_digest(sign_webhook(body, secret), signature)
+
+
+class MobileMoneyGateway:
+    """
+    Client HTTP asynchrone partagé : pool de connexions keep-alive, timeouts
+    courts et retries avec backoff exponentiel + jitter. L'opérateur confirme
+    le paiement plus tard via le webhook (voir routers/payments.py).
+    """
+
+    def __init__(
+        self,
+        base_urls: dict[str, str] = GATEWAY_URLS,
+        max_retries: int = 3,
+        backoff_base: float = 0.2,
+        backoff_cap: float = 2.0,
+        timeout: float = 5.0,
+        connect_timeout: float = 2.0,
+        max_connections: int = 200,
+        max_keepalive_connections: int = 50,
+    ):
+        self.base_urls = base_urls
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self._client = None
+
+    def _get_client(self):
+        # httpx (et asyncio/ssl derrière lui) n'est chargé qu'au premier appel
+        # réel à l'opérateur : en mode "simulated", jamais.
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                ),
+            )
+        return self._client
+
+    def _backoff(self, attempt: int) -> float:
+        # "full jitter" : évite que des milliers de retries repartent en même temps
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    async def initiate(self, method: str, amount: float, phone: str, reference: str, callback_url: str) -> dict:
+        """Demande le débit à l'opérateur ; `reference` sert de clé d'idempotence."""
+        if method not in self.base_urls:
+            raise GatewayError(f"Opérateur inconnu : {method}", retryable=False)
+        client = self._get_client()
+        import httpx
+
+        url = f"{self.base_urls[method]}/payments"
+        body = {"amount": amount, "phone": phone, "reference": reference, "callback_url": callback_url}
+        headers = {"Idempotency-Key": reference}
+        last_error = None
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                resp = await client.post(url, json=body, headers=headers)
+                if resp.status_code < 500 and resp.status_code != 429:
+                    resp.raise_for_status()
+                    return resp.json()
+                last_error = f"HTTP {resp.status_code}"
+            except httpx.HTTPStatusError as exc:
+                raise GatewayError(
+                    f"Requête refusée par {method} : {exc.response.status_code}", retryable=False
+                ) from exc
+            except httpx.TransportError as exc:
+                last_error = repr(exc)
+
+            if attempt < self.max_retries:
+                await asyncio.sleep(self._backoff(attempt))
+
+        raise GatewayError(f"{method} injoignable après {self.max_retries + 1} tentatives : {last_error}")
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+gateway = MobileMoneyGateway()
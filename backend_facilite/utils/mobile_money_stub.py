@@ -0,0 +1,107 @@
+# utils/mobile_money_stub.py
+"""
+Passerelle Mobile Money factice pour les tests de charge hors ligne.
+
+    python -m backend_facilite.utils.mobile_money_stub --port 8090
+
+Chaque POST /{operateur}/payments répond 202 tout de suite, puis appelle le
+webhook `callback_url` après une latence aléatoire, avec un taux d'échec
+configurable. Tout est asynchrone : des centaines de paiements peuvent être
+en vol simultanément.
+"""
+import argparse
+import asyncio
+import json
+import random
+import uuid
+
+import httpx
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
+
+from backend_facilite.utils.mobile_money import MOBILE_MONEY_METHODS, sign_webhook
+
+LATENCY_RANGE = (0.5, 3.0)   # secondes avant le webhook
+FAILURE_RATE = 0.1
+ERROR_RATE = 0.0             # proportion de 503 pour exercer les retries
+
+app = FastAPI(title="mobile_money_stub")
+app.state.client = None
+app.state.in_flight = 0
+app.state.completed = 0
+app.state.seen = {}          # Idempotency-Key -> réponse déjà donnée
+# Références fortes : la boucle ne garde qu'une référence faible aux tâches
+app.state.tasks = set()
+
+
+@app.on_event("startup")
+async def _start():
+    app.state.client = httpx.AsyncClient(timeout=5.0)
+
+
+@app.on_event("shutdown")
+async def _stop():
+    await app.state.client.aclose()
+
+
+async def _complete(callback_url: str, reference: str, transaction_id: str):
+    app.state.in_flight += 1
+    try:
+        await asyncio.sleep(random.uniform(*LATENCY_RANGE))
+        status = "failed" if random.random() < FAILURE_RATE else "success"
+        body = json.dumps({
+            "reference": reference,
+            "transaction_id": transaction_id,
+            "status": status,
+        }).encode()
+        try:
+            await app.state.client.post(
+                callback_url,
+                content=body,
+                headers={"Content-Type": "application/json", "X-Signature": sign_webhook(body)},
+            )
+        except httpx.HTTPError:
+            pass  # un vrai opérateur réessaierait ; le stub se contente de compter
+    finally:
+        app.state.in_flight -= 1
+        app.state.completed += 1
+
+
+@app.post("/{provider}/payments", status_code=202)
+async def create_payment(provider: str, request: Request):
+    if provider not in MOBILE_MONEY_METHODS:
+        raise HTTPException(status_code=404, detail="Opérateur inconnu")
+    if random.random() < ERROR_RATE:
+        return JSONResponse(status_code=503, content={"detail": "indisponible"})
+
+    payload = await request.json()
+    key = request.headers.get("Idempotency-Key") or payload["reference"]
+    if key in app.state.seen:
+        return app.state.seen[key]
+
+    transaction_id = f"{provider.upper()}-{uuid.uuid4().hex[:12].upper()}"
+    response = {"status": "pending", "transaction_id": transaction_id}
+    app.state.seen[key] = response
+    task = asyncio.create_task(_complete(payload["callback_url"], payload["reference"], transaction_id))
+    app.state.tasks.add(task)
+    task.add_done_callback(app.state.tasks.discard)
+    return response
+
+
+@app.get("/stats")
+async def stats():
+    return {"in_flight": app.state.in_flight, "completed": app.state.completed}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--failure-rate", type=float, default=FAILURE_RATE)
+    parser.add_argument("--error-rate", type=float, default=ERROR_RATE)
+    args = parser.parse_args()
+
+    FAILURE_RATE, ERROR_RATE = args.failure_rate, args.error_rate
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
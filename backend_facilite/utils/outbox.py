@@ -0,0 +1,364 @@
+# utils/outbox.py
+import fnmatch
+import json
+import logging
+import os
+import select
+import threading
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import Callable
+
+from sqlalchemy import delete, event, func, select as sql_select, update
+from sqlalchemy.orm import Session
+
+from backend_facilite.database import SessionLocal, engine
+from backend_facilite.models import OutboxEvent
+from backend_facilite.utils.http_cache import WEB_CONCURRENCY
+from backend_facilite.utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# Configuration
+# ==========================
+# 0 sur les process qui ne doivent pas publier (les abonnés reçoivent quand même via NOTIFY)
+OUTBOX_DISPATCHER = os.getenv("OUTBOX_DISPATCHER", "1") == "1"
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "1"))  # filet si un réveil est perdu
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "200"))
+OUTBOX_RETENTION = timedelta(hours=float(os.getenv("OUTBOX_RETENTION_HOURS", "24")))
+OUTBOX_PURGE_INTERVAL_SECONDS = 600
+# Hors PostgreSQL : tentatives de livraison locale d'un événement dont un abonné
+# échoue, avant de le marquer publié quand même (un abonné cassé ne bloque pas le bus)
+OUTBOX_MAX_LOCAL_ATTEMPTS = int(os.getenv("OUTBOX_MAX_LOCAL_ATTEMPTS", "5"))
+
+# PostgreSQL : réveil des dispatchers et diffusion des événements à tous les workers
+WAKE_CHANNEL = "facilite_outbox"
+EVENTS_CHANNEL = "facilite_events"
+NOTIFY_MAX_BYTES = 7000          # limite PostgreSQL : 8000 octets par notification
+DISPATCH_LOCK_KEY = 0x0F4C11    # pg_advisory_xact_lock : un seul dispatcher actif => ordre global
+
+
+@dataclass(frozen=True)
+class Event:
+    id: int
+    topic: str
+    aggregate_type: str
+    aggregate_id: int
+    payload: dict
+    created_at: str
+
+    @classmethod
+    def from_row(cls, row: OutboxEvent) -> "Event":
+        return cls(
+            id=row.id,
+            topic=row.topic,
+            aggregate_type=row.aggregate_type,
+            aggregate_id=row.aggregate_id,
+            payload=json.loads(row.payload),
+            created_at=row.created_at.isoformat(),
+        )
+
+
+# ==========================
+# Écriture (dans la transaction de l'appelant)
+# ==========================
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return getattr(value, "value", str(value))   # enums
+
+
+def record(db: Session, topic: str, aggregate_type: str, aggregate_id: int, payload: dict) -> None:
+    """
+    Ajoute un événement à la session : il est commité (ou annulé) avec le
+    changement d'état qu'il décrit. Les dispatchers sont réveillés au commit.
+    """
+    db.add(OutboxEvent(
+        topic=topic,
+        aggregate_type=aggregate_type,
+        aggregate_id=aggregate_id,
+        payload=json.dumps(payload, default=_json_default, separators=(",", ":")),
+    ))
+    if not db.info.get("outbox_pending"):
+        db.info["outbox_pending"] = True
+        if db.get_bind().dialect.name == "postgresql":
+            # NOTIFY est transactionnel : livré au commit, oublié au rollback
+            db.execute(sql_select(func.pg_notify(WAKE_CHANNEL, "")))
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_after_commit(session):
+    if session.info.pop("outbox_pending", False):
+        dispatcher.wake()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop("outbox_pending", None)
+
+
+# ==========================
+# Bus en mémoire (abonnés du process)
+# ==========================
+class EventBus:
+    """
+    Abonnements par motif de topic ("delivery.*", "payment.validated", "*").
+    Les handlers sont appelés dans le thread de publication : ils doivent
+    rendre la main vite (déposer dans une file, call_soon_threadsafe...).
+    """
+
+    def __init__(self):
+        self._subscribers: list[tuple[str, Callable[[Event], None]]] = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, pattern: str, handler: Callable[[Event], None]) -> Callable[[], None]:
+        entry = (pattern, handler)
+        with self._lock:
+            self._subscribers = self._subscribers + [entry]
+
+        def unsubscribe():
+            with self._lock:
+                self._subscribers = [s for s in self._subscribers if s is not entry]
+        return unsubscribe
+
+    def publish(self, evt: Event) -> bool:
+        """Appelle tous les abonnés concernés ; False si l'un d'eux a échoué."""
+        delivered = True
+        for pattern, handler in self._subscribers:
+            if pattern == "*" or pattern == evt.topic or fnmatch.fnmatchcase(evt.topic, pattern):
+                try:
+                    handler(evt)
+                except Exception:
+                    delivered = False
+                    registry.inc("facilite_outbox_handler_errors_total", (("topic", evt.topic),))
+                    logger.exception("Abonné en échec sur %s #%d", evt.topic, evt.id)
+        return delivered
+
+
+bus = EventBus()
+
+
+# ==========================
+# Dispatcher
+# ==========================
+class OutboxDispatcher:
+    """
+    Publie les événements non publiés, dans l'ordre des ids, au moins une fois.
+
+    - PostgreSQL : un seul dispatcher actif à la fois (verrou consultatif), qui
+      NOTIFY chaque événement puis le marque publié dans la même transaction ;
+      chaque worker LISTEN et alimente son bus local.
+    - Autres bases (SQLite, un seul process) : publication directe sur le bus,
+      puis marquage des seuls événements livrés ; le lot s'arrête au premier
+      échec, repris au tour suivant (OUTBOX_MAX_LOCAL_ATTEMPTS au plus).
+    """
+
+    def __init__(self, poll_seconds: float = OUTBOX_POLL_SECONDS, batch_size: int = OUTBOX_BATCH_SIZE):
+        self.poll_seconds = poll_seconds
+        self.batch_size = batch_size
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._last_purge = 0.0
+        self._local_failures: dict[int, int] = {}   # id -> échecs de livraison locale
+        self._listen_hooks: list[Callable[[], None]] = []
+        self.postgres = engine.dialect.name == "postgresql"
+
+    def start(self, dispatch: bool = OUTBOX_DISPATCHER) -> None:
+        if self._threads:
+            return
+        if not self.postgres and WEB_CONCURRENCY > 1:
+            # Sans LISTEN/NOTIFY, les événements ne quittent pas le process qui les publie
+            logger.error(
+                "Outbox sans PostgreSQL avec WEB_CONCURRENCY=%d : les abonnés des autres "
+                "process (écrans cuisine, flux SSE) ne recevront pas les événements",
+                WEB_CONCURRENCY,
+            )
+        self._stop.clear()
+        targets = []
+        if dispatch:
+            targets.append((self._dispatch_loop, "outbox-dispatcher"))
+        if self.postgres:
+            targets.append((self._listen_loop, "outbox-listener"))
+        for target, name in targets:
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout=self.poll_seconds + 1)
+        self._threads = []
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def on_listen(self, hook: Callable[[], None]) -> None:
+        """
+        Appelé (thread d'écoute) à chaque LISTEN établi, reconnexions comprises :
+        les NOTIFY émis pendant la coupure sont perdus, l'abonné se resynchronise.
+        """
+        self._listen_hooks.append(hook)
+
+    # --------------------------
+    # Publication
+    # --------------------------
+    def _dispatch_loop(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+            try:
+                while self.dispatch_once() == self.batch_size and not self._stop.is_set():
+                    pass
+                if time.monotonic() - self._last_purge > OUTBOX_PURGE_INTERVAL_SECONDS:
+                    self.purge()
+                    self._last_purge = time.monotonic()
+            except Exception:
+                logger.exception("Dispatcher de l'outbox interrompu")
+                self._stop.wait(self.poll_seconds)
+
+    def dispatch_once(self) -> int:
+        """Publie un lot ; retourne le nombre d'événements publiés."""
+        db = SessionLocal()
+        try:
+            if self.postgres and not db.execute(
+                sql_select(func.pg_try_advisory_xact_lock(DISPATCH_LOCK_KEY))
+            ).scalar():
+                return 0
+            rows = db.execute(
+                sql_select(OutboxEvent)
+                .where(OutboxEvent.published_at.is_(None))
+                .order_by(OutboxEvent.id)
+                .limit(self.batch_size)
+            ).scalars().all()
+            if not rows:
+                return 0
+
+            events = [Event.from_row(row) for row in rows]
+            if self.postgres:
+                for evt in events:
+                    db.execute(sql_select(func.pg_notify(EVENTS_CHANNEL, _notification(evt))))
+            else:
+                events = self._publish_locally(events)
+                if not events:
+                    db.rollback()
+                    return 0
+
+            now = datetime.utcnow()
+            db.execute(
+                update(OutboxEvent)
+                .where(OutboxEvent.id.in_([evt.id for evt in events]))
+                .values(published_at=now)
+            )
+            db.commit()
+        finally:
+            db.close()
+
+        for evt in events:
+            registry.inc("facilite_outbox_published_total", (("topic", evt.topic),))
+        registry.observe(
+            "facilite_outbox_lag_seconds",
+            (now - datetime.fromisoformat(events[0].created_at)).total_seconds(),
+        )
+        return len(events)
+
+    def _publish_locally(self, events: list[Event]) -> list[Event]:
+        """Livre dans l'ordre ; retourne les événements à marquer publiés (arrêt au premier échec)."""
+        delivered = []
+        for evt in events:
+            if bus.publish(evt):
+                self._local_failures.pop(evt.id, None)
+                delivered.append(evt)
+                continue
+            failures = self._local_failures.get(evt.id, 0) + 1
+            if failures < OUTBOX_MAX_LOCAL_ATTEMPTS:
+                self._local_failures[evt.id] = failures
+                break
+            self._local_failures.pop(evt.id, None)
+            logger.error("Événement %s #%d abandonné après %d livraisons en échec", evt.topic, evt.id, failures)
+            delivered.append(evt)
+        return delivered
+
+    def purge(self) -> int:
+        db = SessionLocal()
+        try:
+            removed = db.execute(
+                delete(OutboxEvent).where(OutboxEvent.published_at < datetime.utcnow() - OUTBOX_RETENTION)
+            ).rowcount
+            db.commit()
+            return removed
+        finally:
+            db.close()
+
+    # --------------------------
+    # Réception (PostgreSQL)
+    # --------------------------
+    def _listen_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._listen()
+            except Exception:
+                logger.exception("Écoute LISTEN/NOTIFY interrompue, reconnexion")
+                self._stop.wait(self.poll_seconds)
+
+    def _listen(self) -> None:
+        raw = engine.raw_connection()
+        try:
+            connection = raw.driver_connection
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {WAKE_CHANNEL}")
+                cursor.execute(f"LISTEN {EVENTS_CHANNEL}")
+            # Après le LISTEN : un événement commité pendant la resynchronisation est reçu
+            for hook in self._listen_hooks:
+                try:
+                    hook()
+                except Exception:
+                    logger.exception("Resynchronisation après LISTEN en échec")
+            while not self._stop.is_set():
+                if not select.select([connection], [], [], self.poll_seconds)[0]:
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    notification = connection.notifies.pop(0)
+                    if notification.channel == WAKE_CHANNEL:
+                        self.wake()
+                    else:
+                        evt = _from_notification(notification.payload)
+                        if evt is not None:
+                            bus.publish(evt)
+        finally:
+            raw.invalidate()   # connexion en autocommit avec des LISTEN : ne retourne pas au pool
+
+
+def _notification(evt: Event) -> str:
+    message = json.dumps(asdict(evt), separators=(",", ":"))
+    # Trop gros pour NOTIFY : les workers relisent la ligne par son id
+    return message if len(message.encode()) <= NOTIFY_MAX_BYTES else json.dumps({"id": evt.id})
+
+
+def _from_notification(message: str) -> Event | None:
+    data = json.loads(message)
+    if "topic" in data:
+        return Event(**data)
+    db = SessionLocal()
+    try:
+        row = db.get(OutboxEvent, data["id"])
+        return Event.from_row(row) if row is not None else None
+    finally:
+        db.close()
+
+
+dispatcher = OutboxDispatcher()
+
+
+def start() -> None:
+    dispatcher.start()
+
+
+def stop() -> None:
+    dispatcher.stop()
@@ -0,0 +1,123 @@
+# utils/password_pool.py
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from fastapi import HTTPException
+
+from backend_facilite.utils.metrics import registry
+from backend_facilite.utils.tracing import current_span, traced
+
+# ==========================
+# Configuration
+# ==========================
+# bcrypt coûte ~250 ms CPU à 12 rounds : on l'exécute dans un pool de process
+# dédié pour ne pas affamer les threads qui servent les autres endpoints.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", "32"))
+HASH_QUEUE_TIMEOUT_SECONDS = float(os.getenv("HASH_QUEUE_TIMEOUT_SECONDS", "0.1"))
+
+
+@lru_cache(maxsize=None)
+def pwd_context():
+    # passlib n'est importé que dans les process du pool, au premier hash :
+    # les workers HTTP n'en paient jamais le coût au démarrage.
+    from passlib.context import CryptContext
+
+    # min = max = défaut : tout hash calculé avec un autre coût est à refaire
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=BCRYPT_ROUNDS,
+        bcrypt__min_rounds=BCRYPT_ROUNDS,
+        bcrypt__max_rounds=BCRYPT_ROUNDS,
+    )
+
+
+# Exécutées dans les process du pool (fonctions de module => picklables)
+def _hash(password: str) -> str:
+    return pwd_context().hash(password)
+
+
+def _verify_and_update(password: str, hashed: str) -> tuple[bool, str | None]:
+    return pwd_context().verify_and_update(password, hashed)
+
+
+# ==========================
+# Pool + backpressure
+# ==========================
+_executor: ProcessPoolExecutor | None = None
+_executor_lock = threading.Lock()
+# Jetons = tâches en cours + tâches en attente. Sans jeton disponible, on
+# refuse vite (503) au lieu d'empiler des requêtes qui expireront de toute façon.
+_slots = threading.BoundedSemaphore(HASH_WORKERS + HASH_MAX_PENDING)
+_busy = 0               # jetons pris, compté ici (pas d'attribut privé du sémaphore)
+_busy_lock = threading.Lock()
+# Le process de l'API a déjà des threads : un fork pourrait copier un verrou
+# tenu. forkserver (spawn s'il n'existe pas) démarre les process du pool à neuf.
+_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(
+                    max_workers=HASH_WORKERS, mp_context=multiprocessing.get_context(_START_METHOD)
+                )
+    return _executor
+
+
+def _run(fn, *args):
+    global _busy
+    waited = time.perf_counter()
+    acquired = _slots.acquire(timeout=HASH_QUEUE_TIMEOUT_SECONDS)
+    current_span().set("hash.slot_wait_ms", round((time.perf_counter() - waited) * 1000, 3))
+    if not acquired:
+        raise HTTPException(
+            status_code=503,
+            detail="Service d'authentification saturé, réessayez",
+            headers={"Retry-After": "1"},
+        )
+    with _busy_lock:
+        _busy += 1
+    try:
+        return _get_executor().submit(fn, *args).result()
+    finally:
+        with _busy_lock:
+            _busy -= 1
+        _slots.release()
+
+
+@traced("password.hash", {"bcrypt.rounds": BCRYPT_ROUNDS})
+def hash_password(password: str) -> str:
+    return _run(_hash, password)
+
+
+@traced("password.verify", {"bcrypt.rounds": BCRYPT_ROUNDS})
+def verify_and_update(password: str, hashed: str) -> tuple[bool, str | None]:
+    """Retourne (valide, nouveau_hash) ; nouveau_hash est non nul si le coût a changé."""
+    return _run(_verify_and_update, password, hashed)
+
+
+def stats() -> dict:
+    capacity = HASH_WORKERS + HASH_MAX_PENDING
+    return {"capacity": capacity, "busy": _busy}
+
+
+registry.register_gauges(lambda: [
+    ("facilite_hash_pool_busy", {}, stats()["busy"]),
+    ("facilite_hash_pool_capacity", {}, stats()["capacity"]),
+])
+
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,201 @@
+# utils/qr_storage.py
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_, update
+
+from backend_facilite.database import SessionLocal
+from backend_facilite.models import Payment
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# Stockage disque optionnel des QR
+# ==========================
+# Désactivé par défaut (rendu en mémoire). Avec QR_STORAGE_DIR, les images
+# rendues sont aussi posées sur disque pour être partagées entre workers d'un
+# même hôte, dans une arborescence hachée : <dir>/ab/cd/<tx_code>.<fmt>.
+# 65 536 répertoires feuilles : chacun reste petit même avec des millions de QR.
+QR_STORAGE_DIR = os.getenv("QR_STORAGE_DIR") or None
+QR_RETENTION = timedelta(days=int(os.getenv("QR_RETENTION_DAYS", "30")))
+SWEEP_INTERVAL_SECONDS = int(os.getenv("QR_SWEEP_INTERVAL_SECONDS", "300"))
+SWEEP_BATCH_SIZE = 500
+# Balayeur dans le process de l'API (0 si `python -m backend_facilite.worker` le fait
+# tourner) ; dans tous les cas un seul process par répertoire balaie (verrou fichier).
+QR_SWEEPER_IN_APP = os.getenv("QR_SWEEPER_IN_APP", "1") == "1"
+
+
+def shard_path(tx_code: str, fmt: str, root: str | None = None) -> str:
+    digest = hashlib.sha1(tx_code.encode()).hexdigest()
+    return os.path.join(root or QR_STORAGE_DIR, digest[:2], digest[2:4], f"{tx_code}.{fmt}")
+
+
+def read(tx_code: str, fmt: str) -> bytes | None:
+    try:
+        with open(shard_path(tx_code, fmt), "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def write(tx_code: str, fmt: str, data: bytes) -> None:
+    """Écriture atomique (fichier temporaire + rename) : pas de lecture d'image tronquée."""
+    path = shard_path(tx_code, fmt)
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def remove(tx_code: str, formats) -> None:
+    for fmt in formats:
+        try:
+            os.unlink(shard_path(tx_code, fmt))
+        except FileNotFoundError:
+            pass
+
+
+# ==========================
+# Balayeur en arrière-plan
+# ==========================
+class QRSweeper:
+    """
+    Supprime par lots les QR des paiements utilisés, expirés ou inconnus, ainsi
+    que les anciens fichiers "à plat" encore référencés par Payment.qr_path.
+    """
+
+    def __init__(self, root: str | None = QR_STORAGE_DIR, interval: int = SWEEP_INTERVAL_SECONDS):
+        self.root = root
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock_file = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="qr-sweeper", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            # Les autres process retentent à chaque intervalle : l'un d'eux prend
+            # la relève si le balayeur en place meurt
+            if not self._acquire():
+                continue
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Balayage des QR interrompu")
+
+    def _acquire(self) -> bool:
+        """Verrou exclusif gardé à vie : un seul balayeur par répertoire, quel que soit le nombre de process."""
+        if self._lock_file is not None or not self.root:
+            return True
+        try:
+            import fcntl
+        except ImportError:  # pas de flock (Windows) : chaque process balaie
+            return True
+        os.makedirs(self.root, exist_ok=True)
+        handle = open(os.path.join(self.root, ".sweeper.lock"), "a")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self._lock_file = handle
+        return True
+
+    def sweep(self) -> int:
+        removed = self._sweep_legacy_files()
+        if self.root and os.path.isdir(self.root):
+            removed += self._sweep_shards()
+        return removed
+
+    def _sweep_shards(self) -> int:
+        removed = 0
+        cutoff = datetime.utcnow() - QR_RETENTION
+        # Lots de SWEEP_BATCH_SIZE fichiers à cheval sur les feuilles : une requête
+        # par lot, pas une par répertoire (65 536 feuilles, quelques fichiers chacune)
+        pending = []
+        for top in os.scandir(self.root):
+            if not top.is_dir():
+                continue
+            for leaf in os.scandir(top.path):
+                if not leaf.is_dir():
+                    continue
+                # les .tmp sont des écritures en cours : on n'y touche pas
+                pending.extend(e for e in os.scandir(leaf.path) if e.is_file() and not e.name.endswith(".tmp"))
+                while len(pending) >= SWEEP_BATCH_SIZE:
+                    removed += self._sweep_batch(pending[:SWEEP_BATCH_SIZE], cutoff)
+                    del pending[:SWEEP_BATCH_SIZE]
+        if pending:
+            removed += self._sweep_batch(pending, cutoff)
+        return removed
+
+    def _sweep_batch(self, entries, cutoff: datetime) -> int:
+        codes = {entry.name.rsplit(".", 1)[0] for entry in entries}
+        db = SessionLocal()
+        try:
+            keep = {
+                code for (code,) in db.query(Payment.transaction_code).filter(
+                    Payment.transaction_code.in_(codes),
+                    Payment.is_used.is_(False),
+                    Payment.created_at >= cutoff,
+                )
+            }
+        finally:
+            db.close()
+
+        removed = 0
+        for entry in entries:
+            if entry.name.rsplit(".", 1)[0] not in keep:
+                try:
+                    os.unlink(entry.path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+    def _sweep_legacy_files(self) -> int:
+        """Fichiers static/qrcodes/<tx>.png écrits avant le rendu en mémoire."""
+        removed = 0
+        cutoff = datetime.utcnow() - QR_RETENTION
+        db = SessionLocal()
+        try:
+            while True:
+                rows = db.query(Payment.id, Payment.qr_path).filter(
+                    Payment.qr_path.isnot(None),
+                    or_(Payment.is_used.is_(True), Payment.created_at < cutoff),
+                ).limit(SWEEP_BATCH_SIZE).all()
+                if not rows:
+                    return removed
+                for _, path in rows:
+                    try:
+                        os.unlink(path)
+                        removed += 1
+                    except (FileNotFoundError, IsADirectoryError):
+                        pass
+                db.execute(
+                    update(Payment)
+                    .where(Payment.id.in_([payment_id for payment_id, _ in rows]))
+                    .values(qr_path=None)
+                )
+                db.commit()
+        finally:
+            db.close()
+
+
+sweeper = QRSweeper()
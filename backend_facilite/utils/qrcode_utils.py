@@ -1,18 +1,158 @@
 # utils/qrcode_utils.py
-import os, json, qrcode
-from datetime import datetime
+import io, json
+from concurrent.futures import ThreadPoolExecutor
 
-QR_DIR = os.path.join("static", "qrcodes")
-os.makedirs(QR_DIR, exist_ok=True)
+from backend_facilite.utils import jobs, qr_storage
+from backend_facilite.utils.cache import MemoryLRUCache
+from backend_facilite.utils.ids import new_transaction_code
+from backend_facilite.utils.metrics import register_cache, registry
+from backend_facilite.utils.tracing import span
+
+QR_CACHE_TTL_SECONDS = 24 * 3600
+QR_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+QR_FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
 
 def ensure_tx_code(prefix="TXN"):
-    # ex: TXN-20250912-1694549012
-    return f"{prefix}-{int(datetime.utcnow().timestamp())}"
-
-def generate_qr_png(data: dict, filename: str) -> str:
-    """Génère un QR PNG depuis un dict, retourne le chemin relatif."""
-    payload = json.dumps(data, separators=(",", ":"))
-    img = qrcode.make(payload)
-    path = os.path.join(QR_DIR, filename)
-    img.save(path)
-    return path  # ex: static/qrcodes/xxx.png
+    # ex: TXN-0CJ8Z3K4W00G2 (triable par date, unique entre process)
+    return new_transaction_code(prefix)
+
+
+# ==========================
+# Rendu en mémoire (+ copie disque partagée si QR_STORAGE_DIR est défini)
+# ==========================
+_rendered = MemoryLRUCache(max_entries=4096, max_bytes=QR_CACHE_MAX_BYTES)
+_render_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="qr-render")
+register_cache("qr", _rendered)
+registry.register_gauges(lambda: [("facilite_qr_render_queue", {}, _render_pool._work_queue.qsize())])
+
+def qr_payload(payment) -> dict:
+    """Contenu du QR, dérivé uniquement de la ligne Payment (rendu reproductible)."""
+    return {
+        "transaction_code": payment.transaction_code,
+        "user_id": payment.user_id,
+        "order_id": payment.order_id,
+        "reservation_id": payment.reservation_id,
+        "ts": int(payment.created_at.timestamp()) if payment.created_at else None,
+    }
+
+def _encode(data: dict) -> str:
+    return json.dumps(data, separators=(",", ":"))
+
+def render_qr_png(data: dict) -> bytes:
+    import qrcode  # qrcode + PIL : chargés au premier rendu, pas au démarrage
+
+    buffer = io.BytesIO()
+    qrcode.make(_encode(data)).save(buffer)
+    return buffer.getvalue()
+
+def render_qr_svg(data: dict) -> bytes:
+    """SVG compact : un seul <path>, un segment par suite de modules noirs."""
+    import qrcode
+
+    qr = qrcode.QRCode(border=4)
+    qr.add_data(_encode(data))
+    qr.make(fit=True)
+    matrix = qr.get_matrix()
+    size = len(matrix)
+
+    segments = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < size:
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < size and row[x]:
+                x += 1
+            segments.append(f"M{start} {y}h{x - start}v1h-{x - start}z")
+
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" '
+        f'shape-rendering="crispEdges"><rect width="{size}" height="{size}" fill="#fff"/>'
+        f'<path d="{"".join(segments)}"/></svg>'
+    ).encode()
+
+_RENDERERS = {"png": render_qr_png, "svg": render_qr_svg}
+
+def cached_qr(tx_code: str, fmt: str = "png") -> bytes | None:
+    key = f"{tx_code}.{fmt}"
+    image = _rendered.get(key)
+    if image is None and qr_storage.QR_STORAGE_DIR:
+        image = qr_storage.read(tx_code, fmt)
+        if image is not None:
+            _rendered.set(key, image, QR_CACHE_TTL_SECONDS)
+    return image
+
+def get_qr(data: dict, fmt: str = "png") -> bytes:
+    """Retourne l'image depuis le cache, ou la rend à la demande."""
+    tx_code = data["transaction_code"]
+    with span("qr.get", {"qr.format": fmt}) as qr_span:
+        image = cached_qr(tx_code, fmt)
+        qr_span.set("qr.cache_hit", image is not None)
+        if image is None:
+            with span("qr.render", {"qr.format": fmt}):
+                image = _RENDERERS[fmt](data)
+            qr_span.set("qr.bytes", len(image))
+            _rendered.set(f"{tx_code}.{fmt}", image, QR_CACHE_TTL_SECONDS)
+            if qr_storage.QR_STORAGE_DIR:
+                qr_storage.write(tx_code, fmt, image)
+    return image
+
+def enqueue_qr_render(db, data: dict) -> None:
+    """
+    Avec un stockage disque partagé : pré-rendu du PNG en tâche durable (n'importe
+    quel worker peut la faire), commitée avec le paiement. Sinon : prerender_qr.
+    """
+    if qr_storage.QR_STORAGE_DIR:
+        jobs.enqueue(db, "qr.render", {"data": data, "fmt": "png"}, priority=jobs.PRIORITY_LOW)
+
+def prerender_qr(data: dict) -> None:
+    """
+    Sans stockage disque : pré-rendu dans ce process pour que le premier GET soit
+    servi du cache. À appeler après le commit : un paiement annulé n'est pas rendu.
+    """
+    if not qr_storage.QR_STORAGE_DIR:
+        _render_pool.submit(get_qr, data, "png")
+
+def forget_qr(tx_code: str) -> None:
+    """Oublie le QR dans le cache de ce process (les fichiers : schedule_qr_removal)."""
+    _rendered.delete(*(f"{tx_code}.{fmt}" for fmt in QR_FORMATS))
+
+def schedule_qr_removal(db, tx_codes: list[str]) -> None:
+    """Suppression disque des QR consommés, hors de la requête (commitée avec l'appelant)."""
+    if qr_storage.QR_STORAGE_DIR and tx_codes:
+        jobs.enqueue(db, "qr.remove_files", {"tx_codes": tx_codes}, priority=jobs.PRIORITY_LOW)
+
+
+@jobs.handler("qr.render", max_attempts=3)
+def _render_job(data: dict, fmt: str = "png") -> None:
+    get_qr(data, fmt)
+
+
+@jobs.handler("qr.remove_files")
+def _remove_files_job(tx_codes: list[str]) -> None:
+    for tx_code in tx_codes:
+        qr_storage.remove(tx_code, QR_FORMATS)
+
+def negotiate_qr_format(accept: str | None, requested: str | None = None) -> str:
+    """Choisit png ou svg : paramètre ?format= explicite, sinon en-tête Accept (q-values)."""
+    if requested in QR_FORMATS:
+        return requested
+    best, best_q = "png", 0.0
+    for part in (accept or "").split(","):
+        media, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        for fmt, media_type in QR_FORMATS.items():
+            # à égalité de q, le premier type listé l'emporte
+            if media.strip() == media_type and q > best_q:
+                best, best_q = fmt, q
+    return best
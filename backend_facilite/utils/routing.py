@@ -0,0 +1,159 @@
+# utils/routing.py
+import os
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from backend_facilite.utils.dispatch import distance_matrix
+
+# ==========================
+# Configuration
+# ==========================
+ROUTE_SPEED_KMH = float(os.getenv("ROUTE_SPEED_KMH", "20"))
+# Distance routière / distance à vol d'oiseau, en ville
+ROUTE_DETOUR_FACTOR = float(os.getenv("ROUTE_DETOUR_FACTOR", "1.3"))
+ROUTE_PICKUP_MINUTES = float(os.getenv("ROUTE_PICKUP_MINUTES", "3"))
+ROUTE_DROPOFF_MINUTES = float(os.getenv("ROUTE_DROPOFF_MINUTES", "2"))
+# Départs aléatoires en plus du plus proche voisin : la recherche locale s'y bloque parfois
+ROUTE_RESTARTS = int(os.getenv("ROUTE_RESTARTS", "8"))
+ROUTE_MAX_PASSES = 50
+
+
+@dataclass(frozen=True)
+class RouteOrder:
+    order_id: int
+    dropoff: tuple[float, float]
+    pickup: tuple[float, float] | None = None     # None : déjà récupérée
+
+
+@dataclass(frozen=True)
+class Stop:
+    kind: str               # "pickup" | "dropoff"
+    order_id: int
+    latitude: float
+    longitude: float
+    leg_km: float = 0.0
+    eta: datetime | None = None
+
+
+def plan_route(start: tuple[float, float], orders: list[RouteOrder]) -> list[Stop]:
+    """
+    Ordre de passage pour une tournée multi-commandes (chemin ouvert depuis
+    `start`) : plus proche voisin puis 2-opt et déplacements de points, chaque
+    récupération restant avant la remise de sa commande, relancé depuis
+    quelques ordres aléatoires (graine fixe : même entrée, même tournée).
+    Heuristique : pas de garantie d'optimalité, quelques ms pour une quinzaine
+    d'arrêts.
+    """
+    stops: list[Stop] = []
+    pickup_of: dict[int, int] = {}    # nœud de remise -> nœud de récupération (nœud 0 = départ)
+    for order in orders:
+        if order.pickup is not None:
+            stops.append(Stop("pickup", order.order_id, *order.pickup))
+        stops.append(Stop("dropoff", order.order_id, *order.dropoff))
+        if order.pickup is not None:
+            pickup_of[len(stops)] = len(stops) - 1
+    if not stops:
+        return []
+
+    points = [start] + [(s.latitude, s.longitude) for s in stops]
+    dist = distance_matrix(points, points).tolist()   # accès scalaires : listes plus rapides que ndarray
+    rng = random.Random(0)
+    path = min(
+        (
+            _improve(dist, _nearest_neighbour(dist, len(stops), pickup_of, rng if attempt else None), pickup_of)
+            for attempt in range(ROUTE_RESTARTS + 1)
+        ),
+        key=lambda candidate: _length(dist, candidate),
+    )
+
+    return [
+        Stop(s.kind, s.order_id, s.latitude, s.longitude, leg_km=dist[prev][node])
+        for prev, node, s in ((path[k - 1], path[k], stops[path[k] - 1]) for k in range(1, len(path)))
+    ]
+
+
+def schedule(stops: list[Stop], departure: datetime | None = None, speed_kmh: float = ROUTE_SPEED_KMH) -> list[Stop]:
+    """Heures d'arrivée estimées : trajets au facteur de détour, plus le temps passé à chaque arrêt."""
+    clock = departure or datetime.utcnow()
+    timed = []
+    for stop in stops:
+        clock += timedelta(hours=stop.leg_km * ROUTE_DETOUR_FACTOR / speed_kmh)
+        timed.append(Stop(stop.kind, stop.order_id, stop.latitude, stop.longitude, stop.leg_km, clock))
+        clock += timedelta(minutes=ROUTE_PICKUP_MINUTES if stop.kind == "pickup" else ROUTE_DROPOFF_MINUTES)
+    return timed
+
+
+def route_length(start: tuple[float, float], stops: list[Stop]) -> float:
+    """Longueur à vol d'oiseau (km) d'une suite d'arrêts dans l'ordre donné."""
+    points = [start] + [(s.latitude, s.longitude) for s in stops]
+    dist = distance_matrix(points, points)
+    return float(sum(dist[k - 1, k] for k in range(1, len(points))))
+
+
+# ==========================
+# Heuristiques (chemins de nœuds, 0 = départ)
+# ==========================
+def _length(dist: list[list[float]], path: list[int]) -> float:
+    return sum(dist[path[k - 1]][path[k]] for k in range(1, len(path)))
+
+
+def _nearest_neighbour(dist: list[list[float]], n: int, pickup_of: dict[int, int],
+                       rng: random.Random | None = None) -> list[int]:
+    """Plus proche arrêt permis à chaque pas ; avec `rng`, un arrêt permis au hasard."""
+    path, visited = [0], {0}
+    while len(path) <= n:
+        allowed = [node for node in range(1, n + 1) if node not in visited and pickup_of.get(node, 0) in visited]
+        nxt = rng.choice(allowed) if rng is not None else min(allowed, key=dist[path[-1]].__getitem__)
+        path.append(nxt)
+        visited.add(nxt)
+    return path
+
+
+def _feasible(path: list[int], pickup_of: dict[int, int]) -> bool:
+    position = {node: k for k, node in enumerate(path)}
+    return all(position[pickup] < position[dropoff] for dropoff, pickup in pickup_of.items())
+
+
+def _improve(dist: list[list[float]], path: list[int], pickup_of: dict[int, int]) -> list[int]:
+    last = len(path) - 1
+    for _ in range(ROUTE_MAX_PASSES):
+        improved = False
+
+        # 2-opt : inverser path[i..j] ; le chemin est ouvert, pas d'arête après le dernier arrêt
+        for i in range(1, last):
+            for j in range(i + 1, last + 1):
+                a, b, c = path[i - 1], path[i], path[j]
+                delta = dist[a][c] - dist[a][b]
+                if j < last:
+                    d = path[j + 1]
+                    delta += dist[b][d] - dist[c][d]
+                if delta < -1e-9:
+                    segment = set(path[i:j + 1])
+                    # Une commande entière dans le segment : l'inverser mettrait la remise en premier
+                    if not any(pickup_of.get(node) in segment for node in segment):
+                        path[i:j + 1] = path[i:j + 1][::-1]
+                        improved = True
+
+        # Déplacement d'un arrêt (or-opt 1) : débloque ce que 2-opt ne peut pas inverser
+        for i in range(1, last + 1):
+            node, prev = path[i], path[i - 1]
+            after = path[i + 1] if i < last else None
+            removal = -dist[prev][node] - (dist[node][after] - dist[prev][after] if after is not None else 0.0)
+            rest = path[:i] + path[i + 1:]
+            for k in range(len(rest)):
+                if k == i - 1:
+                    continue
+                u = rest[k]
+                v = rest[k + 1] if k + 1 < len(rest) else None
+                insertion = dist[u][node] + (dist[node][v] - dist[u][v] if v is not None else 0.0)
+                if removal + insertion < -1e-9:
+                    candidate = rest[:k + 1] + [node] + rest[k + 1:]
+                    if _feasible(candidate, pickup_of):
+                        path = candidate
+                        improved = True
+                        break
+
+        if not improved:
+            break
+    return path
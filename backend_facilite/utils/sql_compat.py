@@ -0,0 +1,45 @@
+# backend_facilite/utils/sql_compat.py
+"""
+Fonctions SQL propres à un dialecte, derrière une expression portable.
+
+PostgreSQL reste la cible ; SQLite sert aux benchs et aux runs hermétiques.
+"""
+from sqlalchemy import DateTime
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.sql.visitors import InternalTraversal
+
+# strftime SQLite équivalent à date_trunc PostgreSQL, par unité
+_SQLITE_TRUNC_FORMATS = {
+    "year": "%Y-01-01 00:00:00",
+    "month": "%Y-%m-01 00:00:00",
+    "day": "%Y-%m-%d 00:00:00",
+    "hour": "%Y-%m-%d %H:00:00",
+    "minute": "%Y-%m-%d %H:%M:00",
+}
+
+
+class date_trunc(FunctionElement):
+    """date_trunc(unit, colonne) -> DateTime, quel que soit le dialecte."""
+    type = DateTime()
+    inherit_cache = True
+    name = "date_trunc"
+    # L'unité fait partie de la clé du cache de compilation
+    _traverse_internals = FunctionElement._traverse_internals + [("unit", InternalTraversal.dp_string)]
+
+    def __init__(self, unit: str, expr):
+        if unit not in _SQLITE_TRUNC_FORMATS:
+            raise ValueError(f"Unité non supportée : {unit}")
+        self.unit = unit
+        super().__init__(expr)
+
+
+@compiles(date_trunc)
+def _date_trunc_default(element, compiler, **kw):
+    return f"date_trunc('{element.unit}', {compiler.process(element.clauses, **kw)})"
+
+
+@compiles(date_trunc, "sqlite")
+def _date_trunc_sqlite(element, compiler, **kw):
+    # Texte ISO relu en datetime par le type DateTime du dialecte SQLite
+    return f"strftime('{_SQLITE_TRUNC_FORMATS[element.unit]}', {compiler.process(element.clauses, **kw)})"
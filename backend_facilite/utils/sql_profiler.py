@@ -0,0 +1,148 @@
+# utils/sql_profiler.py
+import hashlib
+import logging
+import os
+import re
+from contextvars import ContextVar
+from functools import lru_cache
+
+from backend_facilite.utils.metrics import observe_queries, registry, route_template
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# Configuration
+# ==========================
+# Désactivé par défaut : empreinte de chaque requête SQL, à activer pour diagnostiquer
+SQL_PROFILER = os.getenv("SQL_PROFILER", "0") == "1"
+SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "200"))
+# Même empreinte SELECT répétée au moins N fois dans une requête => N+1 probable
+N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "5"))
+# En-têtes X-DB-Queries / X-DB-Time sur chaque réponse (jamais en production)
+DEBUG = os.getenv("DEBUG", "").lower() in ("1", "true", "yes")
+
+
+# ==========================
+# Empreinte des requêtes
+# ==========================
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAM = re.compile(r"%\([^)]+\)s|%s|\?")
+# IN (?, ?, ?) de taille variable ("expanding" SQLAlchemy) => IN (?)
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(statement: str) -> tuple[str, str]:
+    """
+    Normalise une requête (littéraux et paramètres -> ?, listes IN repliées)
+    et retourne (empreinte courte, requête normalisée).
+    """
+    normalized = _STRING.sub("?", statement)
+    normalized = _PARAM.sub("?", normalized)
+    normalized = _NUMBER.sub("?", normalized)
+    normalized = _IN_LIST.sub("(?)", normalized)
+    normalized = _SPACES.sub(" ", normalized).strip()
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12], normalized
+
+
+# ==========================
+# Profil d'une requête HTTP
+# ==========================
+class RequestProfile:
+    __slots__ = ("statements", "seconds")
+
+    def __init__(self):
+        # (empreinte, requête normalisée, durée en secondes)
+        self.statements: list[tuple[str, str, float]] = []
+        self.seconds = 0.0
+
+    def record(self, statement: str, elapsed: float) -> None:
+        digest, normalized = fingerprint(statement)
+        self.statements.append((digest, normalized, elapsed))
+        self.seconds += elapsed
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> list[tuple[str, str, int, float]]:
+        """SELECT répétés au moins `threshold` fois : (empreinte, requête, nombre, temps total)."""
+        groups: dict[str, list] = {}
+        for digest, normalized, elapsed in self.statements:
+            group = groups.get(digest)
+            if group is None:
+                groups[digest] = [normalized, 1, elapsed]
+            else:
+                group[1] += 1
+                group[2] += elapsed
+        return [
+            (digest, normalized, count, total)
+            for digest, (normalized, count, total) in groups.items()
+            if count >= threshold and normalized[:6].upper() == "SELECT"
+        ]
+
+
+current_profile: ContextVar[RequestProfile | None] = ContextVar("current_profile", default=None)
+
+
+def _observe(statement: str, elapsed: float) -> None:
+    profile = current_profile.get()
+    if profile is not None:
+        profile.record(statement, elapsed)
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        digest, normalized = fingerprint(statement)
+        registry.inc("facilite_db_slow_queries_total")
+        logger.warning("Requête SQL lente (%.1f ms) [%s] %s", elapsed * 1000, digest, normalized)
+
+
+def profile_engine(engine) -> None:
+    """Branche le profileur sur le chronométrage de metrics.instrument_engine (à appeler aussi)."""
+    if SQL_PROFILER:
+        observe_queries(_observe)
+
+
+# ==========================
+# Middleware
+# ==========================
+class SQLProfilerMiddleware:
+    """
+    Middleware ASGI : collecte les requêtes SQL émises pendant chaque requête
+    HTTP et signale les N+1 (même SELECT répété, typiquement un lazy load dans
+    une boucle). En mode DEBUG, ajoute X-DB-Queries et X-DB-Time à la réponse.
+    """
+
+    def __init__(self, app, debug: bool = DEBUG, threshold: int = N_PLUS_ONE_THRESHOLD):
+        self.app = app
+        self.debug = debug
+        self.threshold = threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not SQL_PROFILER:
+            return await self.app(scope, receive, send)
+
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+
+        async def send_wrapper(message):
+            if self.debug and message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-db-queries", str(len(profile.statements)).encode()),
+                    (b"x-db-time", f"{profile.seconds * 1000:.1f}ms".encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_profile.reset(token)
+            self._report(scope, profile)
+
+    def _report(self, scope, profile: RequestProfile) -> None:
+        repeated = profile.repeated(self.threshold)
+        if not repeated:
+            return
+        route = route_template(scope)
+        for digest, normalized, count, total in repeated:
+            registry.inc("facilite_db_n_plus_one_total", (("route", route),))
+            logger.warning(
+                "N+1 probable sur %s %s : %d x [%s] (%.1f ms au total) %s",
+                scope["method"], route, count, digest, total * 1000, normalized,
+            )
@@ -0,0 +1,469 @@
+# utils/tracing.py
+import functools
+import importlib
+import ipaddress
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+from backend_facilite.utils.metrics import registry, route_template
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# Configuration
+# ==========================
+# none (défaut, aucun coût) | file | otlp | module:Classe (exporteur maison)
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none")
+# Part des requêtes tracées quand l'appelant n'a pas déjà décidé (traceparent)
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+# Pairs (IP ou CIDR, séparés par des virgules : passerelle, services internes) dont
+# la décision d'échantillonnage du traceparent est suivie telle quelle
+TRACE_TRUSTED_UPSTREAMS = os.getenv("TRACE_TRUSTED_UPSTREAMS", "127.0.0.1,::1")
+# Traces forcées (sampled=1) acceptées par seconde venant des autres appelants :
+# au-delà, le drapeau est ignoré, un client ne fait pas tracer toutes ses requêtes
+TRACE_UNTRUSTED_FORCED_PER_SECOND = float(os.getenv("TRACE_UNTRUSTED_FORCED_PER_SECOND", "1"))
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "backend_facilite")
+# Borne mémoire : une boucle N+1 ne doit pas produire une trace de 10 000 spans
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "512"))
+TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", "1000"))  # traces en attente d'export
+TRACE_FLUSH_SECONDS = float(os.getenv("TRACE_FLUSH_SECONDS", "2"))
+TRACE_BATCH_SIZE = int(os.getenv("TRACE_BATCH_SIZE", "200"))    # traces par appel à l'exporteur
+
+
+# ==========================
+# Spans
+# ==========================
+class Trace:
+    __slots__ = ("trace_id", "spans", "dropped")
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans: list["Span"] = []
+        self.dropped = 0
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns",
+                 "attributes", "error", "_token")
+
+    def __init__(self, trace: Trace, name: str, parent_id: str | None, attributes: dict | None = None,
+                 kind: str = "internal"):
+        self.trace = trace
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = dict(attributes) if attributes else {}
+        self.error: str | None = None
+        self._token = None
+
+    def set(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def finish(self) -> None:
+        self.end_ns = time.time_ns()
+        trace = self.trace
+        if len(trace.spans) < TRACE_MAX_SPANS:
+            trace.spans.append(self)
+        else:
+            trace.dropped += 1
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        self.finish()
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """Retourné quand la requête n'est pas échantillonnée : aucune allocation, aucun enregistrement."""
+    __slots__ = ()
+
+    def set(self, key, value) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return None
+
+
+NOOP_SPAN = _NoopSpan()
+
+# Span actif ; les handlers synchrones héritent d'une copie du contexte dans le threadpool
+_current: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def current_span():
+    return _current.get() or NOOP_SPAN
+
+
+def span(name: str, attributes: dict | None = None):
+    """Span enfant du span actif ; no-op hors d'une requête échantillonnée."""
+    parent = _current.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(parent.trace, name, parent.span_id, attributes)
+
+
+def traced(name: str, attributes: dict | None = None):
+    """Décorateur : exécute la fonction dans un span `name` (signature conservée pour FastAPI)."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return fn(*args, **kwargs)
+            with span(name, attributes):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ==========================
+# Exporteurs
+# ==========================
+class SpanExporter:
+    """Reçoit des lots de spans sérialisés (dicts), depuis le thread d'export uniquement."""
+
+    def export(self, spans: list[dict]) -> None:
+        raise NotImplementedError
+
+    def shutdown(self) -> None:
+        pass
+
+
+class FileExporter(SpanExporter):
+    """Un span JSON par ligne (jq, DuckDB, ou relecture par un collecteur)."""
+
+    def __init__(self, path: str = TRACE_FILE):
+        self.path = path
+        self._file = None
+
+    def export(self, spans: list[dict]) -> None:
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write("".join(json.dumps(s, ensure_ascii=False, default=str) + "\n" for s in spans))
+        self._file.flush()
+
+    def shutdown(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+_OTLP_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+
+class OTLPHttpExporter(SpanExporter):
+    """OTLP/HTTP en JSON (collecteur OpenTelemetry, Jaeger, Tempo...), sans dépendance OpenTelemetry."""
+
+    def __init__(self, endpoint: str = TRACE_OTLP_ENDPOINT, service_name: str = TRACE_SERVICE_NAME,
+                 timeout: float = 5.0):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+        self._client = None
+
+    def payload(self, spans: list[dict]) -> dict:
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{
+                "scope": {"name": "backend_facilite.tracing"},
+                "spans": [
+                    {
+                        "traceId": s["trace_id"],
+                        "spanId": s["span_id"],
+                        **({"parentSpanId": s["parent_id"]} if s["parent_id"] else {}),
+                        "name": s["name"],
+                        "kind": _OTLP_KINDS.get(s["kind"], 1),
+                        "startTimeUnixNano": str(s["start_ns"]),
+                        "endTimeUnixNano": str(s["end_ns"]),
+                        "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s["attributes"].items()],
+                        "status": {"code": 2, "message": s["error"]} if s["error"] else {"code": 0},
+                    }
+                    for s in spans
+                ],
+            }],
+        }]}
+
+    def export(self, spans: list[dict]) -> None:
+        import httpx
+
+        if self._client is None:
+            self._client = httpx.Client(timeout=self.timeout)
+        response = self._client.post(self.endpoint, json=self.payload(spans))
+        response.raise_for_status()
+
+    def shutdown(self) -> None:
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+def build_exporter(name: str = TRACE_EXPORTER) -> SpanExporter | None:
+    if name in ("", "none"):
+        return None
+    if name == "file":
+        return FileExporter()
+    if name == "otlp":
+        return OTLPHttpExporter()
+    module, _, attr = name.partition(":")
+    return getattr(importlib.import_module(module), attr)()
+
+
+# ==========================
+# Export en arrière-plan
+# ==========================
+class BatchProcessor:
+    """
+    File bornée + thread d'export : la requête ne fait qu'un put_nowait.
+    File pleine (exporteur lent ou en panne) => la trace est abandonnée et comptée.
+    """
+
+    def __init__(self, exporter: SpanExporter, max_queue: int = TRACE_QUEUE_SIZE):
+        self.exporter = exporter
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def submit(self, trace: Trace) -> None:
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            registry.inc("facilite_traces_dropped_total", (("reason", "queue_full"),))
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="trace-export", daemon=True)
+                self._thread.start()
+
+    def _loop(self) -> None:
+        while not self._stopping.is_set():
+            self.flush(wait=TRACE_FLUSH_SECONDS)
+
+    def flush(self, wait: float = 0.0) -> None:
+        traces = []
+        try:
+            traces.append(self._queue.get(timeout=wait) if wait else self._queue.get_nowait())
+            while len(traces) < TRACE_BATCH_SIZE:
+                traces.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        if not traces:
+            return
+        spans = [s.to_dict() for trace in traces for s in trace.spans]
+        try:
+            self.exporter.export(spans)
+            registry.inc("facilite_traces_exported_total", value=len(traces))
+        except Exception:
+            registry.inc("facilite_traces_dropped_total", (("reason", "export_error"),), len(traces))
+            logger.exception("Export des traces impossible (%d traces perdues)", len(traces))
+
+    def shutdown(self) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=TRACE_FLUSH_SECONDS + 1)
+        while not self._queue.empty():
+            self.flush()
+        self.exporter.shutdown()
+
+
+_processor: BatchProcessor | None = None
+
+
+def set_exporter(exporter: SpanExporter | None) -> None:
+    """Remplace l'exporteur (None désactive le traçage)."""
+    global _processor
+    if _processor is not None:
+        _processor.shutdown()
+    _processor = BatchProcessor(exporter) if exporter is not None else None
+
+
+def shutdown() -> None:
+    set_exporter(None)
+
+
+set_exporter(build_exporter())
+
+
+# ==========================
+# SQL
+# ==========================
+def trace_engine(engine) -> None:
+    """Un span feuille par requête SQL (texte normalisé : jamais de valeur de paramètre)."""
+    from backend_facilite.utils.sql_profiler import fingerprint
+
+    system = engine.dialect.name
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        parent = _current.get()
+        if parent is not None:
+            digest, normalized = fingerprint(statement)
+            context._trace_span = Span(parent.trace, "db.query", parent.span_id, {
+                "db.system": system,
+                "db.statement": normalized[:1000],
+                "db.fingerprint": digest,
+                "db.executemany": executemany,
+            }, kind="client")
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        sql_span = getattr(context, "_trace_span", None)
+        if sql_span is not None:
+            context._trace_span = None
+            sql_span.set("db.rows", cursor.rowcount)
+            sql_span.finish()
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        sql_span = getattr(exception_context.execution_context, "_trace_span", None)
+        if sql_span is not None:
+            exception_context.execution_context._trace_span = None
+            sql_span.error = type(exception_context.original_exception).__name__
+            sql_span.finish()
+
+
+# ==========================
+# Middleware
+# ==========================
+def _parse_traceparent(value: str) -> tuple[str, str, bool] | None:
+    # W3C : 00-<trace_id 32 hex>-<parent_id 16 hex>-<flags>
+    parts = value.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or len(parts[3]) != 2:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+        return parts[1], parts[2], bool(int(parts[3], 16) & 1)
+    except ValueError:
+        return None
+
+
+class TracingMiddleware:
+    """
+    Middleware ASGI : décide de l'échantillonnage (traceparent entrant d'un pair
+    de confiance ou, à débit borné, d'un autre appelant ; sinon TRACE_SAMPLE_RATE),
+    ouvre le span racine de la requête et confie la trace
+    au thread d'export. Ajoute `traceparent` à la réponse des requêtes tracées.
+    """
+
+    def __init__(self, app, sample_rate: float = TRACE_SAMPLE_RATE,
+                 trusted_upstreams: str = TRACE_TRUSTED_UPSTREAMS,
+                 untrusted_forced_per_second: float = TRACE_UNTRUSTED_FORCED_PER_SECOND):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.trusted = [ipaddress.ip_network(n.strip(), strict=False) for n in trusted_upstreams.split(",") if n.strip()]
+        # Seau de jetons des traces forcées par des appelants non fiables (boucle asyncio : pas de verrou)
+        self.forced_rate = untrusted_forced_per_second
+        self._forced_tokens = max(1.0, untrusted_forced_per_second)
+        self._forced_at = time.monotonic()
+
+    def _is_trusted(self, scope) -> bool:
+        client = scope.get("client")
+        try:
+            address = ipaddress.ip_address(client[0]) if client else None
+        except ValueError:
+            return False
+        return address is not None and any(address in network for network in self.trusted)
+
+    def _take_forced(self) -> bool:
+        now = time.monotonic()
+        burst = max(1.0, self.forced_rate)
+        self._forced_tokens = min(burst, self._forced_tokens + (now - self._forced_at) * self.forced_rate)
+        self._forced_at = now
+        if self._forced_tokens < 1:
+            return False
+        self._forced_tokens -= 1
+        return True
+
+    async def __call__(self, scope, receive, send):
+        processor = _processor
+        if scope["type"] != "http" or processor is None:
+            return await self.app(scope, receive, send)
+
+        trace_id = parent_id = None
+        sampled = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                parsed = _parse_traceparent(value.decode("latin-1"))
+                if parsed:
+                    trace_id, parent_id, sampled = parsed
+                break
+        if sampled is not None and not self._is_trusted(scope):
+            # Appelant externe : son sampled=1 est suivi dans la limite du débit, son
+            # sampled=0 n'empêche pas l'échantillonnage local
+            sampled = True if sampled and self._take_forced() else None
+        if sampled is None:
+            sampled = random.random() < self.sample_rate
+        if not sampled:
+            return await self.app(scope, receive, send)
+
+        trace = Trace(trace_id or f"{random.getrandbits(128):032x}")
+        root = Span(trace, f"{scope['method']} {scope['path']}", parent_id, {
+            "http.method": scope["method"],
+            "http.target": scope["path"],
+        }, kind="server")
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                root.set("http.status_code", message["status"])
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"traceparent", f"00-{trace.trace_id}-{root.span_id}-01".encode()),
+                ]
+            await send(message)
+
+        try:
+            with root:
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            route = route_template(scope)
+            root.name = f"{scope['method']} {route}"
+            root.set("http.route", route)
+            if trace.dropped:
+                root.set("trace.dropped_spans", trace.dropped)
+            processor.submit(trace)
@@ -0,0 +1,150 @@
+# backend_facilite/worker.py
+"""
+Workers de la file de tâches (table `jobs`), sans broker externe.
+
+    python -m backend_facilite.worker --processes 4 --threads 2
+    python -m backend_facilite.worker --kinds mobile_money.initiate
+    python -m backend_facilite.worker stats
+    python -m backend_facilite.worker retry-dead --kind qr.render
+
+Lancer au moins un worker à part et mettre JOB_WORKERS_IN_APP=0 côté API en
+production ; en local, l'API fait tourner ses propres threads worker. Le
+superviseur fait aussi tourner le balayeur des QR sur disque (QR_SWEEPER_IN_APP=0
+côté API sur le même hôte).
+"""
+import argparse
+import logging
+import multiprocessing
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import func, update
+
+from backend_facilite.database import SessionLocal
+from backend_facilite.models import Job
+from backend_facilite.utils import jobs
+from backend_facilite.utils.qr_storage import sweeper as qr_sweeper
+
+logger = logging.getLogger("backend_facilite.worker")
+
+RESTART_DELAY_SECONDS = 1.0
+
+
+def _serve(threads: int, kinds: list[str] | None) -> None:
+    """Corps d'un process worker : `threads` boucles de consommation jusqu'à SIGTERM/SIGINT."""
+    jobs.load_handlers()
+    stop = threading.Event()
+
+    def _graceful(signum, frame):
+        # La tâche en cours se termine ; aucune nouvelle n'est prise
+        stop.set()
+        jobs._wake.set()
+
+    signal.signal(signal.SIGTERM, _graceful)
+    signal.signal(signal.SIGINT, _graceful)
+
+    workers = [jobs.Worker(kinds=kinds, stop=stop) for _ in range(threads)]
+    pool = [threading.Thread(target=w.run, name=f"job-worker-{i}") for i, w in enumerate(workers)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    jobs.async_runner.stop()
+
+
+def cmd_run(args) -> None:
+    kinds = args.kinds.split(",") if args.kinds else None
+    if args.processes == 1:
+        qr_sweeper.start()
+        _serve(args.threads, kinds)
+        qr_sweeper.stop()
+        return
+
+    stopping = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for process in processes:
+            if process.is_alive():
+                process.terminate()   # SIGTERM : arrêt propre dans l'enfant
+
+    def _spawn():
+        process = multiprocessing.Process(target=_serve, args=(args.threads, kinds), daemon=False)
+        process.start()
+        return process
+
+    processes = [_spawn() for _ in range(args.processes)]
+    # Dans le superviseur seulement (après les forks) : un balayeur, pas un par enfant
+    qr_sweeper.start()
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    logger.info("%d process x %d threads", args.processes, args.threads)
+
+    # Supervision : un process mort (OOM, segfault d'une lib native) est relancé
+    while not stopping:
+        time.sleep(RESTART_DELAY_SECONDS)
+        for index, process in enumerate(processes):
+            if not process.is_alive() and not stopping:
+                logger.warning("Worker %d terminé (code %s), relance", process.pid, process.exitcode)
+                processes[index] = _spawn()
+    for process in processes:
+        process.join()
+    qr_sweeper.stop()
+
+
+def cmd_stats(args) -> None:
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(Job.kind, Job.status, func.count(Job.id), func.min(Job.run_at))
+            .group_by(Job.kind, Job.status)
+            .order_by(Job.kind, Job.status)
+            .all()
+        )
+    finally:
+        db.close()
+    print(f"{'type':<28}{'statut':<10}{'nombre':>8}  plus ancienne échéance")
+    for kind, status, count, oldest in rows:
+        print(f"{kind:<28}{status:<10}{count:>8}  {oldest:%Y-%m-%d %H:%M:%S}")
+
+
+def cmd_retry_dead(args) -> None:
+    """Remet en file les tâches en dead-letter (après correction de la cause)."""
+    db = SessionLocal()
+    try:
+        query = update(Job).where(Job.status == "dead")
+        if args.kind:
+            query = query.where(Job.kind == args.kind)
+        count = db.execute(query.values(
+            status="queued", attempts=0, run_at=datetime.utcnow(), finished_at=None, locked_by=None,
+        )).rowcount
+        db.commit()
+    finally:
+        db.close()
+    print(f"✅ {count} tâche(s) remise(s) en file", file=sys.stderr)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m backend_facilite.worker", description="Workers de tâches")
+    parser.add_argument("--processes", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--threads", type=int, default=2, help="boucles par process (tâches surtout I/O)")
+    parser.add_argument("--kinds", help="types de tâches à traiter, séparés par des virgules (défaut : tous)")
+    parser.set_defaults(func=cmd_run)
+    sub = parser.add_subparsers(dest="command")
+
+    sub.add_parser("stats", help="tâches par type et statut").set_defaults(func=cmd_stats)
+    p_retry = sub.add_parser("retry-dead", help="remet en file les tâches abandonnées")
+    p_retry.add_argument("--kind")
+    p_retry.set_defaults(func=cmd_retry_dead)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(processName)s %(levelname)s %(message)s")
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+# tests/conftest.py
+import os
+import tempfile
+
+# Base SQLite fichier (WAL) : les connexions concurrentes sont réelles, contrairement
+# à la base en mémoire qui partage une seule connexion. À poser avant tout import
+# de backend_facilite (le moteur est créé à l'import).
+_DB_DIR = tempfile.mkdtemp(prefix="facilite-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_DB_DIR, 'facilite.db')}")
+os.environ.setdefault("JOB_WORKERS_IN_APP", "0")
+
+import pytest  # noqa: E402
+
+from backend_facilite import database, models  # noqa: E402,F401
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    database.Base.metadata.create_all(database.engine)
+    yield
+    database.engine.dispose()
+
+
+@pytest.fixture
+def db():
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    from backend_facilite.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
@@ -0,0 +1,68 @@
+# tests/test_idempotency.py
+"""
+Une clé dont la requête est morte entre claim() et le commit ne bloque pas
+les retries au-delà du bail ; les clés échues sont purgées par la maintenance.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.orm.exc import StaleDataError
+
+from backend_facilite import database
+from backend_facilite.models import IdempotencyKey, RoleEnum, User
+from backend_facilite.utils import idempotency, jobs
+from backend_facilite.utils.ids import new_transaction_code
+
+
+@pytest.fixture
+def user_id(db) -> int:
+    user = User(name="client", phone_number=f"idem-{new_transaction_code()}", role=RoleEnum.client)
+    db.add(user)
+    db.commit()
+    return user.id
+
+
+def _age(db, user_id: int, key: str, **delta) -> None:
+    db.query(IdempotencyKey).filter(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key).update(
+        {IdempotencyKey.created_at: datetime.utcnow() - timedelta(**delta)}, synchronize_session=False
+    )
+    db.commit()
+
+
+def test_in_progress_key_conflicts_within_lease(db, user_id):
+    idempotency.claim(db, user_id, "k-busy", "h")
+    with pytest.raises(HTTPException) as exc:
+        idempotency.claim(db, user_id, "k-busy", "h")
+    assert exc.value.status_code == 409
+
+
+def test_stale_key_is_reclaimed_and_late_writer_loses(db, user_id):
+    stale, _ = idempotency.claim(db, user_id, "k-dead", "h")
+
+    other = database.SessionLocal()
+    try:
+        _age(other, user_id, "k-dead", seconds=idempotency.IDEMPOTENCY_LEASE.total_seconds() + 1)
+        record, stored = idempotency.claim(other, user_id, "k-dead", "h")
+        assert stored is None and record.id == stale.id
+    finally:
+        other.close()
+
+    # La requête d'origine se réveille : son écriture est annulée, pas doublée
+    idempotency.store_response(stale, {"ok": True})
+    with pytest.raises(StaleDataError):
+        db.commit()
+    # Son nettoyage d'échec ne libère pas la clé reprise
+    idempotency.release(db, stale)
+    assert db.query(IdempotencyKey).filter(IdempotencyKey.key == "k-dead").count() == 1
+
+
+def test_maintenance_purges_expired_keys(db, user_id):
+    idempotency.claim(db, user_id, "k-old", "h")
+    db.query(IdempotencyKey).filter(IdempotencyKey.key == "k-old").update(
+        {IdempotencyKey.expires_at: datetime.utcnow() - timedelta(seconds=1)}, synchronize_session=False
+    )
+    db.commit()
+
+    jobs.maintenance()
+    assert db.query(IdempotencyKey).filter(IdempotencyKey.key == "k-old").count() == 0
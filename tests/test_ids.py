@@ -0,0 +1,34 @@
+# tests/test_ids.py
+"""Chaque process de l'API a son worker_id, jamais celui réservé au générateur de données."""
+import multiprocessing as mp
+import os
+import time
+
+import pytest
+
+from backend_facilite.utils import ids
+
+
+def _worker_id(_):
+    time.sleep(0.05)    # chaque process du pool prend au moins une tâche
+    return os.getpid(), ids.get_generator().worker_id
+
+
+@pytest.mark.parametrize("method", ["fork", "spawn"])
+def test_pool_processes_get_distinct_worker_ids(method):
+    with mp.get_context(method).Pool(4) as pool:
+        by_pid = dict(pool.map(_worker_id, range(16), chunksize=1))
+    worker_ids = list(by_pid.values()) + [ids.get_generator().worker_id]
+    assert len(set(worker_ids)) == len(worker_ids)
+    assert ids.RESERVED_WORKER_ID not in worker_ids
+
+
+def _has_generator(_):
+    time.sleep(0.05)
+    return ids._generator is not None
+
+
+def test_forked_children_claim_a_slot_only_when_they_generate():
+    # Plus d'enfants que de créneaux : le pool ne doit ni échouer ni en consommer
+    with mp.get_context("fork").Pool(ids.WORKER_SLOTS + 4) as pool:
+        assert not any(pool.map(_has_generator, range(ids.WORKER_SLOTS + 4), chunksize=1))
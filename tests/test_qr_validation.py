@@ -0,0 +1,84 @@
+# tests/test_qr_validation.py
+"""
+Un QR payé ne s'utilise qu'une fois, même quand plusieurs scanners le
+présentent en même temps (POST /payments/validate et /payments/validate/batch).
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from backend_facilite import auth
+from backend_facilite.models import OutboxEvent, Payment, RoleEnum, User
+from backend_facilite.utils.ids import new_transaction_code
+
+PARALLEL_CALLS = 16
+
+
+def _staff_headers(db, count: int) -> list[dict]:
+    """Un membre du staff par appel : des scanners distincts, chacun avec son quota de débit."""
+    users = [User(name=f"scanner-{i}", phone_number=f"scan-{new_transaction_code()}-{i}", role=RoleEnum.admin)
+             for i in range(count)]
+    db.add_all(users)
+    db.commit()
+    return [{"Authorization": "Bearer " + auth.create_token(auth.token_claims(u))} for u in users]
+
+
+def _paid_payment(db) -> Payment:
+    owner = User(name="client", phone_number=f"client-{new_transaction_code()}", role=RoleEnum.client)
+    db.add(owner)
+    db.commit()
+    payment = Payment(
+        user_id=owner.id, amount=10.0, net_amount=7.9, commission=2.1,
+        payment_method="cash", status="success", transaction_code=new_transaction_code(),
+    )
+    db.add(payment)
+    db.commit()
+    return payment
+
+
+def _validate(client, headers: dict, code: str, batch: bool) -> bool:
+    """True si cet appel a consommé le code."""
+    if batch:
+        resp = client.post("/payments/validate/batch", json={"transaction_codes": [code]}, headers=headers)
+        assert resp.status_code == 200, resp.text
+        return resp.json()["results"][0]["status"] == "ok"
+    resp = client.post("/payments/validate", json={"transaction_code": code}, headers=headers)
+    assert resp.status_code in (200, 400), resp.text
+    if resp.status_code == 200:
+        assert resp.json()["status"] == "ok"
+    return resp.status_code == 200
+
+
+@pytest.mark.parametrize("mode", ["single", "batch", "mixed"])
+def test_parallel_validation_consumes_code_once(client, db, mode):
+    payment = _paid_payment(db)
+    headers = _staff_headers(db, PARALLEL_CALLS)
+    barrier = threading.Barrier(PARALLEL_CALLS)
+
+    def scan(index: int) -> bool:
+        batch = mode == "batch" or (mode == "mixed" and index % 2 == 1)
+        barrier.wait()   # tous les appels partent ensemble
+        return _validate(client, headers[index], payment.transaction_code, batch)
+
+    with ThreadPoolExecutor(max_workers=PARALLEL_CALLS) as pool:
+        outcomes = list(pool.map(scan, range(PARALLEL_CALLS)))
+
+    assert outcomes.count(True) == 1
+    db.expire_all()
+    assert db.get(Payment, payment.id).is_used is True
+    # Un seul passage false -> true : un seul événement de validation
+    assert db.query(OutboxEvent).filter(
+        OutboxEvent.topic == "payment.validated", OutboxEvent.aggregate_id == payment.id
+    ).count() == 1
+
+
+def test_validated_code_is_rejected_afterwards(client, db):
+    payment = _paid_payment(db)
+    headers = _staff_headers(db, 1)[0]
+    assert _validate(client, headers, payment.transaction_code, batch=False)
+    resp = client.post("/payments/validate", json={"transaction_code": payment.transaction_code}, headers=headers)
+    assert resp.status_code == 400
+    resp = client.post("/payments/validate/batch", json={"transaction_codes": [payment.transaction_code]},
+                       headers=headers)
+    assert resp.json()["results"][0]["status"] == "already_used"